@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'companyapi.settings')
+# Serve the read endpoints with the native async views (myapp/async_views.py)
+os.environ.setdefault('API_URLCONF', 'companyapi.urls_async')
 
 application = get_asgi_application()
@@ -10,6 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import json
+import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'myapp.routers.replica_routing',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -51,7 +55,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'companyapi.urls'
+# companyapi/asgi.py selects companyapi.urls_async, which serves the read
+# endpoints with native async views
+ROOT_URLCONF = os.environ.get('API_URLCONF', 'companyapi.urls')
 
 TEMPLATES = [
     {
@@ -73,13 +79,125 @@ WSGI_APPLICATION = 'companyapi.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# API_DATABASE selects SQLite (sqlite, the default) or PostgreSQL (postgres).
+# 'default' is the primary. API_DB_REPLICAS lists read replicas, as file
+# paths (SQLite, kept in sync by e.g. Litestream or LiteFS) or host[:port]
+# (PostgreSQL), which become the aliases replica_1, replica_2, ... Without
+# replicas, 'readonly' is a second connection to the primary. Replica
+# connections refuse writes. myapp.routers spreads the reads of GET requests
+# over them (API_READ_DATABASES), so they never queue behind a write
+# transaction on the primary.
+#
+# Connections outside a pool persist for API_DB_CONN_MAX_AGE seconds
+# (0 connects per request) and are health-checked before a request reuses
+# them.
+API_DATABASE = os.environ.get('API_DATABASE', 'sqlite')
+API_DB_CONN_MAX_AGE = int(os.environ.get('API_DB_CONN_MAX_AGE', '60'))
+
+# SQLite production profile (API_SQLITE_PROFILE=production; the default
+# profile keeps SQLite's own settings): every connection runs SQLITE_PRAGMAS.
+# synchronous=NORMAL syncs at checkpoints instead of every commit, and
+# busy_timeout makes a blocked writer wait (milliseconds). Write transactions
+# begin IMMEDIATE so they take the write lock up front, where busy_timeout
+# applies, instead of failing with "database is locked" when a deferred read
+# lock can't be upgraded. Replica connections add query_only.
+#
+# WAL, which lets readers go on while a transaction writes, is a property of
+# the database file rather than of a connection: switch a deployment's file
+# once with `manage.py enable_wal`.
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 2**20,
+    'cache_size': -64000,  # KiB
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+API_SQLITE_PROFILE = os.environ.get('API_SQLITE_PROFILE', 'default')
+SQLITE_PRODUCTION_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    'transaction_mode': 'IMMEDIATE',
+}
+SQLITE_OPTIONS = SQLITE_PRODUCTION_OPTIONS if API_SQLITE_PROFILE == 'production' else {}
+
+# PostgreSQL reads the POSTGRES_* variables; the defaults match the server of
+# docker-compose.test.yml, which the test suite can run against. With
+# psycopg[pool] installed (and API_DB_POOL not 0), each process keeps a pool
+# of API_DB_POOL_MIN to API_DB_POOL_MAX connections per alias, checked before
+# they are handed out, and a request borrows one instead of connecting.
+# Without it connections persist as above. Replica connections set
+# default_transaction_read_only.
+API_DB_POOL = os.environ.get('API_DB_POOL', '1') != '0' and find_spec('psycopg_pool') is not None
+POSTGRES_DATABASE = {
+    'ENGINE': 'django.db.backends.postgresql',
+    'NAME': os.environ.get('POSTGRES_DB', 'companyapi'),
+    'USER': os.environ.get('POSTGRES_USER', 'companyapi'),
+    'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'companyapi'),
+    'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+    'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+    # Django rejects persistent connections on top of a pool
+    'CONN_MAX_AGE': 0 if API_DB_POOL else API_DB_CONN_MAX_AGE,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {},
+}
+if API_DB_POOL:
+    # CONN_HEALTH_CHECKS makes Django give the pool its connection check
+    POSTGRES_DATABASE['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('API_DB_POOL_MIN', '2')),
+        'max_size': int(os.environ.get('API_DB_POOL_MAX', '10')),
+        'timeout': 10,  # seconds to wait for a free connection
+        'max_idle': 300,
+        'max_lifetime': 3600,
+    }
 
-DATABASES = {
-    'default': {
+if API_DATABASE == 'postgres':
+    PRIMARY_DATABASE = POSTGRES_DATABASE
+    READ_ONLY_OPTIONS = {**POSTGRES_DATABASE['OPTIONS'], 'options': '-c default_transaction_read_only=on'}
+    REPLICAS = [
+        {'HOST': host, 'PORT': port or POSTGRES_DATABASE['PORT']}
+        for host, _, port in (entry.partition(':') for entry in os.environ.get('API_DB_REPLICAS', '').split(',') if entry)
+    ]
+    READ_ONLY_PRIMARY = {}
+else:
+    PRIMARY_DATABASE = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': API_DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': SQLITE_OPTIONS,
     }
+    READ_ONLY_OPTIONS = {'init_command': ';'.join([SQLITE_OPTIONS.get('init_command', ''), 'PRAGMA query_only=ON'])}
+    # Opened read-only, so a missing file fails to connect instead of being
+    # created empty
+    REPLICAS = [
+        {'NAME': f'{Path(path).resolve().as_uri()}?mode=ro'}
+        for path in os.environ.get('API_DB_REPLICAS', '').split(',') if path
+    ]
+    READ_ONLY_PRIMARY = {'NAME': f'{PRIMARY_DATABASE["NAME"].as_uri()}?mode=ro'}
+
+REPLICA_DATABASES = {
+    alias: {**PRIMARY_DATABASE, **replica, 'OPTIONS': READ_ONLY_OPTIONS, 'TEST': {'MIRROR': 'default'}}
+    for alias, replica in (
+        [(f'replica_{number}', replica) for number, replica in enumerate(REPLICAS, 1)] or [('readonly', READ_ONLY_PRIMARY)]
+    )
 }
+DATABASES = {'default': PRIMARY_DATABASE, **REPLICA_DATABASES}
+
+DATABASE_ROUTERS = ['myapp.routers.ReplicaRouter']
+
+# Aliases that the reads of GET and HEAD requests are spread over, round-robin
+API_READ_DATABASES = list(REPLICA_DATABASES)
+
+# Those of them that may lag behind the primary. Responses that read from them
+# are not cached: the cache's version stamps follow the primary's writes.
+API_LAGGING_DATABASES = list(REPLICA_DATABASES) if REPLICAS else []
+
+# Seconds a replica that failed to connect is left out before it is retried
+API_REPLICA_RETRY_SECONDS = 30
+
+# Seconds after a request that wrote during which the client's reads go to
+# the primary, so it reads its own writes despite replication lag
+API_PRIMARY_PIN_SECONDS = 5
 
 
 # Password validation
@@ -100,6 +218,46 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing (myapp/hashers.py). API_PASSWORD_HASHER hashes new and
+# upgraded passwords; the others still verify existing hashes, which are
+# rehashed on the user's next login. Parameters follow the OWASP password
+# storage recommendations; scrypt above work_factor 2**14 needs a larger
+# 'maxmem' (bytes).
+API_PASSWORD_HASHER = os.environ.get('API_PASSWORD_HASHER') or ('argon2' if find_spec('argon2') else 'scrypt')
+API_PASSWORD_HASHER_PARAMS = {
+    'argon2': {'time_cost': 2, 'memory_cost': 19 * 1024, 'parallelism': 1},
+    'scrypt': {'work_factor': 2 ** 14, 'block_size': 8, 'parallelism': 5},
+    'pbkdf2_sha256': {'iterations': 600000},
+}
+API_PASSWORD_HASHERS = {
+    'argon2': 'myapp.hashers.Argon2PasswordHasher',
+    'scrypt': 'myapp.hashers.ScryptPasswordHasher',
+    'pbkdf2_sha256': 'myapp.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [API_PASSWORD_HASHERS[API_PASSWORD_HASHER]] + [
+    path for name, path in API_PASSWORD_HASHERS.items() if name != API_PASSWORD_HASHER
+]
+
+AUTHENTICATION_BACKENDS = ['myapp.backends.PooledModelBackend']
+
+# Threads per process that hash passwords, and logins that may wait for one
+# before the login endpoint answers 503. A waiting login holds its request
+# thread, so up to WORKERS + QUEUE of the server's threads per process are
+# tied up in hashing; keep the sum well below the server's thread count. With
+# a queue of 0 every login that finds the workers busy is turned away.
+API_PASSWORD_HASHING_WORKERS = int(os.environ.get('API_PASSWORD_HASHING_WORKERS', '2'))
+API_PASSWORD_HASHING_QUEUE = int(os.environ.get('API_PASSWORD_HASHING_QUEUE', str(API_PASSWORD_HASHING_WORKERS)))
+
+# Processes that hash the passwords of bulk registrations, and the users
+# accepted per bulk request
+API_REGISTRATION_PROCESSES = int(os.environ.get('API_REGISTRATION_PROCESSES', os.cpu_count() or 1))
+API_REGISTER_BULK_MAX_ROWS = 1000
+
+# Login attempts per username and per client address (myapp/throttling.py),
+# and the number of buckets kept per process
+API_LOGIN_RATES = {'username': '10/min', 'ip': '30/min'}
+API_LOGIN_BUCKETS = 100000
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -126,22 +284,125 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'myapp.authentication.StatelessJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed when orjson is installed, the stdlib json module otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'myapp.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'myapp.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'myapp.pagination.PrimaryKeyCursorPagination',
+    'PAGE_SIZE': 100,
 }
 
+# Upper bound for the ?page_size= query parameter on list endpoints
+API_MAX_PAGE_SIZE = 1000
+
+# Organizations /api/stats/ details without ?top=, and the most ?top= may
+# ask for; ?breakdown=companies lists at most API_STATS_MAX_COMPANIES of the
+# companies of each, those with the most employees
+API_STATS_DEFAULT_TOP = 100
+API_STATS_MAX_TOP = 1000
+API_STATS_MAX_COMPANIES = 100
+
+# Serialize list pages from values_list() rows instead of model instances
+# (myapp/fastpath.py); the JSON is identical either way
+API_FAST_LIST_SERIALIZATION = True
+
+# Bulk endpoints: rows accepted per request and rows per INSERT/UPDATE batch
+API_BULK_MAX_ROWS = 50000
+API_BULK_BATCH_SIZE = 1000
+
+# Rows fetched and encoded per chunk by the streaming employee export
+API_EXPORT_CHUNK_SIZE = 2000
+
+# Rows per INSERT batch and transaction of the streaming import
+API_IMPORT_BATCH_SIZE = 5000
+
+# Threads per process running the per-type searches of /api/search/
+# concurrently (0 searches the types one after another), and the seconds
+# each type may take before the response leaves it out as timed out and its
+# queries are interrupted
+API_SEARCH_WORKERS = int(os.environ.get('API_SEARCH_WORKERS', '8'))
+API_SEARCH_TIMEOUTS = {'organizations': 2.0, 'companies': 2.0, 'employees': 2.0}
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# The 'api' cache holds the cached GET responses (see myapp/cache.py).
+# API_CACHE_BACKEND selects locmem (default, per process), file (shared by
+# the workers of one host) or redis (shared by every host, API_CACHE_URL).
+API_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'api',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('API_CACHE_DIR', str(BASE_DIR / '.cache' / 'api')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('API_CACHE_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': API_CACHE_BACKENDS[os.environ.get('API_CACHE_BACKEND', 'locmem')],
+}
+
+API_CACHE_ALIAS = 'api'
+# Entries are invalidated by writes; the timeout only bounds how long an
+# unused entry occupies the cache
+API_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Users cached in process by myapp.authentication.StatelessJWTAuthentication;
+# the TTL bounds how long other processes accept a changed user's tokens
+API_AUTH_USER_CACHE_SIZE = 10000
+API_AUTH_USER_CACHE_TTL = 30
+
+# Revoked refresh tokens (myapp/revocation.py): the in-process bloom filter's
+# capacity and false positive rate, and how often it picks up revocations
+# made by other processes
+API_REVOCATION_BLOOM_CAPACITY = 100000
+API_REVOCATION_BLOOM_ERROR_RATE = 0.001
+API_REVOCATION_SYNC_INTERVAL = 5
+
+# JWT signing keys (myapp/tokens.py), as JSON in the API_JWT_KEYS environment
+# variable. The first key signs new tokens and every key verifies the tokens
+# naming it in their kid header; rotate by prepending a new key and dropping
+# the old one after REFRESH_TOKEN_LIFETIME. Asymmetric keys name PEM files in
+# API_JWT_KEY_DIR (see `manage.py generate_jwt_key`), e.g.
+#   [{"kid": "2026-10", "algorithm": "EdDSA", "private_key": "2026-10.pem"},
+#    {"kid": "2026-07", "algorithm": "RS256", "public_key": "2026-07.pub.pem"}]
+API_JWT_KEY_DIR = os.environ.get('API_JWT_KEY_DIR', str(BASE_DIR / 'keys'))
+API_JWT_KEYS = json.loads(os.environ.get('API_JWT_KEYS') or 'null') or [
+    {'kid': 'hs256', 'algorithm': 'HS256', 'secret': SECRET_KEY},
+]
+
 # JWT settings
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
-    'ROTATE_REFRESH_TOKENS': False,
+    # Each refresh returns a new refresh token and revokes the old one (myapp/revocation.py)
+    'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'UPDATE_LAST_LOGIN': False,
 
+    # Used by simplejwt's own views only; the API signs with API_JWT_KEYS
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'VERIFYING_KEY': None,
@@ -153,7 +414,7 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
 
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'AUTH_TOKEN_CLASSES': ('myapp.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
 
     'JTI_CLAIM': 'jti',
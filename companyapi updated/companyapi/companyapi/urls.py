@@ -18,13 +18,14 @@ from django.contrib import admin
 from django.urls import path
 from myapp.views import (
     home, get_organizations, get_companies, get_employees, filter_employees,
-    register, login, token_refresh, profile, register_form, login_form, test_token, dashboard,
+    register, register_bulk, login, token_refresh, logout, profile, jwks, register_form, login_form, test_token, dashboard,
     # New CRUD endpoints
     organization_list_create, organization_detail,
     company_list_create, company_detail,
     employee_list_create, employee_detail,
+    organization_bulk, company_bulk, employee_bulk, export_employees, import_data,
     # New utility endpoints
-    organization_stats, search_all
+    organization_stats, search_all, cache_stats
 )
 
 urlpatterns = [
@@ -42,25 +43,34 @@ urlpatterns = [
     
     # Authentication endpoints
     path('api/auth/register/', register, name='register'),
+    path('api/auth/register/bulk/', register_bulk, name='register_bulk'),
     path('api/auth/login/', login, name='login'),
     path('api/auth/refresh/', token_refresh, name='token_refresh'),
+    path('api/auth/logout/', logout, name='logout'),
     path('api/auth/profile/', profile, name='profile'),
+    path('api/auth/jwks/', jwks, name='jwks'),
     
     # Enhanced CRUD endpoints for Organizations
     path('api/organizations/', organization_list_create, name='organization_list_create'),
     path('api/organizations/<int:pk>/', organization_detail, name='organization_detail'),
+    path('api/organizations/bulk/', organization_bulk, name='organization_bulk'),
     
     # Enhanced CRUD endpoints for Companies
     path('api/companies/', company_list_create, name='company_list_create'),
     path('api/companies/<int:pk>/', company_detail, name='company_detail'),
+    path('api/companies/bulk/', company_bulk, name='company_bulk'),
     
     # Enhanced CRUD endpoints for Employees
     path('api/employees/', employee_list_create, name='employee_list_create'),
     path('api/employees/<int:pk>/', employee_detail, name='employee_detail'),
+    path('api/employees/bulk/', employee_bulk, name='employee_bulk'),
+    path('api/employees/export/', export_employees, name='export_employees'),
+    path('api/import/', import_data, name='import_data'),
     
     # Utility endpoints
     path('api/stats/', organization_stats, name='organization_stats'),
     path('api/search/', search_all, name='search_all'),
+    path('api/cache/stats/', cache_stats, name='cache_stats'),
     
     # Legacy endpoints for backward compatibility
     path('api/organizations/legacy/', get_organizations, name='get_organizations'),
@@ -0,0 +1,30 @@
+"""
+URL configuration for the ASGI deployment.
+
+The routes of companyapi.urls, with the read endpoints served by the native
+async views of myapp.async_views. companyapi/asgi.py selects this module
+through the API_URLCONF environment variable.
+"""
+from django.urls import path
+
+from myapp import async_views, views
+from myapp.async_views import read_async
+
+from .urls import urlpatterns as sync_urlpatterns
+
+async_routes = {
+    'organization_list_create': read_async(async_views.organization_list, views.organization_list_create),
+    'organization_detail': read_async(async_views.organization_detail, views.organization_detail),
+    'company_list_create': read_async(async_views.company_list, views.company_list_create),
+    'company_detail': read_async(async_views.company_detail, views.company_detail),
+    'employee_list_create': read_async(async_views.employee_list, views.employee_list_create),
+    'employee_detail': read_async(async_views.employee_detail, views.employee_detail),
+    'organization_stats': read_async(async_views.organization_stats, views.organization_stats),
+    'search_all': read_async(async_views.search_all, views.search_all),
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), async_routes[pattern.name], name=pattern.name)
+    if getattr(pattern, 'name', None) in async_routes else pattern
+    for pattern in sync_urlpatterns
+]
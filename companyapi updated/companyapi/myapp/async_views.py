@@ -0,0 +1,250 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .cache import all_tables, cached_entry, stamp, store
+from .fastpath import row_plan
+from .fieldsets import selection_from_request
+from .models import Company, Employee, Organization
+from .pagination import apaginate
+from .params import positive_int
+from .querysets import (
+    apply_employee_filters,
+    company_queryset,
+    employee_queryset,
+    organization_queryset,
+)
+from .renderers import ORJSONRenderer
+from .search import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, SEARCH_TYPES, asearch
+from .serializers import CompanySerializer, EmployeeSerializer, OrganizationSerializer
+from .stats import STATS_ORDERINGS, aorganization_statistics
+from .versions import adetail_condition, alist_condition
+
+# Native async views for the read endpoints, served under ASGI.
+#
+# Under an ASGI server every synchronous view runs on a worker thread, so
+# concurrent clients queue behind the thread pool. The views below run on
+# the event loop instead: authentication (aauthenticate() of the configured
+# classes, when they have one), the queries (the async ORM) and rendering
+# happen without a thread hop, except for the raw FTS ranking queries of
+# search and serializers without a fast path, which go through
+# sync_to_async.
+#
+# They answer GET only; read_async() routes the other methods of a URL to
+# its synchronous DRF view. The JSON, the response cache entries (shared with
+# the DRF views) and the ETag / Last-Modified handling match the DRF views,
+# but the browsable API is not offered.
+#
+# companyapi/urls_async.py mounts them, paired with the synchronous views
+# by read_async(), and companyapi/asgi.py selects that URLconf.
+
+renderer = ORJSONRenderer()
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None):
+    response = HttpResponse(renderer.render(data), status=status, content_type='application/json', headers=headers)
+    # Kept for cached(), like the data of a DRF Response
+    response.data = data
+    return response
+
+
+def error_response(exc):
+    """The response DRF's exception handler gives for an APIException"""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = json_response(data, status=exc.status_code)
+    if getattr(exc, 'auth_header', None):
+        response['WWW-Authenticate'] = exc.auth_header
+    return response
+
+
+async def authenticate(request):
+    """(user, token) from the configured authentication classes, or None"""
+    drf_request = Request(request)
+    for authenticator_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        authenticator = authenticator_class()
+        if hasattr(authenticator, 'aauthenticate'):
+            result = await authenticator.aauthenticate(drf_request)
+        else:
+            result = await sync_to_async(authenticator.authenticate)(drf_request)
+        if result is not None:
+            return result
+    return None
+
+
+def authenticated(view):
+    """Require an authenticated user, like IsAuthenticated, and turn API errors into responses"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        header = None
+        for authenticator_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            header = authenticator_class().authenticate_header(request)
+            if header:
+                break
+        try:
+            result = await authenticate(request)
+            if result is None:
+                raise exceptions.NotAuthenticated()
+            request.user, request.auth = result
+            return await view(request, *args, **kwargs)
+        except (exceptions.NotAuthenticated, exceptions.AuthenticationFailed) as exc:
+            exc.auth_header = header
+            return error_response(exc)
+        except exceptions.APIException as exc:
+            return error_response(exc)
+    return wrapper
+
+
+def cached(endpoint, scopes, data_scopes=None):
+    """myapp.cache.cache_response for the async views"""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            key, entry = await sync_to_async(cached_entry)(endpoint, request)
+            if entry is not None:
+                return json_response(entry['data'], headers={'X-Cache': 'HIT'})
+
+            versions, guard = await sync_to_async(stamp)(scopes(**kwargs), data_scopes)
+            response = await view(request, *args, **kwargs)
+            if response.status_code == 200:
+                await sync_to_async(store)(key, versions, response.data, data_scopes, guard)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def read_async(async_view, sync_view):
+    """One view serving GET and HEAD with async_view and every other method with sync_view"""
+    run_sync = sync_to_async(sync_view)
+
+    @csrf_exempt
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await run_sync(request, *args, **kwargs)
+    return view
+
+
+async def list_page(request, serializer_class, queryset_function, filters=None):
+    drf_request = Request(request)
+    selection = selection_from_request(drf_request, serializer_class)
+    queryset = queryset_function(selection)
+    if filters is not None:
+        queryset = filters(queryset, request.GET)
+    return json_response(await apaginate(drf_request, queryset, serializer_class, selection))
+
+
+async def detail(model, serializer_class, queryset, pk):
+    queryset = queryset.filter(pk=pk)
+    plan = row_plan(serializer_class) if settings.API_FAST_LIST_SERIALIZATION else None
+    if plan is not None:
+        row = await plan.project(queryset).afirst()
+        if row is None:
+            raise exceptions.NotFound(f'No {model._meta.object_name} matches the given query.')
+        return json_response((await plan.aserialize([row]))[0])
+    try:
+        instance = await queryset.aget()
+    except model.DoesNotExist:
+        raise exceptions.NotFound(f'No {model._meta.object_name} matches the given query.')
+    return json_response(await sync_to_async(lambda: serializer_class(instance).data)())
+
+
+@authenticated
+@alist_condition
+@cached('organization_list', all_tables)
+async def organization_list(request):
+    """List organizations"""
+    return await list_page(request, OrganizationSerializer, organization_queryset)
+
+
+@authenticated
+@adetail_condition(Organization)
+@cached('organization_detail', lambda pk: [f'organization:{pk}'])
+async def organization_detail(request, pk):
+    """Retrieve an organization"""
+    return await detail(Organization, OrganizationSerializer, organization_queryset(), pk)
+
+
+@authenticated
+@alist_condition
+@cached('company_list', all_tables)
+async def company_list(request):
+    """List companies"""
+    return await list_page(request, CompanySerializer, company_queryset)
+
+
+@authenticated
+@adetail_condition(Company)
+@cached(
+    'company_detail', lambda pk: [f'company:{pk}'],
+    lambda data: [f'organization:{data["organization"]}'],
+)
+async def company_detail(request, pk):
+    """Retrieve a company"""
+    return await detail(Company, CompanySerializer, company_queryset(), pk)
+
+
+@authenticated
+@alist_condition
+@cached('employee_list', all_tables)
+async def employee_list(request):
+    """List employees"""
+    return await list_page(request, EmployeeSerializer, employee_queryset, apply_employee_filters)
+
+
+@authenticated
+@adetail_condition(Employee)
+@cached(
+    'employee_detail', lambda pk: [f'employee:{pk}'],
+    lambda data: [f'company:{data["company"]}', f'organization:{data["organization_id"]}'],
+)
+async def employee_detail(request, pk):
+    """Retrieve an employee"""
+    return await detail(Employee, EmployeeSerializer, employee_queryset(), pk)
+
+
+@authenticated
+@alist_condition
+@cached('stats', all_tables)
+async def organization_stats(request):
+    """Get statistics about organizations"""
+    order = request.GET.get('order', 'id')
+    if order not in STATS_ORDERINGS:
+        return json_response({
+            'error': f'order must be one of: {", ".join(STATS_ORDERINGS)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    top = min(positive_int(request.GET, 'top', settings.API_STATS_DEFAULT_TOP), settings.API_STATS_MAX_TOP)
+
+    breakdown = request.GET.get('breakdown') == 'companies'
+    return json_response(await aorganization_statistics(
+        top=top, order=order, breakdown=breakdown, companies_per_organization=settings.API_STATS_MAX_COMPANIES,
+    ))
+
+
+@authenticated
+async def search_all(request):
+    """Search across all entities"""
+    query = request.GET.get('q', '')
+    if not query:
+        return json_response({'error': 'Query parameter "q" is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    types = request.GET.get('types')
+    if types:
+        types = {name.strip() for name in types.split(',') if name.strip()}
+        unknown = types - set(SEARCH_TYPES)
+        if unknown:
+            return json_response({
+                'error': f'Unknown search types: {", ".join(sorted(unknown))}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    limit = min(positive_int(request.GET, 'limit', DEFAULT_SEARCH_LIMIT), MAX_SEARCH_LIMIT)
+
+    return json_response(await asearch(query, types=types or None, limit=limit))
+
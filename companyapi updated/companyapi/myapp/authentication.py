@@ -0,0 +1,158 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import RefreshToken
+
+# JWT authentication without a user query per request.
+#
+# Tokens issued by issue_tokens() carry signed username, is_active and
+# perm_version claims next to user_id. StatelessJWTAuthentication verifies
+# the signature, then checks the claims against the user's row held in an
+# in-process LRU for API_AUTH_USER_CACHE_TTL seconds, so warm requests run
+# no authentication query at all. Saving or deleting a user evicts its
+# entry (myapp.signals); other processes see the change once their entry
+# expires. A token whose perm_version no longer matches the user's
+# privileges (is_active, is_staff, is_superuser) is rejected, so revoking
+# privileges also revokes the tokens issued before.
+
+PERM_VERSION_CLAIM = 'perm_version'
+
+
+class ExpiringLRU:
+    """Thread-safe LRU mapping whose entries expire ttl seconds after being set"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+user_records = ExpiringLRU(settings.API_AUTH_USER_CACHE_SIZE, settings.API_AUTH_USER_CACHE_TTL)
+
+
+def permissions_version(user):
+    """Short digest of the user attributes that grant access"""
+    state = f'{user.is_active}|{user.is_staff}|{user.is_superuser}'
+    return hashlib.sha256(state.encode()).hexdigest()[:16]
+
+
+def issue_tokens(user):
+    """RefreshToken for the user carrying the claims StatelessJWTAuthentication checks
+
+    Access tokens derived from it, now or on refresh, copy the claims.
+    """
+    refresh = RefreshToken.for_user(user)
+    refresh['username'] = user.get_username()
+    refresh['is_active'] = user.is_active
+    refresh[PERM_VERSION_CLAIM] = permissions_version(user)
+    return refresh
+
+
+def forget_user(user):
+    """Drop a cached user record; called when the user changes"""
+    # Tokens carry the id as a string, and so do the LRU keys
+    user_records.discard(str(getattr(user, api_settings.USER_ID_FIELD)))
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that serves users from the in-process LRU"""
+
+    def get_user(self, validated_token):
+        user_id = self.token_user_id(validated_token)
+        record = user_records.get(user_id)
+        if record is None:
+            record = self.load_record(user_id)
+            if record is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            user_records.set(user_id, record)
+        return self.check_user(validated_token, record)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views; the user is loaded with the async ORM when not cached"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        user_id = self.token_user_id(validated_token)
+        record = user_records.get(user_id)
+        if record is None:
+            record = await self.aload_record(user_id)
+            if record is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            user_records.set(user_id, record)
+        return self.check_user(validated_token, record), validated_token
+
+    def token_user_id(self, validated_token):
+        try:
+            return str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError as exc:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from exc
+
+    def check_user(self, validated_token, record):
+        """The user of a cached record, if the token's claims still hold for it"""
+        user = self.user_model.from_db(*record)
+        if api_settings.CHECK_USER_IS_ACTIVE and not (user.is_active and validated_token.get('is_active', True)):
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        version = validated_token.get(PERM_VERSION_CLAIM)
+        if version is not None and version != permissions_version(user):
+            raise AuthenticationFailed(_('Token was issued for different permissions'), code='token_outdated')
+        return user
+
+    def load_record(self, user_id):
+        """(db, field_names, values) of the user's row, as Model.from_db() takes them"""
+        field_names = [field.attname for field in self.user_model._meta.concrete_fields]
+        users = self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+        # Route once, so the record names the database that was read
+        db = users.db
+        values = users.using(db).values_list(*field_names).first()
+        if values is None:
+            return None
+        return db, field_names, values
+
+    async def aload_record(self, user_id):
+        # In the ORM's thread, where the routing sees that thread's connections
+        return await sync_to_async(self.load_record)(user_id)
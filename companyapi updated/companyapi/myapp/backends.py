@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password, verify_password
+
+from .hashers import hashing_pool
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend that hashes on the bounded hashing pool and rehashes outdated passwords
+
+    Only the hashing runs on the pool; the user query and the save of an
+    upgraded hash stay on the request's thread and database connection.
+    HashingBusy propagates to the caller when the pool is saturated.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user_model = get_user_model()
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = user_model._default_manager.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as known ones
+            hashing_pool.run(make_password, password)
+            return None
+
+        correct, must_update = hashing_pool.run(verify_password, password, user.password)
+        if not correct:
+            return None
+        if must_update:
+            # Another hasher or outdated parameters; upgrade while we know the password
+            user.password = hashing_pool.run(make_password, password)
+            user.save(update_fields=['password'])
+        return user if self.user_can_authenticate(user) else None
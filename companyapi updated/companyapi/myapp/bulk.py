@@ -0,0 +1,240 @@
+import abc
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import company_scopes, employee_scopes, invalidate, organization_scopes
+from .counters import refresh_counters, refresh_employee_organizations
+from .models import Company, Employee, Organization
+from .serializers import CompanySerializer, EmployeeSerializer, OrganizationSerializer
+from .signals import muted
+from .versions import bump_table
+
+# Bulk create / update / delete behind the /api/<model>/bulk/ endpoints.
+#
+# A request body is a JSON array:
+#   POST    rows to create
+#   PATCH   partial rows to update, each with its "id"
+#   DELETE  ids to delete
+#
+# Rows are validated independently by BulkListSerializer (one query per
+# related field for the whole batch); invalid rows are reported by index and
+# the valid ones are written in one transaction with bulk_create, bulk_update
+# and a cascading delete() with the signal handlers of myapp.signals muted.
+# Instead of those handlers' per-row work, each handler below repairs what
+# they would have maintained once for the batch: counters,
+# Employee.organization, version stamps and cached responses.
+
+
+class BulkHandler(abc.ABC):
+    """Model-specific steps of a bulk write"""
+    model = None
+    serializer_class = None
+    table = None
+    # Tables whose rows a delete cascades to
+    cascades = ()
+
+    def snapshot(self, instance):
+        """Parent ids to remember before an instance is changed or deleted"""
+
+    def prepare(self, instance, attrs):
+        """Fill denormalized columns from validated attrs; return extra fields written"""
+        return set()
+
+    def delete(self, pks):
+        """Delete the rows and, through the foreign keys, their children"""
+        with muted():
+            self.model.objects.filter(pk__in=pks).delete()
+
+    def refresh(self, instances, previous):
+        """Recompute the denormalized data of the parents gained or lost"""
+
+    @abc.abstractmethod
+    def scopes(self, instance, previous):
+        """Cache scopes the write of an instance touched"""
+
+
+class OrganizationBulk(BulkHandler):
+    model = Organization
+    serializer_class = OrganizationSerializer
+    table = 'organization'
+    cascades = ('company', 'employee')
+
+    def scopes(self, instance, previous):
+        return organization_scopes(instance)
+
+
+class CompanyBulk(BulkHandler):
+    model = Company
+    serializer_class = CompanySerializer
+    table = 'company'
+    cascades = ('employee',)
+
+    def snapshot(self, instance):
+        return instance.organization_id
+
+    def refresh(self, instances, previous):
+        moved = [
+            company.pk for company in instances
+            if previous.get(company.pk, company.organization_id) != company.organization_id
+        ]
+        if moved:
+            refresh_employee_organizations(moved)
+        organization_ids = {company.organization_id for company in instances}
+        refresh_counters(organization_ids=organization_ids | set(previous.values()))
+
+    def scopes(self, instance, previous):
+        if previous == instance.organization_id:
+            previous = None
+        return company_scopes(instance, previous)
+
+
+class EmployeeBulk(BulkHandler):
+    model = Employee
+    serializer_class = EmployeeSerializer
+    table = 'employee'
+
+    def snapshot(self, instance):
+        return instance.company_id, instance.organization_id
+
+    def prepare(self, instance, attrs):
+        if 'company' not in attrs:
+            return set()
+        instance.organization_id = attrs['company'].organization_id
+        return {'organization'}
+
+    def refresh(self, instances, previous):
+        # Parents embed their employees, so this also bumps their versions
+        company_ids = {employee.company_id for employee in instances}
+        company_ids.update(company_id for company_id, _ in previous.values())
+        refresh_counters(company_ids, {organization_id for _, organization_id in previous.values()})
+
+    def scopes(self, instance, previous):
+        return employee_scopes(instance, *(previous or ()))
+
+
+def _parse_pk(value):
+    """The id a row gives as a non-negative int or a string of ASCII digits, or None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if value >= 0 else None
+    # str.isdigit() also accepts characters such as '²' that int() rejects
+    if isinstance(value, str) and value.isascii() and value.isdecimal():
+        return int(value)
+    return None
+
+
+def _pk_errors(rows, key=None):
+    """Split rows into {pk: index} and per-row errors for missing or repeated ids"""
+    pks, errors = {}, []
+    for index, row in enumerate(rows):
+        pk = _parse_pk(row.get(key) if key and isinstance(row, dict) else row)
+        if pk is None:
+            errors.append({'index': index, 'errors': {'id': ['A valid integer id is required']}})
+        elif pk in pks:
+            errors.append({'index': index, 'errors': {'id': ['Duplicate id']}})
+        else:
+            pks[pk] = index
+    return pks, errors
+
+
+def _create(handler, rows):
+    serializer = handler.serializer_class(data=rows, many=True)
+    valid, errors = serializer.validate_rows()
+    instances = []
+    for _, attrs in valid:
+        instance = handler.model(**attrs)
+        handler.prepare(instance, attrs)
+        instances.append(instance)
+    handler.model.objects.bulk_create(instances, batch_size=settings.API_BULK_BATCH_SIZE)
+    return instances, {}, errors
+
+
+def _update(handler, rows):
+    pks, errors = _pk_errors(rows, key='id')
+    existing = handler.model.objects.in_bulk(list(pks))
+    for pk, index in pks.items():
+        if pk not in existing:
+            errors.append({'index': index, 'errors': {'id': ['Not found']}})
+    by_index = {index: existing[pk] for pk, index in pks.items() if pk in existing}
+
+    serializer = handler.serializer_class(data=rows, many=True, partial=True)
+    valid, row_errors = serializer.validate_rows()
+    errors.extend(error for error in row_errors if error['index'] in by_index)
+
+    now = timezone.now()
+    instances, previous, fields = [], {}, {'version', 'updated_at'}
+    for index, attrs in valid:
+        instance = by_index.get(index)
+        if instance is None:
+            continue
+        previous[instance.pk] = handler.snapshot(instance)
+        for name, value in attrs.items():
+            setattr(instance, name, value)
+        fields.update(attrs, handler.prepare(instance, attrs))
+        instance.version = F('version') + 1
+        instance.updated_at = now
+        instances.append(instance)
+    handler.model.objects.bulk_update(instances, sorted(fields), batch_size=settings.API_BULK_BATCH_SIZE)
+    return instances, previous, errors
+
+
+def _delete(handler, rows):
+    pks, errors = _pk_errors(rows)
+    instances = handler.model.objects.in_bulk(list(pks))
+    for pk, index in pks.items():
+        if pk not in instances:
+            errors.append({'index': index, 'errors': {'id': ['Not found']}})
+    instances = list(instances.values())
+    previous = {instance.pk: handler.snapshot(instance) for instance in instances}
+    handler.delete(list(previous))
+    return instances, previous, errors
+
+
+BULK_OPERATIONS = {
+    'POST': ('created', _create, status.HTTP_201_CREATED),
+    'PATCH': ('updated', _update, status.HTTP_200_OK),
+    'DELETE': ('deleted', _delete, status.HTTP_200_OK),
+}
+
+
+def bulk_write(request, handler):
+    """Apply a bulk POST/PATCH/DELETE and report the rows that failed validation"""
+    rows = request.data
+    if not isinstance(rows, list) or not rows:
+        return Response({'error': 'Expected a non-empty JSON array'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(rows) > settings.API_BULK_MAX_ROWS:
+        return Response(
+            {'error': f'At most {settings.API_BULK_MAX_ROWS} rows are accepted per request'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    key, operation, success = BULK_OPERATIONS[request.method]
+    with transaction.atomic():
+        instances, previous, errors = operation(handler, rows)
+        if instances:
+            handler.refresh(instances, previous)
+            tables = (handler.table, *handler.cascades) if request.method == 'DELETE' else (handler.table,)
+            bump_table(*tables)
+            scopes = {f'table:{table}' for table in tables}
+            for instance in instances:
+                scopes.update(handler.scopes(instance, previous.get(instance.pk)))
+            invalidate(scopes)
+
+    errors.sort(key=lambda error: error['index'])
+    if errors and not instances:
+        code = status.HTTP_400_BAD_REQUEST
+    elif errors:
+        code = status.HTTP_207_MULTI_STATUS
+    else:
+        code = success
+    return Response({
+        key: len(instances),
+        'ids': [instance.pk for instance in instances],
+        'errors': errors,
+    }, status=code)
@@ -0,0 +1,209 @@
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from .routers import read_lagging_replica
+
+# Response cache for the read-heavy GET endpoints.
+#
+# Every cached response is stored together with the version stamps of the
+# scopes it was built from:
+#
+#   table:<model>      any row of that table changed (list endpoints, stats)
+#   organization:<id>  the organization, one of its companies or employees
+#   company:<id>       the company or one of its employees
+#   employee:<id>      the employee
+#
+# The signal handlers in myapp.signals bump exactly the scopes a write
+# touches, both immediately and after the transaction commits. A cached
+# entry is served only while all of its recorded stamps are still current,
+# so invalidation is driven by writes rather than by expiry. The backend is the 'api' entry of
+# settings.CACHES (LocMem, file-based or Redis), and per-endpoint hit/miss
+# counters are kept in the same cache. Responses built from a lagging replica
+# are served but not stored: their rows may predate the current stamps.
+#
+# Scopes only known from the rendered data (a company's organization) can
+# only be stamped after the view ran. Every write bumps its table scope, so
+# the table stamps are taken before the view as a guard: if any of them moved
+# by the time the data scopes are stamped, a write may have landed while the
+# payload was built and the response is not stored.
+
+TABLE_SCOPES = ('table:organization', 'table:company', 'table:employee')
+
+_PREFIX = 'apicache'
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def _version_key(scope):
+    return f'{_PREFIX}:version:{scope}'
+
+
+def current_versions(scopes):
+    """Current version stamp of each scope, initializing missing ones"""
+    cache = get_cache()
+    keys = {_version_key(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        # A fresh stamp never equals one recorded before an eviction
+        cache.add(key, time.time_ns(), timeout=None)
+        found[key] = cache.get(key)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump(scopes):
+    """Invalidate every cached response recorded against these scopes"""
+    cache = get_cache()
+    for scope in set(scopes):
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            cache.set(_version_key(scope), time.time_ns(), timeout=None)
+
+
+def invalidate(scopes):
+    """Bump the scopes now and again once the current transaction commits
+
+    The immediate bump keeps later reads in this transaction from hitting
+    stale entries; the second one discards anything a concurrent reader
+    cached from the pre-commit rows in between.
+    """
+    scopes = list(scopes)
+    bump(scopes)
+    transaction.on_commit(lambda: bump(scopes))
+
+
+def record(endpoint, outcome):
+    cache = get_cache()
+    key = f'{_PREFIX}:stats:{endpoint}:{outcome}'
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def cache_statistics(endpoints):
+    """Hit/miss counters for the given endpoint names"""
+    cache = get_cache()
+    keys = [f'{_PREFIX}:stats:{endpoint}:{outcome}' for endpoint in endpoints for outcome in ('hits', 'misses')]
+    found = cache.get_many(keys)
+    return {
+        endpoint: {
+            'hits': found.get(f'{_PREFIX}:stats:{endpoint}:hits', 0),
+            'misses': found.get(f'{_PREFIX}:stats:{endpoint}:misses', 0),
+        }
+        for endpoint in endpoints
+    }
+
+
+def _response_key(endpoint, request):
+    query = sorted((name, value) for name, values in request.GET.lists() for value in values)
+    raw = f'{request.get_host()}|{request.path}|{query}'
+    return f'{_PREFIX}:response:{endpoint}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+CACHED_ENDPOINTS = []
+
+
+def cached_entry(endpoint, request):
+    """(key, entry) for the request; entry is None unless its stamps are all current"""
+    key = _response_key(endpoint, request)
+    entry = get_cache().get(key)
+    if entry is not None and current_versions(entry['versions']) == entry['versions']:
+        record(endpoint, 'hits')
+        return key, entry
+    record(endpoint, 'misses')
+    return key, None
+
+
+def stamp(scopes, data_scopes=None):
+    """(versions, guard) taken before the view runs
+
+    versions holds the stamps of the URL scopes; guard the table stamps that
+    store() checks before trusting stamps read for data_scopes.
+    """
+    scopes = list(scopes)
+    guarded = set(TABLE_SCOPES) if data_scopes is not None else set()
+    found = current_versions(set(scopes) | guarded)
+    versions = {scope: found[scope] for scope in scopes}
+    guard = {scope: found[scope] for scope in guarded} or None
+    return versions, guard
+
+
+def store(key, versions, data, data_scopes=None, guard=None):
+    """Cache the data of a successful response under the stamps taken before it was built"""
+    if read_lagging_replica():
+        return
+    if data_scopes is not None:
+        data_versions = current_versions(data_scopes(data))
+        # Read after the data stamps: unchanged tables mean those stamps
+        # are still the ones from before the payload was built
+        if current_versions(guard) != guard:
+            return
+        versions.update(data_versions)
+    get_cache().set(key, {'versions': versions, 'data': data}, settings.API_CACHE_TIMEOUT)
+
+
+def cache_response(endpoint, scopes, data_scopes=None):
+    """Cache successful GET responses of a function view
+
+    scopes(**kwargs) lists the scopes known from the URL; they are stamped
+    before the view runs. data_scopes(data) optionally adds scopes only
+    known from the rendered data, such as a company's organization.
+    """
+    CACHED_ENDPOINTS.append(endpoint)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            key, entry = cached_entry(endpoint, request)
+            if entry is not None:
+                return Response(entry['data'], headers={'X-Cache': 'HIT'})
+
+            versions, guard = stamp(scopes(**kwargs), data_scopes)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                store(key, versions, response.data, data_scopes, guard)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def all_tables(**kwargs):
+    return TABLE_SCOPES
+
+
+def employee_scopes(instance, previous_company_id=None, previous_organization_id=None):
+    """Scopes touched by writing an employee, including the parents it left"""
+    scopes = {
+        'table:employee', f'employee:{instance.pk}',
+        f'company:{instance.company_id}', f'organization:{instance.organization_id}',
+    }
+    if previous_company_id is not None:
+        scopes.update({f'company:{previous_company_id}', f'organization:{previous_organization_id}'})
+    return scopes
+
+
+def company_scopes(instance, previous_organization_id=None):
+    """Scopes touched by writing a company, including the organization it left"""
+    scopes = {'table:company', f'company:{instance.pk}', f'organization:{instance.organization_id}'}
+    if previous_organization_id is not None:
+        # Its employees' organization changed too
+        scopes.update({'table:employee', f'organization:{previous_organization_id}'})
+    return scopes
+
+
+def organization_scopes(instance):
+    return {'table:organization', f'organization:{instance.pk}'}
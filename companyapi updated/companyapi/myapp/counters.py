@@ -0,0 +1,110 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Company, Employee, Organization
+from .versions import bump_table, version_bump
+
+# Maintenance of the denormalized columns:
+#   Company.employee_count, Organization.company_count, Organization.employee_count
+#   and Employee.organization (a copy of Employee.company.organization)
+#
+# Single-row changes are applied incrementally from the signal handlers in
+# myapp.signals using F() expressions, so concurrent writers never lose an
+# update. A counter change is a change of the parent's representation, so
+# the same UPDATE also bumps the parent's version (see myapp.versions).
+# Bulk paths that bypass signals (bulk_create, bulk_update, QuerySet.update)
+# must set Employee.organization themselves and call refresh_counters() for
+# the parents they touched; moving companies between organizations in bulk
+# also needs refresh_employee_organizations().
+
+
+def adjust_employee_count(company_id, organization_id, delta):
+    """Add delta employees to a company and to the organization owning it"""
+    if company_id is None or not delta:
+        return
+    Company.objects.filter(pk=company_id).update(
+        employee_count=F('employee_count') + delta, **version_bump()
+    )
+    Organization.objects.filter(pk=organization_id).update(
+        employee_count=F('employee_count') + delta, **version_bump()
+    )
+
+
+def adjust_company_count(organization_id, delta, employees=0):
+    """Add delta companies (holding `employees` employees in total) to an organization"""
+    if organization_id is None or not (delta or employees):
+        return
+    Organization.objects.filter(pk=organization_id).update(
+        company_count=F('company_count') + delta,
+        employee_count=F('employee_count') + employees,
+        **version_bump(),
+    )
+
+
+def _count_of(queryset, group_field):
+    """Correlated subquery counting the rows of queryset grouped on group_field"""
+    counts = queryset.order_by().values(group_field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def refresh_counters(company_ids=None, organization_ids=None):
+    """Recompute counters from the source tables
+
+    With no arguments every row is recomputed. Otherwise only the given
+    companies, the given organizations and the organizations owning the given
+    companies are touched.
+    """
+    companies = Company.objects.all()
+    organizations = Organization.objects.all()
+    if company_ids is not None or organization_ids is not None:
+        company_ids = list(company_ids or ())
+        organization_ids = set(organization_ids or ())
+        organization_ids.update(
+            Company.objects.filter(pk__in=company_ids).values_list('organization_id', flat=True)
+        )
+        companies = companies.filter(pk__in=company_ids)
+        organizations = organizations.filter(pk__in=organization_ids)
+
+    companies.update(
+        employee_count=_count_of(Employee.objects.filter(company=OuterRef('pk')), 'company'),
+        **version_bump(),
+    )
+    organizations.update(
+        company_count=_count_of(Company.objects.filter(organization=OuterRef('pk')), 'organization'),
+        employee_count=_count_of(
+            Employee.objects.filter(company__organization=OuterRef('pk')), 'company__organization'
+        ),
+        **version_bump(),
+    )
+    bump_table('company', 'organization')
+
+
+def refresh_employee_organizations(company_ids=None):
+    """Re-copy each employee's company organization onto Employee.organization"""
+    employees = Employee.objects.all()
+    if company_ids is not None:
+        employees = employees.filter(company_id__in=list(company_ids))
+    employees.update(
+        organization_id=Subquery(Company.objects.filter(pk=OuterRef('company_id')).values('organization_id')),
+        **version_bump(),
+    )
+    bump_table('employee')
+
+
+def find_drift():
+    """Return (companies, organizations, employees) querysets with stale denormalized data"""
+    companies = (
+        Company.objects
+        .annotate(actual_employees=Count('employees'))
+        .exclude(employee_count=F('actual_employees'))
+    )
+    organizations = (
+        Organization.objects
+        .annotate(
+            actual_companies=Count('companies', distinct=True),
+            actual_employees=Count('companies__employees', distinct=True),
+        )
+        .exclude(company_count=F('actual_companies'), employee_count=F('actual_employees'))
+    )
+    employees = Employee.objects.exclude(organization_id=F('company__organization_id'))
+    return companies, organizations, employees
@@ -0,0 +1,139 @@
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+# Read-only fast path for the paginated list endpoints.
+#
+# The DRF path builds a model instance per row and then calls every field's
+# get_attribute()/to_representation(), walking dotted sources such as
+# organization.name object by object. For a serializer whose fields are all
+# plain columns, related primary keys or nested many=True serializers, a
+# RowPlan instead reads the page as values_list() tuples and turns each one
+# into a dict with a function built once per serializer and field
+# selection. Nested rows are fetched with one values_list() query per level
+# and grouped by parent, ordered by id like the prefetches in
+# myapp.querysets. The resulting data renders to the same JSON as the DRF
+# path; serializers with any other field type keep using DRF.
+
+# Field classes whose to_representation() leaves database values unchanged
+PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.ReadOnlyField)
+
+
+def _is_passthrough(field):
+    if isinstance(field, serializers.BigIntegerField):
+        return not getattr(field, 'coerce_to_string', api_settings.COERCE_BIGINT_TO_STRING)
+    return any(
+        isinstance(field, base) and type(field).to_representation is base.to_representation
+        for base in PASSTHROUGH_FIELDS
+    )
+
+
+def _is_primary_key(field):
+    return (
+        isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None
+        and type(field).to_representation is serializers.PrimaryKeyRelatedField.to_representation
+    )
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _builder(items):
+    def build(row, nested):
+        return {
+            name: (nested[index].get(row[0]) or []) if is_nested else row[index]
+            for name, is_nested, index in items
+        }
+    return build
+
+
+class RowPlan:
+    """Columns to select and a row-to-dict function for one serializer level"""
+
+    def __init__(self, serializer):
+        self.model = serializer.Meta.model
+        self.columns = ['id']
+        self.children = []
+        # (name, is_nested, index): the field's value is row[index], or the
+        # rows that nested[index] groups under the row's id
+        items = []
+        for name, field in serializer.fields.items():
+            if isinstance(field, serializers.ListSerializer):
+                relation = self.model._meta.get_field(field.source)
+                child = RowPlan(field.child)
+                self.children.append((relation.field.attname, child))
+                items.append((name, True, len(self.children) - 1))
+            elif _is_primary_key(field):
+                items.append((name, False, self._column(self.model._meta.get_field(field.source).attname)))
+            elif _is_passthrough(field):
+                items.append((name, False, self._column(field.source.replace('.', '__'))))
+            else:
+                raise Unsupported(f'{type(field).__name__} {name}')
+        self.build = _builder(tuple(items))
+
+    def _column(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+        return self.columns.index(column)
+
+    def project(self, queryset):
+        """The queryset as named value rows carrying this plan's columns"""
+        return queryset.prefetch_related(None).values_list(*self.columns, named=True)
+
+    def serialize(self, rows):
+        """List of representation dicts for value rows selected by project()"""
+        ids = [row[0] for row in rows]
+        nested = [child.serialize_children(foreign_key, ids) for foreign_key, child in self.children]
+        build = self.build
+        return [build(row, nested) for row in rows]
+
+    def serialize_children(self, foreign_key, parent_ids):
+        """Map each parent id to the representations of its rows"""
+        rows = list(
+            self.model.objects
+            .filter(**{f'{foreign_key}__in': parent_ids})
+            .order_by('id')
+            .values_list(*self.columns, foreign_key)
+        )
+        grouped = {}
+        for row, data in zip(rows, self.serialize(rows)):
+            grouped.setdefault(row[-1], []).append(data)
+        return grouped
+
+    async def aserialize(self, rows):
+        """serialize() reading the nested rows with the async ORM"""
+        ids = [row[0] for row in rows]
+        nested = [await child.aserialize_children(foreign_key, ids) for foreign_key, child in self.children]
+        build = self.build
+        return [build(row, nested) for row in rows]
+
+    async def aserialize_children(self, foreign_key, parent_ids):
+        rows = [
+            row async for row in
+            self.model.objects
+            .filter(**{f'{foreign_key}__in': parent_ids})
+            .order_by('id')
+            .values_list(*self.columns, foreign_key)
+        ]
+        grouped = {}
+        for row, data in zip(rows, await self.aserialize(rows)):
+            grouped.setdefault(row[-1], []).append(data)
+        return grouped
+
+
+_plans = {}
+MAX_PLANS = 256
+
+
+def row_plan(serializer_class, selection=None):
+    """Compiled RowPlan for the serializer and field selection, or None if it needs DRF"""
+    key = (serializer_class, selection.key() if selection is not None else None)
+    if key not in _plans:
+        if len(_plans) >= MAX_PLANS:
+            # Selections come from query strings; don't let them grow without bound
+            _plans.clear()
+        try:
+            _plans[key] = RowPlan(serializer_class(selection=selection))
+        except Unsupported:
+            _plans[key] = None
+    return _plans[key]
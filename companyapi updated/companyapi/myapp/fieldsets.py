@@ -0,0 +1,148 @@
+import functools
+
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+# Sparse fieldsets and depth control for the list endpoints.
+#
+#   ?fields=id,name,companies.name   fields to serialize; dotted names pick
+#                                    fields of embedded rows
+#   ?depth=0|1|2                     levels of nested relations to embed
+#   ?expand=companies,companies.employees
+#                                    the nested relations to embed
+#                                    (overrides ?depth=)
+#
+# Unknown field names and relations are answered with a 400 that lists the
+# valid choices, and so are fields of relations ?depth= or ?expand= leave out.
+#
+# A request is parsed into a tree of FieldSelection objects, one per level.
+# DynamicFieldsMixin drops the fields and relations a selection leaves out,
+# and the queryset functions in myapp.querysets read the same selection to
+# join and prefetch only what will be serialized.
+
+
+class FieldSelection:
+    """Fields and embedded relations requested at one level of a nested serializer
+
+    fields is None for every field, or the set of field names to keep.
+    expand maps each embedded relation to the selection of its rows; None
+    embeds every relation with all of its fields.
+    """
+
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields
+        self.expand = expand
+
+    def includes(self, name):
+        """Whether the field is serialized"""
+        return self.fields is None or name in self.fields
+
+    def key(self):
+        """Hashable description of the selection"""
+        fields = frozenset(self.fields) if self.fields is not None else None
+        if self.expand is None:
+            return fields, None
+        return fields, tuple(sorted((name, child.key()) for name, child in self.expand.items()))
+
+    def child(self, relation):
+        """Selection for an embedded relation, or None when it isn't embedded"""
+        if not self.includes(relation):
+            return None
+        if self.expand is None:
+            return FieldSelection()
+        return self.expand.get(relation)
+
+
+def nested_relations(serializer_class):
+    """Map each nested many=True relation of a serializer class to its child class"""
+    return {
+        name: type(field.child)
+        for name, field in serializer_class._declared_fields.items()
+        if isinstance(field, serializers.ListSerializer) and isinstance(field.child, serializers.BaseSerializer)
+    }
+
+
+def relation_paths(serializer_class, prefix=''):
+    """Dotted paths of every nested relation, parents before children"""
+    paths = []
+    for name, child_class in nested_relations(serializer_class).items():
+        paths.append(prefix + name)
+        paths.extend(relation_paths(child_class, f'{prefix}{name}.'))
+    return paths
+
+
+@functools.cache
+def field_paths(serializer_class):
+    """Dotted names of every field ?fields= may select, those of embedded rows included"""
+    nested = nested_relations(serializer_class)
+    paths = []
+    for name in serializer_class().fields:
+        paths.append(name)
+        if name in nested:
+            paths.extend(f'{name}.{path}' for path in field_paths(nested[name]))
+    return tuple(paths)
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def build_selection(serializer_class, fields=None, expanded=None, prefix=''):
+    """FieldSelection for dotted field names and the set of expanded relation paths"""
+    level = None
+    if fields:
+        level = {name.split('.', 1)[0] for name in fields}
+    expand = {}
+    for name, child_class in nested_relations(serializer_class).items():
+        path = prefix + name
+        if (expanded is None or path in expanded) and (level is None or name in level):
+            child_fields = [field.split('.', 1)[1] for field in fields or () if field.startswith(name + '.')]
+            expand[name] = build_selection(child_class, child_fields, expanded, path + '.')
+    return FieldSelection(level, expand)
+
+
+def selection_from_request(request, serializer_class):
+    """Parse ?fields=, ?depth= and ?expand= for a list of serializer_class rows"""
+    params = request.query_params
+    paths = relation_paths(serializer_class)
+    expanded = None
+
+    depth = params.get('depth')
+    if depth is not None:
+        try:
+            depth = int(depth)
+        except ValueError:
+            depth = -1
+        if depth < 0:
+            raise ValidationError({'error': 'depth must be a non-negative integer'})
+        expanded = {path for path in paths if path.count('.') < depth}
+
+    expand = params.get('expand')
+    if expand is not None:
+        requested = set(_split(expand))
+        unknown = requested - set(paths)
+        if unknown:
+            raise ValidationError({
+                'error': f'Cannot expand {", ".join(sorted(unknown))}; choose from: {", ".join(paths) or "nothing"}'
+            })
+        # Embedding companies.employees implies embedding companies
+        expanded = {path for path in paths if any(name == path or name.startswith(path + '.') for name in requested)}
+
+    fields = _split(params.get('fields') or '')
+    unknown = set(fields) - set(field_paths(serializer_class))
+    if unknown:
+        raise ValidationError({
+            'error': f'Unknown fields: {", ".join(sorted(unknown))}; choose from: {", ".join(field_paths(serializer_class))}'
+        })
+    if expanded is not None:
+        # A field is shown only if every relation on its path is embedded
+        hidden = {
+            field for field in fields
+            if any((field == path or field.startswith(path + '.')) and path not in expanded for path in paths)
+        }
+        if hidden:
+            raise ValidationError({
+                'error': f'Fields of relations that are not embedded: {", ".join(sorted(hidden))}; '
+                         f'raise ?depth= or add them to ?expand='
+            })
+    return build_selection(serializer_class, fields, expanded)
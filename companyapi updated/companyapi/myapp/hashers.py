@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.exceptions import ImproperlyConfigured
+
+# Password hashing: tuned hashers and the pool that runs them.
+#
+# The hashers below are Django's, with their cost parameters taken from
+# API_PASSWORD_HASHER_PARAMS. They keep Django's algorithm names, so stored
+# hashes stay interchangeable with the stock hashers. When a user logs in
+# with a hash made by another hasher or with other parameters, the password
+# is rehashed with the preferred one (see myapp.backends).
+#
+# Hashing is the most expensive thing the API does, and a burst of logins
+# would otherwise occupy every worker. HashingPool runs it on a few threads
+# (hashlib and argon2 release the GIL) and refuses work beyond a bounded
+# queue, so at most API_PASSWORD_HASHING_WORKERS cores per process hash
+# passwords while the rest keep serving the CRUD endpoints. The request
+# threads of queued logins block until their turn, so hashing ties up at most
+# API_PASSWORD_HASHING_WORKERS + API_PASSWORD_HASHING_QUEUE request threads;
+# any further login is refused at once with HashingBusy.
+
+
+class TunedHasherMixin:
+    """Read the hasher's cost parameters from API_PASSWORD_HASHER_PARAMS[algorithm]"""
+
+    def __init__(self):
+        for name, value in settings.API_PASSWORD_HASHER_PARAMS.get(self.algorithm, {}).items():
+            if not hasattr(type(self), name):
+                raise ImproperlyConfigured(f'{self.algorithm} hasher has no {name} parameter')
+            setattr(self, name, value)
+
+
+class Argon2PasswordHasher(TunedHasherMixin, hashers.Argon2PasswordHasher):
+    pass
+
+
+class ScryptPasswordHasher(TunedHasherMixin, hashers.ScryptPasswordHasher):
+    pass
+
+
+class PBKDF2PasswordHasher(TunedHasherMixin, hashers.PBKDF2PasswordHasher):
+    pass
+
+
+class HashingBusy(Exception):
+    """The hashing pool's queue is full"""
+
+
+class HashingPool:
+    """Bounded thread pool for password hashing"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _start(self):
+        with self._lock:
+            if self._executor is None:
+                workers = settings.API_PASSWORD_HASHING_WORKERS
+                self._executor = ThreadPoolExecutor(workers, thread_name_prefix='password-hashing')
+                self._slots = threading.BoundedSemaphore(workers + settings.API_PASSWORD_HASHING_QUEUE)
+            return self._executor
+
+    def submit(self, func, *args):
+        """Future of func(*args) run on the pool; raise HashingBusy when the queue is full"""
+        executor = self._start()
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy
+        future = executor.submit(func, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, func, *args):
+        """func(*args) run on the pool, blocking the calling thread until it is done"""
+        return self.submit(func, *args).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+hashing_pool = HashingPool()
@@ -0,0 +1,261 @@
+import csv
+import io
+import json
+import time
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import invalidate
+from .counters import adjust_company_count, adjust_employee_count
+from .models import Company, Employee, Organization
+from .versions import bump_table
+
+# Streaming import of organizations, companies and employees, shared by
+# POST /api/import/ and `manage.py import_employees`.
+#
+# Input is CSV (with a header row) or NDJSON, one row per record, using the
+# columns of the employee export:
+#
+#   organization_name  required
+#   company_name       optional; created under the organization if missing
+#   name, position     optional; an employee of the company
+#
+# Other columns (such as the export's ids) are ignored, so an export can be
+# re-imported. Rows are parsed incrementally and written in batches of
+# API_IMPORT_BATCH_SIZE rows, one transaction per batch. Parents are resolved
+# by name through in-memory lookup tables and created with one bulk_create per
+# batch, employees with another. The signal handlers don't run for bulk
+# inserts, so each batch applies its counter deltas and bumps the version
+# stamps and cached responses itself.
+#
+# Rows that fail validation are rejected one by one. Input that can't be read
+# any further (not UTF-8, malformed CSV) raises ImportFormatError, which ends
+# the import after the batches written so far.
+
+MIN_NAME_LENGTH = 2
+MAX_NAME_LENGTH = 100
+MAX_ERROR_SAMPLES = 100
+
+
+class ImportFormatError(ValueError):
+    """The input can't be parsed past this point; line is None when it isn't known"""
+
+    def __init__(self, message, line=None):
+        super().__init__(message)
+        self.line = line
+
+
+def read_csv(binary):
+    """Yield (line_number, row) pairs from a binary CSV stream"""
+    reader = csv.DictReader(io.TextIOWrapper(binary, encoding='utf-8-sig', newline=''))
+    try:
+        for row in reader:
+            yield reader.line_num, row
+    except UnicodeDecodeError:
+        # Decoded ahead of the reader in blocks, so the line isn't known
+        raise ImportFormatError('The file is not valid UTF-8')
+    except csv.Error as exc:
+        # line_num counts the lines parsed before the failing one
+        raise ImportFormatError(f'Malformed CSV: {exc}', reader.line_num + 1)
+
+
+def read_ndjson(binary):
+    """Yield (line_number, row) pairs from a binary NDJSON stream; row is None for bad lines"""
+    for line_number, line in enumerate(binary, start=1):
+        try:
+            line = line.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ImportFormatError('Line is not valid UTF-8', line_number)
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+IMPORT_FORMATS = {
+    'csv': read_csv,
+    'ndjson': read_ndjson,
+}
+
+FORMAT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+}
+
+
+def guess_format(filename):
+    """Import format implied by a file name, or None"""
+    for extension, import_format in FORMAT_EXTENSIONS.items():
+        if filename.lower().endswith(extension):
+            return import_format
+    return None
+
+
+RECORD_FIELDS = ('organization_name', 'company_name', 'name', 'position')
+
+
+def parse_record(row):
+    """Return ((organization, company, name, position), None) or (None, error) for one row"""
+    if row is None:
+        return None, 'Not a JSON object'
+    record = tuple(str(row.get(key) or '').strip() for key in RECORD_FIELDS)
+    organization, company, name, _ = record
+    if not organization:
+        return None, 'organization_name is required'
+    if name and not company:
+        return None, 'company_name is required for an employee'
+    # The limits of the serializers
+    for key, value in zip(RECORD_FIELDS, record):
+        if len(value) > MAX_NAME_LENGTH:
+            return None, f'{key} is longer than {MAX_NAME_LENGTH} characters'
+        if 0 < len(value) < MIN_NAME_LENGTH:
+            return None, f'{key} must be at least {MIN_NAME_LENGTH} characters long'
+    return record, None
+
+
+def _forget_since(lookup, size):
+    """Drop the entries added to a lookup table since it held size entries"""
+    for key in list(islice(reversed(lookup), len(lookup) - size)):
+        del lookup[key]
+
+
+class EmployeeImporter:
+    """Import parsed rows in batches, creating missing parents by name"""
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.API_IMPORT_BATCH_SIZE
+        # Names aren't unique; rows attach to the oldest match
+        self.organizations = {}
+        for pk, name in Organization.objects.order_by('-pk').values_list('pk', 'name').iterator():
+            self.organizations[name] = pk
+        self.companies = {}
+        for pk, organization_id, name in (
+            Company.objects.order_by('-pk').values_list('pk', 'organization_id', 'name').iterator()
+        ):
+            self.companies[organization_id, name] = pk
+        self.created = Counter()
+        self.rows = 0
+        self.error_count = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def run(self, rows, progress=None):
+        """Import (line_number, row) pairs; call progress(summary) after each batch
+
+        An ImportFormatError from rows is raised once the rows before it are
+        imported; summary() reports what was.
+        """
+        self.started = time.perf_counter()
+        rows = iter(rows)
+        while True:
+            batch = []
+            failure = None
+            try:
+                batch.extend(islice(rows, self.batch_size))
+            except ImportFormatError as exc:
+                failure = exc
+            if batch:
+                self._import_batch(batch)
+                if progress is not None:
+                    progress(self.summary())
+            if failure is not None:
+                raise failure
+            if len(batch) < self.batch_size:
+                return self.summary()
+
+    def summary(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            'rows': self.rows,
+            'created': {
+                'organizations': self.created['organizations'],
+                'companies': self.created['companies'],
+                'employees': self.created['employees'],
+            },
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(self.rows / seconds) if seconds else 0,
+        }
+
+    def _error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERROR_SAMPLES:
+            self.errors.append({'line': line_number, 'error': message})
+
+    def _import_batch(self, batch):
+        records = []
+        for line_number, row in batch:
+            self.rows += 1
+            record, error = parse_record(row)
+            if error:
+                self._error(line_number, error)
+            else:
+                records.append(record)
+        if not records:
+            return
+
+        # New parents are appended to the lookup tables; a rolled back batch
+        # takes them out again, so later batches don't point at missing rows
+        sizes = len(self.organizations), len(self.companies)
+        try:
+            with transaction.atomic():
+                organizations = self._create_organizations(records)
+                companies = self._create_companies(records)
+                employees = Employee.objects.bulk_create([
+                    Employee(
+                        name=name, position=position,
+                        company_id=self.companies[self.organizations[organization], company],
+                        organization_id=self.organizations[organization],
+                    )
+                    for organization, company, name, position in records if name
+                ], batch_size=self.batch_size)
+                self._update_counters(companies, employees)
+        except Exception:
+            _forget_since(self.organizations, sizes[0])
+            _forget_since(self.companies, sizes[1])
+            raise
+
+        self.created.update(organizations=organizations, companies=len(companies), employees=len(employees))
+
+    def _create_organizations(self, records):
+        names = list(dict.fromkeys(
+            organization for organization, _, _, _ in records if organization not in self.organizations
+        ))
+        created = Organization.objects.bulk_create([Organization(name=name) for name in names])
+        for organization in created:
+            self.organizations[organization.name] = organization.pk
+        return len(created)
+
+    def _create_companies(self, records):
+        keys = list(dict.fromkeys(
+            (self.organizations[organization], company)
+            for organization, company, _, _ in records
+            if company and (self.organizations[organization], company) not in self.companies
+        ))
+        created = Company.objects.bulk_create([
+            Company(name=name, organization_id=organization_id) for organization_id, name in keys
+        ])
+        for company in created:
+            self.companies[company.organization_id, company.name] = company.pk
+        return created
+
+    def _update_counters(self, companies, employees):
+        for organization_id, count in Counter(company.organization_id for company in companies).items():
+            adjust_company_count(organization_id, count)
+        hired = Counter((employee.company_id, employee.organization_id) for employee in employees)
+        for (company_id, organization_id), count in hired.items():
+            adjust_employee_count(company_id, organization_id, count)
+
+        scopes = {f'company:{company_id}' for company_id, _ in hired}
+        scopes.update(f'organization:{organization_id}' for _, organization_id in hired)
+        scopes.update(f'organization:{company.organization_id}' for company in companies)
+        bump_table('organization', 'company', 'employee')
+        invalidate(scopes | {'table:organization', 'table:company', 'table:employee'})
@@ -0,0 +1,77 @@
+"""Shared helpers for the benchmark_* management commands"""
+import random
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from myapp.counters import refresh_counters
+from myapp.models import Company, Employee, Organization
+
+FIRST_NAMES = [
+    'Ada', 'Alan', 'Barbara', 'Brian', 'Claude', 'Dennis', 'Edsger', 'Frances',
+    'Grace', 'Guido', 'Hedy', 'Ivan', 'John', 'Ken', 'Linus', 'Margaret',
+    'Niklaus', 'Radia', 'Shafi', 'Tim',
+]
+LAST_NAMES = [
+    'Allen', 'Backus', 'Cerf', 'Dijkstra', 'Engelbart', 'Floyd', 'Gosling',
+    'Hamilton', 'Hopper', 'Kay', 'Knuth', 'Lamport', 'Liskov', 'Lovelace',
+    'McCarthy', 'Perlman', 'Ritchie', 'Stroustrup', 'Thompson', 'Wirth',
+]
+POSITIONS = ['Engineer', 'Manager', 'Analyst', 'Designer', 'Director', 'Accountant']
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back"""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def seed(organizations, companies, employees, batch_size=10000, stdout=None):
+    """Bulk insert a synthetic tree of the given sizes and fix up the counters"""
+    rng = random.Random(42)
+    started = time.perf_counter()
+    orgs = Organization.objects.bulk_create(
+        [Organization(name=f'Organization {i}') for i in range(organizations)],
+        batch_size=batch_size,
+    )
+    comps = Company.objects.bulk_create(
+        [Company(name=f'Company {i}', organization=orgs[i % len(orgs)]) for i in range(companies)],
+        batch_size=batch_size,
+    )
+    for start in range(0, employees, batch_size):
+        Employee.objects.bulk_create([
+            Employee(
+                name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}',
+                position=rng.choice(POSITIONS),
+                company=comps[i % len(comps)],
+                organization_id=comps[i % len(comps)].organization_id,
+            )
+            for i in range(start, min(start + batch_size, employees))
+        ], batch_size=batch_size)
+    refresh_counters()
+    if stdout is not None:
+        stdout.write(
+            f'Seeded {organizations} organizations, {companies} companies and '
+            f'{employees} employees in {time.perf_counter() - started:.1f}s'
+        )
+
+
+def timed(func, repeat=5):
+    """Median wall time of func() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
@@ -0,0 +1,108 @@
+import asyncio
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+
+from myapp.authentication import issue_tokens
+from myapp.models import Employee, Organization
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/second and latency of the read endpoints served the WSGI way (synchronous '
+        'views on a bounded pool of worker threads) and the ASGI way (the async views of '
+        'companyapi.urls_async on the event loop), with many concurrent clients. Requests go through '
+        'Django\'s handlers in process, without an HTTP server; the response cache is disabled. '
+        'Runs against the rows already in the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=500)
+        parser.add_argument('--requests', type=int, default=4, help='Requests per client')
+        parser.add_argument('--threads', type=int, default=8, help='Worker threads of the WSGI deployment')
+        parser.add_argument('--path', action='append', dest='paths', help='Endpoint to request; repeatable')
+
+    def handle(self, *args, **options):
+        employee = Employee.objects.order_by('id').first()
+        organization = Organization.objects.order_by('id').first()
+        if employee is None or organization is None:
+            raise CommandError('No data to read; import or seed some employees first')
+        paths = options['paths'] or [
+            '/api/employees/?page_size=20',
+            f'/api/employees/{employee.pk}/',
+            f'/api/organizations/{organization.pk}/?depth=0',
+            '/api/search/?q=engineer&limit=5',
+            '/api/stats/?top=10',
+        ]
+
+        user = User.objects.create_user(username=f'benchmark-{uuid.uuid4().hex[:8]}')
+        headers = {'Authorization': f'Bearer {issue_tokens(user).access_token}'}
+        caches = {**settings.CACHES, 'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        total = options['clients'] * options['requests']
+        self.stdout.write(
+            f'{options["clients"]} clients x {options["requests"]} requests over {len(paths)} endpoints, '
+            f'WSGI with {options["threads"]} worker threads'
+        )
+        try:
+            with override_settings(CACHES=caches, API_CACHE_ALIAS='benchmark', ALLOWED_HOSTS=['*']):
+                with override_settings(ROOT_URLCONF='companyapi.urls'):
+                    self.report('wsgi', total, *asyncio.run(self.run_wsgi(paths, headers, options)))
+                with override_settings(ROOT_URLCONF='companyapi.urls_async'):
+                    self.report('asgi', total, *asyncio.run(self.run_asgi(paths, headers, options)))
+        finally:
+            user.delete()
+
+    async def run_clients(self, clients, requests, paths, send):
+        """Run the clients concurrently, each sending its requests in turn; return (latencies, failed, elapsed)"""
+        latencies, failures = [], []
+
+        async def client(number):
+            for i in range(requests):
+                path = paths[(number + i) % len(paths)]
+                started = time.perf_counter()
+                status = await send(path)
+                latencies.append(time.perf_counter() - started)
+                if status != 200:
+                    failures.append((path, status))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(number) for number in range(clients)))
+        return latencies, failures, time.perf_counter() - started
+
+    async def run_wsgi(self, paths, headers, options):
+        # Like a threaded WSGI server: each request occupies a worker thread until it is answered
+        loop = asyncio.get_running_loop()
+        client = Client()
+
+        def get(path):
+            return client.get(path, headers=headers).status_code
+
+        with ThreadPoolExecutor(options['threads']) as executor:
+            async def send(path):
+                return await loop.run_in_executor(executor, get, path)
+
+            return await self.run_clients(options['clients'], options['requests'], paths, send)
+
+    async def run_asgi(self, paths, headers, options):
+        client = AsyncClient()
+
+        async def send(path):
+            return (await client.get(path, headers=headers)).status_code
+
+        return await self.run_clients(options['clients'], options['requests'], paths, send)
+
+    def report(self, name, total, latencies, failures, elapsed):
+        latencies = sorted(seconds * 1000 for seconds in latencies)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f'  {name}: {total / elapsed:8.1f} requests/s   p50 {statistics.median(latencies):7.0f} ms   '
+            f'p99 {p99:7.0f} ms   {len(failures)} failed'
+        )
+        for path, status in sorted(set(failures))[:5]:
+            self.stdout.write(self.style.WARNING(f'    {status} {path}'))
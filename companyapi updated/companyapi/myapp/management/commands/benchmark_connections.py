@@ -0,0 +1,103 @@
+import statistics
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.test import Client, override_settings
+
+from myapp.authentication import issue_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure how much of each request goes into opening database connections: once connecting '
+        'per request (CONN_MAX_AGE=0, no pool) and once as DATABASES is configured (persistent '
+        'connections or the psycopg pool). Requests go through Django\'s handler in process and close '
+        'old connections around each request like a server does; the response cache is disabled.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--path', default='/api/employees/?page_size=20')
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(username=f'benchmark-{uuid.uuid4().hex[:8]}')
+        headers = {'Authorization': f'Bearer {issue_tokens(user).access_token}'}
+        caches = {**settings.CACHES, 'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        self.stdout.write(
+            f'{options["requests"]} x GET {options["path"]} on {connections["default"].vendor}, '
+            f'aliases: {", ".join(connections.settings)}'
+        )
+        try:
+            with override_settings(CACHES=caches, API_CACHE_ALIAS='benchmark', ALLOWED_HOSTS=['*']):
+                for label, per_request in (('connect per request', True), ('configured', False)):
+                    close_old_connections()
+                    with self.timed_connects(per_request) as connects:
+                        latencies = self.run(options['path'], headers, options['requests'])
+                    self.report(label, latencies, connects)
+        finally:
+            connections.close_all()
+            user.delete()
+
+    @contextmanager
+    def timed_connects(self, per_request):
+        """Collect the seconds spent in each new connection, optionally as if CONN_MAX_AGE=0 without a pool"""
+        connects = []
+        saved = []
+        for alias in connections.settings:
+            connection = connections[alias]
+            connection.close()
+            original = connection.get_new_connection
+
+            def get_new_connection(conn_params, original=original):
+                started = time.perf_counter()
+                try:
+                    return original(conn_params)
+                finally:
+                    connects.append(time.perf_counter() - started)
+
+            connection.get_new_connection = get_new_connection
+            settings_dict = connection.settings_dict
+            saved.append((connection, settings_dict['CONN_MAX_AGE'], settings_dict['OPTIONS']))
+            if per_request:
+                settings_dict['CONN_MAX_AGE'] = 0
+                settings_dict['OPTIONS'] = {
+                    name: value for name, value in settings_dict['OPTIONS'].items() if name != 'pool'
+                }
+        try:
+            yield connects
+        finally:
+            for connection, conn_max_age, options in saved:
+                connection.close()
+                del connection.get_new_connection
+                connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+                connection.settings_dict['OPTIONS'] = options
+
+    def run(self, path, headers, requests):
+        # The test client leaves connections open; close them between requests as the server handlers do
+        client = Client()
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            close_old_connections()
+            response = client.get(path, headers=headers)
+            close_old_connections()
+            if response.status_code != 200:
+                raise CommandError(f'GET {path} answered {response.status_code}')
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    def report(self, label, latencies, connects):
+        total = sum(latencies)
+        connect_ms = sum(connects) * 1000
+        self.stdout.write(
+            f'  {label:<20} {len(latencies) / total:8.1f} requests/s   '
+            f'p50 {statistics.median(latencies) * 1000:6.2f} ms   '
+            f'{len(connects) / len(latencies):5.2f} connects/request   '
+            f'{connect_ms / len(latencies):6.3f} ms connecting/request '
+            f'({connect_ms / (total * 1000):.1%} of request time)'
+        )
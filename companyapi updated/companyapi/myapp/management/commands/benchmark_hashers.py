@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import wait
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password, verify_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from myapp.hashers import HashingPool
+
+from ._benchmark import rolled_back
+
+CASES = [
+    # label, algorithm, parameters
+    ('pbkdf2_sha256 Django default', 'pbkdf2_sha256', {'iterations': 1000000}),
+    ('pbkdf2_sha256 tuned', 'pbkdf2_sha256', None),
+    ('scrypt tuned', 'scrypt', None),
+    ('argon2 tuned', 'argon2', None),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure logins/second per password hasher setting, one at a time through authenticate() '
+        'and concurrently through the hashing pool'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=10)
+        parser.add_argument('--workers', type=int, default=settings.API_PASSWORD_HASHING_WORKERS)
+
+    def handle(self, *args, **options):
+        logins, workers = options['logins'], options['workers']
+        self.stdout.write(f'{logins} logins per case; pool of {workers} workers')
+        for label, algorithm, params in CASES:
+            params = params or settings.API_PASSWORD_HASHER_PARAMS[algorithm]
+            hashers = {**settings.API_PASSWORD_HASHER_PARAMS, algorithm: params}
+            preferred = settings.API_PASSWORD_HASHERS[algorithm]
+            with override_settings(
+                API_PASSWORD_HASHER_PARAMS=hashers,
+                PASSWORD_HASHERS=[preferred, *(path for path in settings.PASSWORD_HASHERS if path != preferred)],
+                API_PASSWORD_HASHING_WORKERS=workers,
+                API_PASSWORD_HASHING_QUEUE=logins,
+            ):
+                try:
+                    encoded = make_password('benchmark-password')
+                except ValueError as e:
+                    # argon2 without the argon2-cffi package
+                    self.stdout.write(self.style.WARNING(f'  {label:<30} skipped: {e}'))
+                    continue
+                sequential = self.sequential(logins)
+                pooled = self.pooled(encoded, logins)
+            settings_text = ', '.join(f'{name}={value}' for name, value in params.items())
+            self.stdout.write(
+                f'  {label:<30} {sequential:7.1f} logins/s   pooled {pooled:7.1f} logins/s   ({settings_text})'
+            )
+
+    def sequential(self, logins):
+        with rolled_back():
+            User.objects.create_user(username='benchmark', password='benchmark-password')
+            started = time.perf_counter()
+            for _ in range(logins):
+                if authenticate(username='benchmark', password='benchmark-password') is None:
+                    raise RuntimeError('authenticate() failed')
+            return logins / (time.perf_counter() - started)
+
+    def pooled(self, encoded, logins):
+        pool = HashingPool()
+        started = time.perf_counter()
+        wait([pool.submit(verify_password, 'benchmark-password', encoded) for _ in range(logins)])
+        elapsed = time.perf_counter() - started
+        pool.shutdown()
+        return logins / elapsed
@@ -0,0 +1,58 @@
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import jwt
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from jwt.algorithms import has_crypto
+
+from myapp.tokens import KeySetBackend, SigningKey, generate_key_pair
+
+ALGORITHMS = ('HS256', 'RS256', 'ES256', 'EdDSA')
+
+
+class Command(BaseCommand):
+    help = 'Measure JWT sign and verify throughput per signing algorithm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = options['tokens']
+        payload = {'token_type': 'access', 'exp': int(time.time()) + 3600, 'user_id': '1', 'username': 'benchmark'}
+        self.stdout.write(f'{count} tokens per measurement, tokens/second')
+        with TemporaryDirectory() as directory, override_settings(API_JWT_KEY_DIR=directory):
+            for algorithm in ALGORITHMS:
+                if algorithm != 'HS256' and not has_crypto:
+                    self.stdout.write(self.style.WARNING(f'  {algorithm:<6} skipped: needs the cryptography package'))
+                    continue
+                key = self.make_key(algorithm, Path(directory))
+                backend = KeySetBackend([key])
+
+                started = time.perf_counter()
+                tokens = [backend.encode(payload) for _ in range(count)]
+                signed = count / (time.perf_counter() - started)
+
+                started = time.perf_counter()
+                for token in tokens:
+                    backend.decode(token)
+                verified = count / (time.perf_counter() - started)
+
+                line = f'  {algorithm:<6} sign {signed:10.0f}   verify {verified:10.0f}'
+                if key.public:
+                    # What verification costs when the PEM is parsed per token
+                    pem = (Path(directory) / f'{algorithm}.pub.pem').read_bytes()
+                    started = time.perf_counter()
+                    for token in tokens:
+                        jwt.decode(token, pem, algorithms=[algorithm])
+                    line += f'   verify, parsing the PEM per token {count / (time.perf_counter() - started):10.0f}'
+                self.stdout.write(line)
+
+    def make_key(self, algorithm, directory):
+        if algorithm == 'HS256':
+            return SigningKey('benchmark', algorithm, secret='benchmark-secret-' * 4)
+        private, public = generate_key_pair(algorithm)
+        (directory / f'{algorithm}.pem').write_bytes(private)
+        (directory / f'{algorithm}.pub.pem').write_bytes(public)
+        return SigningKey(algorithm, algorithm, private_key=f'{algorithm}.pem')
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from myapp.models import Employee
+from myapp.querysets import apply_employee_filters
+
+from ._benchmark import rolled_back, seed, timed
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the legacy name__icontains employee filter with the indexed '
+        'name_prefix / name_exact / name_contains modes on synthetic data (rolled back afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--explain', action='store_true', help='Print the query plan of each filter')
+
+    def handle(self, *args, **options):
+        employees = options['employees']
+        with rolled_back():
+            seed(organizations=100, companies=1000, employees=employees, stdout=self.stdout)
+            exact_name = Employee.objects.order_by('id').values_list('name', flat=True)[employees // 2]
+
+            cases = [
+                ('before: name__icontains', Employee.objects.filter(name__icontains='grace hop')),
+                ('name_prefix', apply_employee_filters(Employee.objects.all(), {'name_prefix': 'grace hop'})),
+                ('name_exact', apply_employee_filters(Employee.objects.all(), {'name_exact': exact_name})),
+                ('name_contains', apply_employee_filters(Employee.objects.all(), {'name_contains': 'grace hop'})),
+            ]
+            self.stdout.write(f'{connection.vendor}, {employees} employees, median of {options["repeat"]}')
+            for label, queryset in cases:
+                page = queryset.order_by('id')[:100]
+                count_ms = timed(queryset.count, options['repeat'])
+                page_ms = timed(lambda page=page: list(page.values_list('id', flat=True)), options['repeat'])
+                self.stdout.write(
+                    f'  {label:<26} count {count_ms:9.2f} ms   first page {page_ms:9.2f} ms'
+                )
+                if options['explain']:
+                    self.stdout.write('    ' + queryset.values('id').explain().replace('\n', '\n    '))
@@ -0,0 +1,50 @@
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from myapp.fastpath import row_plan
+from myapp.parsers import ORJSONParser
+from myapp.querysets import employee_queryset
+from myapp.renderers import ORJSONRenderer, orjson
+from myapp.serializers import EmployeeSerializer
+
+from ._benchmark import rolled_back, seed, timed
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare render and parse times of the stdlib JSONRenderer/JSONParser with the '
+        'orjson-backed ORJSONRenderer/ORJSONParser on an employee list payload'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; ORJSONRenderer falls back to json'))
+        employees = options['employees']
+        with rolled_back():
+            seed(organizations=100, companies=1000, employees=employees, stdout=self.stdout)
+            plan = row_plan(EmployeeSerializer)
+            payload = {'next': None, 'previous': None, 'results': plan.serialize(list(plan.project(employee_queryset())))}
+
+        stdlib, fast = JSONRenderer(), ORJSONRenderer()
+        body = stdlib.render(payload)
+        if fast.render(payload) != body:
+            raise CommandError('ORJSONRenderer output differs from JSONRenderer')
+
+        results = [
+            ('render', lambda: stdlib.render(payload), lambda: fast.render(payload)),
+            ('parse', lambda: JSONParser().parse(io.BytesIO(body)), lambda: ORJSONParser().parse(io.BytesIO(body))),
+        ]
+        self.stdout.write(f'{len(payload["results"])} employees, {len(body) / 1e6:.1f} MB, median of {options["repeat"]}')
+        for label, baseline, candidate in results:
+            baseline_ms = timed(baseline, options['repeat'])
+            candidate_ms = timed(candidate, options['repeat'])
+            self.stdout.write(
+                f'  {label:<7} json {baseline_ms:8.1f} ms   orjson {candidate_ms:8.1f} ms   ({baseline_ms / candidate_ms:.1f}x)'
+            )
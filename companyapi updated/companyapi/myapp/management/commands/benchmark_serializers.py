@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from myapp.fastpath import row_plan
+from myapp.querysets import company_queryset, employee_queryset, organization_queryset
+from myapp.serializers import (
+    CompanySerializer,
+    EmployeeSerializer,
+    OrganizationSerializer,
+)
+
+from ._benchmark import rolled_back, seed, timed
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare DRF serialization of list pages with the values_list() fast path '
+        'on synthetic data (rolled back afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Top-level rows serialized per run')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        repeat = options['repeat']
+        with rolled_back():
+            # Ten employees per company, ten companies per organization
+            seed(organizations=max(rows // 100, 1), companies=max(rows // 10, 1), employees=rows, stdout=self.stdout)
+            cases = [
+                ('employees', employee_queryset(), EmployeeSerializer),
+                ('companies', company_queryset(), CompanySerializer),
+                ('organizations', organization_queryset(), OrganizationSerializer),
+            ]
+            self.stdout.write(f'median of {repeat}, rows/s counts top-level rows (nested rows included in the work)')
+            for label, queryset, serializer_class in cases:
+                queryset = queryset.order_by('id')[:rows]
+                plan = row_plan(serializer_class)
+                drf = lambda serializer_class=serializer_class, queryset=queryset: (
+                    serializer_class(list(queryset), many=True).data
+                )
+                fast = lambda plan=plan, queryset=queryset: plan.serialize(list(plan.project(queryset)))
+                if JSONRenderer().render(drf()) != JSONRenderer().render(fast()):
+                    raise CommandError(f'The fast path rendered different JSON for {label}')
+                count = len(fast())
+                drf_ms = timed(drf, repeat)
+                fast_ms = timed(fast, repeat)
+                self.stdout.write(
+                    f'  {label:<14} {count:>7} rows   DRF {count / drf_ms * 1000:>10,.0f} rows/s   '
+                    f'fast path {count / fast_ms * 1000:>10,.0f} rows/s   ({drf_ms / fast_ms:.1f}x)'
+                )
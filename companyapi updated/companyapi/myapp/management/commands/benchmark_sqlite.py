@@ -0,0 +1,128 @@
+import random
+import sqlite3
+import statistics
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+
+from myapp.models import Employee
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent reads (employee pages) and writes (read-modify-write transactions on an '
+        'employee) against copies of the SQLite database, once with SQLite\'s defaults on a single '
+        'connection alias ("before") and once in WAL mode with the production profile, reads going '
+        'to a query_only connection ("after"). Reports throughput, p99 latency and "database is locked" errors.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Share of operations that write')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The default database is not SQLite')
+        ids = list(Employee.objects.using('default').values_list('id', flat=True))
+        if not ids:
+            raise CommandError('No employees to read and write; import or seed some first')
+
+        self.stdout.write(
+            f'{options["threads"]} threads for {options["seconds"]:.0f}s each, '
+            f'{options["write_ratio"]:.0%} writes, {len(ids)} employees'
+        )
+        profiles = [
+            ('before', 'DELETE', {}, None),
+            # A deployment switches its file to WAL once with `manage.py enable_wal`
+            ('after', 'WAL', settings.SQLITE_PRODUCTION_OPTIONS, 'PRAGMA query_only=ON'),
+        ]
+        with TemporaryDirectory() as directory:
+            for label, journal_mode, profile, read_only in profiles:
+                path = Path(directory) / f'{label}.sqlite3'
+                connection.cursor().execute('VACUUM INTO %s', [str(path)])
+                with closing(sqlite3.connect(path)) as copy:
+                    copy.execute(f'PRAGMA journal_mode={journal_mode}')
+                write_alias = f'benchmark_{label}'
+                self.add_alias(write_alias, path, profile)
+                read_alias = write_alias
+                if read_only is not None:
+                    read_alias = f'{write_alias}_readonly'
+                    init_command = ';'.join([profile.get('init_command', ''), read_only])
+                    self.add_alias(read_alias, path, {'init_command': init_command})
+                try:
+                    self.report(label, options['seconds'], self.run(ids, write_alias, read_alias, options))
+                finally:
+                    connections.settings.pop(write_alias)
+                    connections.settings.pop(read_alias, None)
+
+    def add_alias(self, alias, path, options):
+        connections.settings[alias] = {**connections.settings['default'], 'NAME': path, 'OPTIONS': options}
+
+    def run(self, ids, write_alias, read_alias, options):
+        """Per-kind latencies and failures of the threads' operations until the deadline"""
+        results = {'read': [], 'write': []}
+        failures = {'read': 0, 'write': 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['seconds']
+
+        def worker(seed):
+            rng = random.Random(seed)
+            try:
+                while time.perf_counter() < deadline:
+                    kind = 'write' if rng.random() < options['write_ratio'] else 'read'
+                    started = time.perf_counter()
+                    try:
+                        if kind == 'write':
+                            self.write(write_alias, rng.choice(ids))
+                        else:
+                            self.read(read_alias, rng.choice(ids))
+                    except OperationalError as exc:
+                        if 'locked' not in str(exc):
+                            raise
+                        with lock:
+                            failures[kind] += 1
+                        continue
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        results[kind].append(elapsed)
+            finally:
+                connections[write_alias].close()
+                connections[read_alias].close()
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, failures
+
+    def read(self, alias, employee_id):
+        page = Employee.objects.using(alias).filter(id__gte=employee_id).order_by('id')
+        list(page.values_list('id', 'name', 'position')[:50])
+
+    def write(self, alias, employee_id):
+        # Like Model.save() after a lookup: read, then write in one transaction
+        with transaction.atomic(using=alias):
+            position = Employee.objects.using(alias).filter(pk=employee_id).values_list('position', flat=True).first()
+            Employee.objects.using(alias).filter(pk=employee_id).update(position=position)
+
+    def report(self, label, seconds, outcome):
+        results, failures = outcome
+        self.stdout.write(f'  {label}:')
+        for kind, latencies in results.items():
+            latencies = sorted(elapsed * 1000 for elapsed in latencies)
+            if latencies:
+                p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+                timing = f'p50 {statistics.median(latencies):7.1f} ms   p99 {p99:7.1f} ms'
+            else:
+                timing = 'no successful operations'
+            self.stdout.write(
+                f'    {kind + "s":<6} {len(latencies) / seconds:8.1f}/s   {timing}   {failures[kind]} locked'
+            )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Switch a SQLite database file to write-ahead logging, so readers go on while a transaction '
+        'writes. The journal mode is stored in the file; run this once per deployment, alongside '
+        'API_SQLITE_PROFILE=production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Alias of the database to switch')
+        parser.add_argument(
+            '--mode', default='WAL', choices=['WAL', 'DELETE'],
+            help='Journal mode to set; DELETE switches back to SQLite\'s default',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'The {options["database"]} database is not SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode={options["mode"]}')
+            (mode,) = cursor.fetchone()
+        if mode.upper() != options['mode']:
+            # SQLite keeps the old mode while other connections have the file open
+            raise CommandError(f'{connection.settings_dict["NAME"]} stayed in journal mode {mode}')
+        self.stdout.write(f'{connection.settings_dict["NAME"]} is in journal mode {mode}')
@@ -0,0 +1,38 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from myapp.tokens import ASYMMETRIC_ALGORITHMS, generate_key_pair
+
+
+class Command(BaseCommand):
+    help = (
+        'Write a new JWT signing key pair to API_JWT_KEY_DIR and print its API_JWT_KEYS entry; '
+        'prepend the entry to rotate to the new key'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--algorithm', choices=sorted(ASYMMETRIC_ALGORITHMS), default='EdDSA')
+        parser.add_argument('--kid', help='Key id; defaults to the current date and time')
+
+    def handle(self, *args, **options):
+        kid = options['kid'] or timezone.now().strftime('%Y%m%d%H%M%S')
+        directory = Path(settings.API_JWT_KEY_DIR)
+        private_file, public_file = f'{kid}.pem', f'{kid}.pub.pem'
+        if (directory / private_file).exists():
+            raise CommandError(f'{directory / private_file} already exists')
+        try:
+            private, public = generate_key_pair(options['algorithm'])
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / private_file).touch(mode=0o600)
+        (directory / private_file).write_bytes(private)
+        (directory / public_file).write_bytes(public)
+        self.stdout.write(f'Wrote {directory / private_file} and {directory / public_file}')
+        self.stdout.write(json.dumps({'kid': kid, 'algorithm': options['algorithm'], 'private_key': private_file}))
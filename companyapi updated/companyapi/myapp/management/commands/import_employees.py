@@ -0,0 +1,64 @@
+import contextlib
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.importer import (
+    IMPORT_FORMATS,
+    EmployeeImporter,
+    ImportFormatError,
+    guess_format,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream organizations, companies and employees from a CSV or NDJSON file '
+        '(the columns of the employee export) into the database in batches'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input")
+        parser.add_argument(
+            '--format', choices=sorted(IMPORT_FORMATS),
+            help='Input format; guessed from the file extension when omitted',
+        )
+        parser.add_argument('--batch-size', type=int, help='Rows per INSERT batch and transaction')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        path = options['path']
+        import_format = options['format'] or guess_format(path)
+        if import_format is None:
+            raise CommandError('Cannot tell the input format from the file name; pass --format')
+
+        importer = EmployeeImporter(batch_size=options['batch_size'])
+        try:
+            if path == '-':
+                importer.run(IMPORT_FORMATS[import_format](sys.stdin.buffer), progress=self.progress)
+            else:
+                with contextlib.ExitStack() as stack:
+                    try:
+                        stream = stack.enter_context(open(path, 'rb'))
+                    except OSError as exc:
+                        raise CommandError(f'Cannot open {path}: {exc}')
+                    importer.run(IMPORT_FORMATS[import_format](stream), progress=self.progress)
+        except ImportFormatError as exc:
+            self.report(importer.summary(), self.style.WARNING)
+            where = f'line {exc.line}' if exc.line is not None else path
+            raise CommandError(f'{where}: {exc}; the rows before it were imported')
+        self.report(importer.summary(), self.style.SUCCESS)
+
+    def report(self, summary, style):
+        for error in summary['errors']:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        created = summary['created']
+        self.stdout.write(style(
+            f"Imported {summary['rows']} rows in {summary['seconds']:.1f}s ({summary['rows_per_second']} rows/s): "
+            f"{created['organizations']} organizations, {created['companies']} companies, "
+            f"{created['employees']} employees created, {summary['error_count']} rows rejected"
+        ))
+
+    def progress(self, summary):
+        if self.verbosity >= 2:
+            self.stdout.write(f"  {summary['rows']} rows, {summary['rows_per_second']} rows/s")
@@ -0,0 +1,74 @@
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from myapp.registration import register_users
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure signups/second: concurrent POST /api/auth/register/ requests, then one bulk '
+        'registration. Users are committed to the database and deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--bulk', type=int, default=500, help='Users in the bulk registration; 0 to skip')
+
+    def handle(self, *args, **options):
+        prefix = f'loadtest-{uuid.uuid4().hex[:8]}-'
+        try:
+            self.single(prefix, options['signups'], options['concurrency'])
+            if options['bulk']:
+                self.bulk(prefix, options['bulk'])
+        finally:
+            deleted, _ = User.objects.filter(username__startswith=prefix).delete()
+            self.stdout.write(f'Deleted {deleted} load test users')
+
+    def single(self, prefix, signups, concurrency):
+        def signup(number):
+            client = Client(SERVER_NAME='localhost')
+            started = time.perf_counter()
+            response = client.post(
+                '/api/auth/register/',
+                {'username': f'{prefix}{number}', 'password': f'password-{number}'},
+                content_type='application/json',
+            )
+            return response.status_code, time.perf_counter() - started
+
+        def worker(numbers):
+            try:
+                return [signup(number) for number in numbers]
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = [
+                result
+                for batch in executor.map(worker, [range(i, signups, concurrency) for i in range(concurrency)])
+                for result in batch
+            ]
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(seconds * 1000 for _, seconds in results)
+        failed = sum(code != 201 for code, _ in results)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f'single: {signups} signups, {concurrency} concurrent clients: {signups / elapsed:.1f} signups/s, '
+            f'p50 {statistics.median(latencies):.0f} ms, p99 {p99:.0f} ms, {failed} failed'
+        )
+
+    def bulk(self, prefix, count):
+        rows = [{'username': f'{prefix}bulk-{i}', 'password': f'password-{i}'} for i in range(count)]
+        started = time.perf_counter()
+        users, errors = register_users(rows)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'bulk: {len(users)} users in {elapsed:.1f}s: {len(users) / elapsed:.1f} signups/s, {len(errors)} failed')
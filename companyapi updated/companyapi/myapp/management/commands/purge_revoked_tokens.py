@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapp.revocation import revoked_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete revoked refresh tokens that have expired; run periodically (e.g. hourly from cron)'
+
+    def handle(self, *args, **options):
+        deleted = revoked_tokens.purge()
+        self.stdout.write(f'Purged {deleted} expired revoked tokens')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from myapp.search import install_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Create the full-text search index if missing and repopulate it from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to index')
+
+    def handle(self, *args, **options):
+        install_search_index(using=options['database'])
+        rebuild_search_index(using=options['database'])
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
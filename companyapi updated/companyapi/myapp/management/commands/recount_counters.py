@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from myapp.counters import find_drift, refresh_counters, refresh_employee_organizations
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized counters and Employee.organization and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report drift; exit with an error if any counter is wrong',
+        )
+
+    def handle(self, *args, **options):
+        companies, organizations, employees = find_drift()
+        company_drift = companies.count()
+        organization_drift = organizations.count()
+        employee_drift = employees.count()
+        self.stdout.write(
+            f'{company_drift} companies and {organization_drift} organizations have drifted counters, '
+            f'{employee_drift} employees have a stale organization'
+        )
+
+        if options['check']:
+            if company_drift or organization_drift or employee_drift:
+                raise CommandError('Counters are out of date; run without --check to repair them')
+            return
+
+        with transaction.atomic():
+            refresh_employee_organizations()
+            refresh_counters()
+        self.stdout.write(self.style.SUCCESS('Counters recomputed'))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:31
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Organization = apps.get_model('myapp', 'Organization')
+    Company = apps.get_model('myapp', 'Company')
+    Employee = apps.get_model('myapp', 'Employee')
+
+    def count_of(queryset, group_field):
+        counts = queryset.order_by().values(group_field).annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    Company.objects.update(
+        employee_count=count_of(Employee.objects.filter(company=OuterRef('pk')), 'company')
+    )
+    Organization.objects.update(
+        company_count=count_of(Company.objects.filter(organization=OuterRef('pk')), 'organization'),
+        employee_count=count_of(
+            Employee.objects.filter(company__organization=OuterRef('pk')), 'company__organization'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='employee_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='company_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='employee_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:35
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def create_trigram_index(apps, schema_editor):
+    # Substring (name_contains) lookups on name_search can only use an index
+    # on PostgreSQL, through pg_trgm; other backends keep the B-tree only.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS myapp_employee_name_search_trgm '
+        'ON myapp_employee USING gin (name_search gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS myapp_employee_name_search_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='name_search',
+            field=models.GeneratedField(db_index=True, db_persist=True, expression=django.db.models.functions.text.Lower('name'), output_field=models.CharField(max_length=100)),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_organization(apps, schema_editor):
+    Company = apps.get_model('myapp', 'Company')
+    Employee = apps.get_model('myapp', 'Employee')
+    Employee.objects.update(
+        organization_id=Subquery(Company.objects.filter(pk=OuterRef('company_id')).values('organization_id'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_employee_name_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='organization',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='employees', to='myapp.organization'),
+        ),
+        migrations.RunPython(populate_organization, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='employee',
+            name='organization',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='employees', to='myapp.organization'),
+        ),
+        migrations.AlterField(
+            model_name='employee',
+            name='company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='employees', to='myapp.company'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['company', 'id'], name='employee_company_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['organization', 'id'], name='employee_org_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['company', 'name_search'], name='employee_company_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['organization', 'name_search'], name='employee_org_name_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:41
+
+from django.db import migrations, models
+
+
+def create_table_versions(apps, schema_editor):
+    TableVersion = apps.get_model('myapp', 'TableVersion')
+    for table in ('organization', 'company', 'employee'):
+        TableVersion.objects.get_or_create(table=table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_employee_organization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                ('table', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='version',
+            field=models.PositiveBigIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='version',
+            field=models.PositiveBigIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='version',
+            field=models.PositiveBigIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(create_table_versions, migrations.RunPython.noop),
+    ]
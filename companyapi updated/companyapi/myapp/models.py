@@ -1,24 +1,171 @@
-from django.db import models
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import models, router, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.dispatch import Signal
 
 # Create your models here.
 
-class Organization(models.Model):
+# A delete() of tracked rows collects the maintenance its post_delete
+# handlers owe, for the rows it removes and those it cascades to, in the
+# batch dict of current_deletion. deletion_finished is then sent with that
+# batch so myapp.signals applies it once, in the delete's transaction.
+current_deletion = ContextVar('current_deletion', default=None)
+deletion_finished = Signal()
+
+
+@contextmanager
+def deletion(model, using):
+    if current_deletion.get() is not None:
+        # Part of an enclosing delete()
+        yield
+        return
+    batch = {}
+    token = current_deletion.set(batch)
+    try:
+        with transaction.atomic(using=using):
+            yield
+            deletion_finished.send(sender=model, batch=batch)
+    finally:
+        current_deletion.reset(token)
+
+
+class TrackedQuerySet(models.QuerySet):
+    def delete(self):
+        with deletion(self.model, self.db):
+            return super().delete()
+
+
+class TrackedModel(models.Model):
+    """Base for models with change tracking and denormalized counters
+
+    version and updated_at describe the row's API representation (including
+    nested children) and back the ETag / Last-Modified headers; see
+    myapp.versions. Every save of an existing row increments version in the
+    database. A regular save() never writes the counter columns, so a stale
+    in-memory instance can't clobber counts updated by concurrent writes
+    (see myapp.counters).
+    """
+    version = models.PositiveBigIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TrackedQuerySet.as_manager()
+
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version = F('version') + 1
+            if kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and not field.generated and field.name not in self.counter_fields
+                ]
+            else:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
+        # Keep the row and the parent counters updated by the signals in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        if not isinstance(self.version, int):
+            # Reload the incremented value lazily on next access
+            del self.version
+
+    def delete(self, using=None, keep_parents=False):
+        with deletion(type(self), using or router.db_for_write(type(self), instance=self)):
+            return super().delete(using=using, keep_parents=keep_parents)
+
+
+class TableVersion(models.Model):
+    """Per-table change counter backing the ETags of the list endpoints"""
+    table = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.table} v{self.version}"
+
+
+class RevokedToken(models.Model):
+    """Refresh token that may no longer be used, by jti; see myapp.revocation"""
+    jti = models.CharField(max_length=255, unique=True)
+    # Rows are purged once the token would have expired anyway
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class Organization(TrackedModel):
     name = models.CharField(max_length=100)
+    company_count = models.PositiveIntegerField(default=0, editable=False)
+    employee_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('company_count', 'employee_count')
 
     def __str__(self):
         return self.name
 
-class Company(models.Model):
+class Company(TrackedModel):
     name = models.CharField(max_length=100)
     organization = models.ForeignKey(Organization, related_name='companies', on_delete=models.CASCADE)
+    employee_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('employee_count',)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded parent so the signals can detect moves
+        if 'organization_id' in instance.__dict__:
+            instance._loaded_organization_id = instance.organization_id
+        return instance
 
     def __str__(self):
         return self.name
 
-class Employee(models.Model):
+class Employee(TrackedModel):
     name = models.CharField(max_length=100)
     position = models.CharField(max_length=100, blank=True)
-    company = models.ForeignKey(Company, related_name='employees', on_delete=models.CASCADE)
+    # The single-column FK indexes are covered by the composite indexes below
+    company = models.ForeignKey(Company, related_name='employees', on_delete=models.CASCADE, db_index=False)
+    # Copy of company.organization maintained by myapp.signals, so filtering
+    # employees by organization is an index lookup instead of a join
+    organization = models.ForeignKey(
+        Organization, related_name='employees', on_delete=models.CASCADE, db_index=False, editable=False
+    )
+    # Lowercased copy of name maintained by the database; backs the indexed
+    # name_prefix / name_exact / name_contains filters
+    name_search = models.GeneratedField(
+        expression=Lower('name'),
+        output_field=models.CharField(max_length=100),
+        db_persist=True,
+        db_index=True,
+    )
+
+    class Meta:
+        indexes = [
+            # company / organization filters walked in keyset (id) order
+            models.Index(fields=['company', 'id'], name='employee_company_id_idx'),
+            models.Index(fields=['organization', 'id'], name='employee_org_id_idx'),
+            # company / organization filters combined with the name filters
+            models.Index(fields=['company', 'name_search'], name='employee_company_name_idx'),
+            models.Index(fields=['organization', 'name_search'], name='employee_org_name_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded parent so the signals can detect moves
+        if 'company_id' in instance.__dict__ and 'organization_id' in instance.__dict__:
+            instance._loaded_company_id = instance.company_id
+            instance._loaded_organization_id = instance.organization_id
+        return instance
 
     def __str__(self):
         return f"{self.name} ({self.position})"
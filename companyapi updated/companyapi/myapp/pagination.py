@@ -0,0 +1,97 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.settings import api_settings
+
+from .fastpath import row_plan
+
+
+class PrimaryKeyCursorPagination(CursorPagination):
+    """Keyset pagination on the primary key with opaque next/previous cursors
+
+    Every page is a `WHERE id > <cursor> ORDER BY id LIMIT n` lookup on the
+    primary key index, so deep pages cost the same as the first one.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE
+        self.max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def decode_cursor(self, request):
+        """The request's cursor, with its position parsed as a primary key"""
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            position = int(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        # Out of the range of a 64-bit id column, which the backend would reject
+        if not -2 ** 63 <= position < 2 ** 63:
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=cursor.offset, reverse=cursor.reverse, position=position)
+
+
+def paginate(request, queryset, serializer_class, selection=None):
+    """Serialize one cursor page of the queryset and wrap it in next/previous links
+
+    Uses the values_list() fast path of myapp.fastpath when the serializer
+    supports it and settings.API_FAST_LIST_SERIALIZATION is on.
+    """
+    paginator = PrimaryKeyCursorPagination()
+    plan = row_plan(serializer_class, selection) if settings.API_FAST_LIST_SERIALIZATION else None
+    if plan is not None:
+        page = paginator.paginate_queryset(plan.project(queryset), request)
+        return paginator.get_paginated_response(plan.serialize(page))
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = serializer_class(page, many=True, selection=selection)
+    return paginator.get_paginated_response(serializer.data)
+
+
+async def apaginate(request, queryset, serializer_class, selection=None):
+    """paginate() for async views: the same cursors and page shape, read with the async ORM
+
+    request is a DRF Request wrapping the Django one. Only the primary key
+    ordering of PrimaryKeyCursorPagination is supported, where a cursor is a
+    position alone. Serializers without a fast path are serialized in a
+    thread.
+    """
+    paginator = PrimaryKeyCursorPagination()
+    paginator.base_url = request.build_absolute_uri()
+    page_size = paginator.get_page_size(request)
+    cursor = paginator.decode_cursor(request)
+    reverse = cursor is not None and cursor.reverse
+    position = cursor.position if cursor is not None else None
+
+    if position is not None:
+        queryset = queryset.filter(**{'id__lt' if reverse else 'id__gt': position})
+    queryset = queryset.order_by('-id' if reverse else 'id')[:page_size + 1]
+
+    plan = row_plan(serializer_class, selection) if settings.API_FAST_LIST_SERIALIZATION else None
+    rows = [row async for row in (plan.project(queryset) if plan is not None else queryset)]
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+
+    if plan is not None:
+        results = await plan.aserialize(rows)
+    else:
+        results = await sync_to_async(lambda: serializer_class(rows, many=True, selection=selection).data)()
+
+    # Rows ahead exist after a full forward page, or behind when we paged backwards
+    next_position = rows[-1].id if rows else position
+    previous_position = rows[0].id if rows else position
+    next_cursor = previous_cursor = None
+    if next_position is not None and (has_more if not reverse else position is not None):
+        next_cursor = Cursor(offset=0, reverse=False, position=next_position)
+    if previous_position is not None and (has_more if reverse else position is not None):
+        previous_cursor = Cursor(offset=0, reverse=True, position=previous_position)
+    return {
+        'next': paginator.encode_cursor(next_cursor) if next_cursor else None,
+        'previous': paginator.encode_cursor(previous_cursor) if previous_cursor else None,
+        'results': results,
+    }
@@ -0,0 +1,30 @@
+from rest_framework.exceptions import ValidationError
+
+# Parsing of the numeric query-string parameters shared by the synchronous
+# and the async views. A bad value raises ValidationError, which DRF (and
+# myapp.async_views.authenticated) answers with a 400 {"error": ...}.
+
+
+def _decimal(value):
+    # str.isdigit() also accepts characters such as '²' that int() rejects
+    return value.isascii() and value.isdecimal()
+
+
+def positive_int(params, name, default=None):
+    """The parameter as an int of at least 1, or default when it is absent"""
+    value = params.get(name)
+    if value is None:
+        return default
+    if not _decimal(value) or int(value) < 1:
+        raise ValidationError({'error': f'{name} must be a positive integer'})
+    return int(value)
+
+
+def object_id(params, name):
+    """The parameter as a row id, or None when it is absent or empty"""
+    value = params.get(name)
+    if not value:
+        return None
+    if not _decimal(value):
+        raise ValidationError({'error': f'{name} must be an id'})
+    return int(value)
@@ -0,0 +1,115 @@
+import string
+
+from django.db import connections
+from django.db.models import Prefetch, Q, Value
+from django.db.models.functions import Lower
+
+from .fieldsets import FieldSelection
+from .models import Company, Employee, Organization
+from .params import object_id
+
+# Query plans for the nested serializers.
+#
+# EmployeeSerializer reads company.name and organization.name,
+# CompanySerializer embeds employees and reads organization.name, and
+# OrganizationSerializer embeds companies. Each function below returns a
+# queryset that loads everything its serializer touches up front, so
+# serializing N rows costs a constant number of queries instead of one (or
+# more) per row. Given a FieldSelection (see myapp.fieldsets) it joins and
+# prefetches only the relations that selection serializes. Counts are read
+# from the denormalized counter columns and need no extra work here.
+# Embedded rows are ordered by id (myapp.fastpath relies on the same order).
+
+
+def employee_queryset(selection=None):
+    """Employees with their company and organization joined in"""
+    selection = selection or FieldSelection()
+    related = [
+        relation for field, relation in (('company_name', 'company'), ('organization_name', 'organization'))
+        if selection.includes(field)
+    ]
+    if not related:
+        return Employee.objects.all()
+    return Employee.objects.select_related(*related)
+
+
+def company_queryset(selection=None):
+    """Companies with organization joined and employees prefetched"""
+    selection = selection or FieldSelection()
+    companies = Company.objects.all()
+    if selection.includes('organization_name'):
+        companies = companies.select_related('organization')
+    employees = selection.child('employees')
+    if employees is not None:
+        companies = companies.prefetch_related(
+            Prefetch('employees', queryset=employee_queryset(employees).order_by('id'))
+        )
+    return companies
+
+
+def organization_queryset(selection=None):
+    """Organizations with the company/employee tree prefetched"""
+    selection = selection or FieldSelection()
+    companies = selection.child('companies')
+    if companies is None:
+        return Organization.objects.all()
+    return Organization.objects.prefetch_related(
+        Prefetch('companies', queryset=company_queryset(companies).order_by('id'))
+    )
+
+
+# SQLite's LOWER() folds ASCII letters only (without the ICU extension)
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def name_key(value, vendor):
+    """value folded like Lower('name') folds name into name_search
+
+    Python's lower() also folds letters such as É that SQLite's LOWER() leaves
+    alone, so "Émile" would never match; on SQLite the value is folded the
+    same ASCII-only way, elsewhere the database folds it.
+    """
+    if vendor == 'sqlite':
+        return value.translate(_ASCII_LOWER)
+    return Lower(Value(value))
+
+
+def name_prefix_condition(prefix, vendor):
+    """Prefix match of a name_key() on the lowercased name_search column
+
+    SQLite never uses an index for LIKE against a BINARY column, so there
+    the prefix is also expressed as a half-open range the B-tree can seek.
+    """
+    condition = Q(name_search__startswith=prefix)
+    if vendor == 'sqlite' and prefix and ord(prefix[-1]) < 0x10FFFF:
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        condition &= Q(name_search__gte=prefix, name_search__lt=upper)
+    return condition
+
+
+def apply_employee_filters(queryset, params):
+    """Apply the query-string filters shared by the employee list views
+
+    name_exact, name_prefix and name_contains (or plain name, an alias of
+    name_contains) match case-insensitively (on SQLite, for ASCII letters
+    only) against the indexed name_search column; company and organization
+    match by id, and a value that isn't one raises ValidationError.
+    """
+    vendor = connections[queryset.db].vendor
+    name_exact = params.get('name_exact')
+    name_prefix = params.get('name_prefix')
+    name_contains = params.get('name_contains') or params.get('name')
+    company = object_id(params, 'company')
+    organization = object_id(params, 'organization')
+
+    if name_exact:
+        queryset = queryset.filter(name_search=name_key(name_exact.strip(), vendor))
+    if name_prefix:
+        queryset = queryset.filter(name_prefix_condition(name_key(name_prefix.strip(), vendor), vendor))
+    if name_contains:
+        queryset = queryset.filter(name_search__contains=name_key(name_contains.strip(), vendor))
+    if company is not None:
+        queryset = queryset.filter(company_id=company)
+    if organization is not None:
+        queryset = queryset.filter(organization_id=organization)
+    return queryset
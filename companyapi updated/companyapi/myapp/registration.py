@@ -0,0 +1,143 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.db import IntegrityError, transaction
+
+from .hashers import hashing_pool
+
+# User registration, single and bulk.
+#
+# A single registration is one INSERT: the unique username constraint, not a
+# prior lookup, detects taken names, which also settles concurrent signups
+# for the same name. Its password is hashed on the bounded thread pool of
+# myapp.hashers like a login's.
+#
+# Bulk registration (admin provisioning) hashes its passwords in a pool of
+# API_REGISTRATION_PROCESSES processes, in one chunk per process, and
+# inserts the users with bulk_create. The children receive the preferred
+# hasher itself, tuned parameters included, so they need no Django setup.
+
+MAX_USERNAME_LENGTH = 150
+
+
+class UsernameTaken(Exception):
+    def __init__(self, username):
+        super().__init__('Username already exists')
+        self.username = username
+
+
+def register_user(username, email, password):
+    """Create a user with one INSERT; raise UsernameTaken or HashingBusy"""
+    user_model = get_user_model()
+    user = user_model(
+        username=user_model.normalize_username(username),
+        email=user_model.objects.normalize_email(email or ''),
+        password=hashing_pool.run(make_password, password),
+    )
+    try:
+        with transaction.atomic():
+            user.save(force_insert=True)
+    except IntegrityError:
+        raise UsernameTaken(username)
+    return user
+
+
+def hash_passwords(hasher, passwords):
+    """Encode passwords with a hasher instance; runs in the worker processes"""
+    return [hasher.encode(password, hasher.salt()) for password in passwords]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the server process has threads and open connections
+            _pool = ProcessPoolExecutor(
+                settings.API_REGISTRATION_PROCESSES, mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def hash_in_processes(passwords):
+    """Encoded hashes of passwords, computed in the process pool"""
+    if not passwords:
+        return []
+    hasher = get_hasher()
+    chunks = settings.API_REGISTRATION_PROCESSES
+    size = -(-len(passwords) // chunks)
+    futures = [
+        process_pool().submit(hash_passwords, hasher, passwords[start:start + size])
+        for start in range(0, len(passwords), size)
+    ]
+    return [encoded for future in futures for encoded in future.result()]
+
+
+def _row_errors(row):
+    if not isinstance(row, dict):
+        return {'non_field_errors': ['Expected an object']}
+    errors = {}
+    for key in ('username', 'password'):
+        if not isinstance(row.get(key), str) or not row[key]:
+            errors[key] = ['This field is required']
+    if 'username' not in errors and len(row['username']) > MAX_USERNAME_LENGTH:
+        errors['username'] = [f'At most {MAX_USERNAME_LENGTH} characters']
+    if row.get('email') is not None and not isinstance(row.get('email'), str):
+        errors['email'] = ['Must be a string']
+    return errors
+
+
+def register_users(rows):
+    """Create users from {username, email, password} rows; return (users, errors by index)"""
+    user_model = get_user_model()
+    valid, errors, seen = [], [], set()
+    for index, row in enumerate(rows):
+        row_errors = _row_errors(row)
+        if not row_errors:
+            username = user_model.normalize_username(row['username'])
+            if username in seen:
+                row_errors = {'username': ['Duplicate username']}
+            seen.add(username)
+        if row_errors:
+            errors.append({'index': index, 'errors': row_errors})
+        else:
+            valid.append((index, username, row))
+
+    taken = set(
+        user_model.objects.filter(username__in=[username for _, username, _ in valid])
+        .values_list('username', flat=True)
+    )
+    for index, username, _ in valid:
+        if username in taken:
+            errors.append({'index': index, 'errors': {'username': ['Username already exists']}})
+    valid = [entry for entry in valid if entry[1] not in taken]
+
+    passwords = hash_in_processes([row['password'] for _, _, row in valid])
+    users = [
+        user_model(username=username, email=user_model.objects.normalize_email(row.get('email') or ''), password=encoded)
+        for (_, username, row), encoded in zip(valid, passwords)
+    ]
+    try:
+        with transaction.atomic():
+            user_model.objects.bulk_create(users, batch_size=settings.API_BULK_BATCH_SIZE)
+    except IntegrityError:
+        # A concurrent signup took one of the names; insert one by one to find it
+        created = []
+        for (index, _, _), user in zip(valid, users):
+            try:
+                with transaction.atomic():
+                    user.save(force_insert=True)
+            except IntegrityError:
+                errors.append({'index': index, 'errors': {'username': ['Username already exists']}})
+            else:
+                created.append(user)
+        users = created
+    errors.sort(key=lambda error: error['index'])
+    return users, errors
@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # optional; fall back to the stdlib json module
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson when it is installed
+
+    orjson writes UTF-8 bytes directly and is several times faster than the
+    stdlib encoder DRF uses. The output matches JSONRenderer's compact form:
+    datetimes, lazy strings, decimals and the other types orjson doesn't
+    handle the same way go through DRF's JSONEncoder.default(). Indented
+    output (?indent via the Accept header) and non-default JSON settings
+    fall back to JSONRenderer.
+    """
+    encoder_default = encoders.JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or not (api_settings.COMPACT_JSON and api_settings.UNICODE_JSON and api_settings.STRICT_JSON)
+            or self.get_indent(accepted_media_type or '', renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        rendered = orjson.dumps(
+            data, default=self.encoder_default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+        # Escaped by JSONRenderer so the output is valid JavaScript too
+        if b'\xe2\x80' in rendered:
+            rendered = rendered.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return rendered
+
+
+# Renderers for the streaming export formats. The export view streams its
+# body itself; these make ?format=ndjson|csv and the matching Accept headers
+# negotiate, and render the error responses (401, 400) in the same format.
+# FormatNegotiation answers any other ?format= with a 400 rendered by the
+# first of them, rather than DRF's 404.
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows).encode()
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0]) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue().encode()
+
+
+class FormatNegotiation(DefaultContentNegotiation):
+    """Content negotiation rejecting an unsupported ?format= with a 400 that lists the supported ones"""
+
+    def filter_renderers(self, renderers, format):
+        formats = [renderer.format for renderer in renderers]
+        if format not in formats:
+            raise ValidationError({'error': f'format must be one of: {", ".join(formats)}'})
+        return super().filter_renderers(renderers, format)
+
+
+def content_negotiation_class(negotiation_class):
+    """api_view decorator choosing the view's content negotiation, like DRF's renderer_classes"""
+    def decorator(func):
+        func.content_negotiation_class = negotiation_class
+        return func
+    return decorator
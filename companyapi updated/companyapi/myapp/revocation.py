@@ -0,0 +1,168 @@
+import datetime
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import RevokedToken
+
+# Refresh token revocation (rotation and logout).
+#
+# RevokedToken rows, unique by jti, are the source of truth. Each process
+# keeps a bloom filter of the revoked jtis in front of the table: a jti the
+# filter doesn't contain was certainly never revoked, so checking a valid
+# token costs a few hashes instead of a query. Only filter hits (revoked
+# tokens and the rare false positive) are confirmed against the table.
+#
+# Revocations made by other processes reach the filter when it syncs, at
+# most every API_REVOCATION_SYNC_INTERVAL seconds. Rotation doesn't rely on
+# that window: the refresh view revokes the presented token with an INSERT,
+# and the unique jti lets exactly one request use a refresh token.
+#
+# Expired rows are deleted by `manage.py purge_revoked_tokens`. A bloom
+# filter can't forget, so it is rebuilt from the table after a purge and
+# when it fills past its capacity.
+#
+# One thread at a time syncs or rebuilds, reading the table without holding
+# the lock that revoke() takes; the other threads go on with the current
+# filter meanwhile. A jti revoked here during a rebuild may miss the new
+# filter, and comes back with the next sync.
+
+# Revocations committed this long before a sync are still picked up by it,
+# covering transactions that commit after rows inserted later
+SYNC_OVERLAP = datetime.timedelta(minutes=1)
+
+
+class BloomFilter:
+    """Set of strings with no false negatives and about error_rate false positives"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """Add an item, counting it unless all of its bits were set already"""
+        bits = self.bits
+        new = False
+        for position in self._positions(item):
+            byte, bit = position >> 3, 1 << (position & 7)
+            if not bits[byte] & bit:
+                bits[byte] |= bit
+                new = True
+        # Re-added items (such as those a sync reads again) don't fill the filter
+        if new:
+            self.count += 1
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """Bloom-filter front for the RevokedToken table"""
+
+    def __init__(self):
+        # _lock guards the filter's state; _refreshing is held by the thread
+        # that syncs or rebuilds it
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the filter; it is rebuilt from the table on next use"""
+        with self._lock:
+            self._filter = None
+            self._synced_at = None
+            self._last_sync = 0
+
+    def _rebuild(self):
+        capacity = settings.API_REVOCATION_BLOOM_CAPACITY
+        now = timezone.now()
+        jtis = list(RevokedToken.objects.filter(expires_at__gt=now).values_list('jti', flat=True))
+        bloom = BloomFilter(max(capacity, 2 * len(jtis)), settings.API_REVOCATION_BLOOM_ERROR_RATE)
+        for jti in jtis:
+            bloom.add(jti)
+        with self._lock:
+            self._filter, self._synced_at = bloom, now
+            self._last_sync = time.monotonic()
+        return bloom
+
+    def _sync(self, bloom):
+        with self._lock:
+            since = self._synced_at - SYNC_OVERLAP
+        now = timezone.now()
+        jtis = list(RevokedToken.objects.filter(revoked_at__gte=since).values_list('jti', flat=True))
+        with self._lock:
+            if self._filter is not bloom:
+                # Reset meanwhile
+                return
+            for jti in jtis:
+                bloom.add(jti)
+            self._synced_at = now
+            self._last_sync = time.monotonic()
+
+    def _due(self, bloom):
+        return (
+            bloom is None or bloom.count > bloom.capacity
+            or time.monotonic() - self._last_sync >= settings.API_REVOCATION_SYNC_INTERVAL
+        )
+
+    def bloom(self):
+        """The current filter, rebuilt or synced with the table when due"""
+        bloom = self._filter
+        if not self._due(bloom):
+            return bloom
+        # Without a filter to go on with, wait for the thread building one
+        if not self._refreshing.acquire(blocking=bloom is None):
+            return bloom
+        try:
+            bloom = self._filter
+            if bloom is not None and bloom.count <= bloom.capacity and self._due(bloom):
+                self._sync(bloom)
+                bloom = self._filter
+            if bloom is None or bloom.count > bloom.capacity:
+                bloom = self._rebuild()
+            return bloom
+        finally:
+            self._refreshing.release()
+
+    def is_revoked(self, jti):
+        if jti not in self.bloom():
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, jti, expires_at):
+        """Revoke a jti; False if it was already revoked"""
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+        return True
+
+    def purge(self):
+        """Delete the rows of expired tokens and rebuild the filter; return the number deleted"""
+        deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        with self._refreshing:
+            self._rebuild()
+        return deleted
+
+
+revoked_tokens = RevocationList()
@@ -0,0 +1,233 @@
+import asyncio
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+
+# Read/write splitting between the primary ('default') and the replicas of
+# API_READ_DATABASES (see DATABASES in companyapi/settings.py).
+#
+# replica_routing keeps a RequestRouting for each request in a context
+# variable. ReplicaRouter sends the reads of GET and HEAD requests to a
+# replica, taken round-robin among those that connect. A replica that fails
+# to connect is left out for API_REPLICA_RETRY_SECONDS, and so is one whose
+# query fails (say, a replica file without the tables yet); that query is run
+# again on the primary and its rows are read from there, so the view never
+# sees the failure. Everything else goes to the primary: every
+# write, reads outside requests or in other methods, and reads made while the
+# primary connection is inside a transaction, which must see that
+# transaction's own rows.
+#
+# Replicas may lag behind. When a request writes, the response carries a
+# signed cookie that pins the client's reads to the primary for
+# API_PRIMARY_PIN_SECONDS, so it reads its own writes. Clients that don't keep
+# cookies, such as bearer-token API clients, get the same signed value in the
+# X-Primary-Pin response header and send it back in an X-Primary-Pin request
+# header; clients that do neither get no read-your-writes. The routing follows
+# the request into sync_to_async threads and into the search pool (see
+# myapp.search), but not into the body of a streaming response, whose reads
+# use the primary. myapp.cache leaves out the responses of requests that read
+# from a replica of API_LAGGING_DATABASES.
+
+PIN_COOKIE = 'api_primary'
+PIN_HEADER = 'X-Primary-Pin'
+PIN_SALT = 'myapp.routers.pin'
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+class RequestRouting:
+    """Where the current request reads from, and whether it wrote"""
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+        self.read_lagging = False
+
+
+request_routing = ContextVar('request_routing', default=None)
+
+
+def read_lagging_replica():
+    """Whether the current request read rows that may be behind the primary"""
+    routing = request_routing.get()
+    return routing is not None and routing.read_lagging
+
+
+def _pinned(request):
+    """Whether the client wrote within API_PRIMARY_PIN_SECONDS, by its cookie or header"""
+    max_age = settings.API_PRIMARY_PIN_SECONDS
+    if request.get_signed_cookie(PIN_COOKIE, default=None, salt=PIN_SALT, max_age=max_age) is not None:
+        return True
+    header = request.headers.get(PIN_HEADER)
+    if not header:
+        return False
+    try:
+        signing.TimestampSigner(salt=PIN_SALT).unsign(header, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def _begin(request):
+    use_replicas = request.method in READ_METHODS and not _pinned(request)
+    routing = RequestRouting(use_replicas=use_replicas)
+    return routing, request_routing.set(routing)
+
+
+def _pin(routing, response):
+    if routing.wrote:
+        response.set_signed_cookie(
+            PIN_COOKIE, '1', salt=PIN_SALT, max_age=settings.API_PRIMARY_PIN_SECONDS,
+            httponly=True, samesite='Lax',
+        )
+        response[PIN_HEADER] = signing.TimestampSigner(salt=PIN_SALT).sign('1')
+    return response
+
+
+@sync_and_async_middleware
+def replica_routing(get_response):
+    """Route the reads of GET and HEAD requests to replicas; pin clients that write to the primary"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            routing, token = _begin(request)
+            try:
+                response = await get_response(request)
+            finally:
+                request_routing.reset(token)
+            return _pin(routing, response)
+    else:
+        def middleware(request):
+            routing, token = _begin(request)
+            try:
+                response = get_response(request)
+            finally:
+                request_routing.reset(token)
+            return _pin(routing, response)
+    return middleware
+
+
+class ReplicaSet:
+    """Round-robin over the configured replicas, skipping those that recently failed"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turns = itertools.count()
+        self._down_until = {}
+
+    def choose(self):
+        """Alias of a replica that connects, or None"""
+        aliases = [alias for alias in settings.API_READ_DATABASES if alias in connections.settings]
+        if not aliases:
+            return None
+        with self._lock:
+            start = next(self._turns)
+        now = time.monotonic()
+        for offset in range(len(aliases)):
+            alias = aliases[(start + offset) % len(aliases)]
+            if self._down_until.get(alias, 0) > now:
+                continue
+            if self._connects(alias):
+                return alias
+        return None
+
+    def _connects(self, alias):
+        connection = connections[alias]
+        if connection.connection is not None:
+            return True
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            # Connecting would block the event loop; the thread that runs the
+            # query connects, and is left to the recorded failures
+            return True
+        try:
+            connection.ensure_connection()
+        except DatabaseError:
+            self.mark_down(alias)
+            return False
+        return True
+
+    def mark_down(self, alias):
+        self._down_until[alias] = time.monotonic() + settings.API_REPLICA_RETRY_SECONDS
+
+    def reset(self):
+        self._down_until.clear()
+
+
+replicas = ReplicaSet()
+
+
+def _cancelled(error):
+    """Whether a query was stopped on purpose, by a statement timeout or an interrupt"""
+    cause = error.__cause__
+    # 57014 is PostgreSQL's query_canceled; psycopg 2 calls the code pgcode
+    code = getattr(cause, 'sqlstate', None) or getattr(cause, 'pgcode', None)
+    return code == '57014' or str(cause) == 'interrupted'
+
+
+def _replica_query(execute, sql, params, many, context):
+    try:
+        return execute(sql, params, many, context)
+    except DatabaseError as error:
+        # Says nothing about the replica, and must not run on without its limit
+        if _cancelled(error):
+            raise
+        replicas.mark_down(context['connection'].alias)
+    # Replicas only serve reads, so the query can run again on the primary.
+    # The caller fetches from the replica's cursor wrapper, which is pointed
+    # at the primary's cursor.
+    primary = connections[DEFAULT_DB_ALIAS].cursor()
+    result = primary.executemany(sql, params) if many else primary.execute(sql, params)
+    replica = context['cursor']
+    replica.cursor.close()
+    replica.cursor = primary.cursor
+    return result
+
+
+@receiver(connection_created)
+def watch_replica_queries(sender, connection, **kwargs):
+    """Run a query that fails on a replica on the primary, and leave the replica out"""
+    if connection.alias in settings.API_READ_DATABASES and _replica_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_replica_query)
+
+
+class ReplicaRouter:
+    """Reads of read requests go to a replica, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        routing = request_routing.get()
+        if routing is None or not routing.use_replicas or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        alias = replicas.choose()
+        if alias is None:
+            return DEFAULT_DB_ALIAS
+        if alias in settings.API_LAGGING_DATABASES:
+            routing.read_lagging = True
+        return alias
+
+    def db_for_write(self, model, **hints):
+        routing = request_routing.get()
+        if routing is not None:
+            routing.wrote = True
+        # Also for instances that were read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the primary's rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.API_READ_DATABASES:
+            return False
+        return None
@@ -0,0 +1,404 @@
+import asyncio
+import contextlib
+import contextvars
+import re
+import threading
+import time
+from concurrent import futures
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections, router
+from django.db.models import F, Q
+
+from .models import Company, Employee, Organization
+
+# Full-text search over organization, company and employee names (and
+# employee positions).
+#
+# Each database backend provides ranked_ids(model, terms, limit), returning
+# the primary keys of the best matches in rank order:
+#
+#   * SQLite: one FTS5 external-content table per model (<table>_fts) whose
+#     rowid is the model's primary key, kept in sync by SQL triggers so bulk
+#     inserts and QuerySet.update() are indexed too. Ranked by bm25.
+#   * PostgreSQL: a GIN index on the to_tsvector() of the searchable columns,
+#     queried with to_tsquery() prefix terms and ranked by ts_rank.
+#   * Anything else: icontains filters, ordered by id.
+#
+# The indexes and triggers are (re)installed after every migrate, which also
+# covers SQLite table rebuilds dropping triggers. Result rows are flat
+# dicts fetched with values(), never the nested serializers.
+#
+# search() runs the per-type searches concurrently on a bounded thread pool
+# (per-thread connections) and asearch() as asyncio tasks, each with its own
+# deadline, so one slow scan yields a partial response instead of holding up
+# the others. The deadline also bounds the queries themselves (a progress
+# handler on SQLite, statement_timeout on PostgreSQL), so a timed-out type
+# stops and frees its pool thread. Each sub-search runs in a copy of the
+# caller's context, so it is routed like the request (see myapp.routers).
+
+SEARCH_FIELDS = {
+    Organization: ('name',),
+    Company: ('name',),
+    Employee: ('name', 'position'),
+}
+
+SEARCH_TYPES = {
+    'organizations': Organization,
+    'companies': Company,
+    'employees': Employee,
+}
+
+SEARCH_PAYLOADS = {
+    Organization: (('id', 'name'), {}),
+    Company: (('id', 'name', 'organization_id'), {'organization_name': F('organization__name')}),
+    Employee: (('id', 'name', 'position', 'company_id'), {'company_name': F('company__name')}),
+}
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+_TERM_RE = re.compile(r'\w+')
+
+
+def search_terms(query):
+    """Split a user query into lowercase word terms; every term is prefix matched"""
+    return [term.lower() for term in _TERM_RE.findall(query)]
+
+
+class FallbackSearchBackend:
+    """Unindexed icontains matching for backends without full-text support"""
+
+    def install(self, connection):
+        pass
+
+    def rebuild(self, connection):
+        pass
+
+    def ranked_ids(self, connection, model, terms, limit):
+        condition = Q()
+        for term in terms:
+            term_condition = Q()
+            for field in SEARCH_FIELDS[model]:
+                term_condition |= Q(**{f'{field}__icontains': term})
+            condition &= term_condition
+        queryset = model.objects.using(connection.alias).filter(condition).order_by('id')
+        return list(queryset.values_list('id', flat=True)[:limit])
+
+
+class SQLiteSearchBackend:
+    """FTS5 external-content tables maintained by triggers"""
+
+    def fts_table(self, model):
+        return f'{model._meta.db_table}_fts'
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            for model, fields in SEARCH_FIELDS.items():
+                table = model._meta.db_table
+                fts = self.fts_table(model)
+                columns = ', '.join(fields)
+                new_values = ', '.join(f'new.{field}' for field in fields)
+                old_values = ', '.join(f'old.{field}' for field in fields)
+
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [fts])
+                created = cursor.fetchone() is None
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"{columns}, content='{table}', content_rowid='id', "
+                    f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                    f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+                    f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+                )
+                if created:
+                    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    def rebuild(self, connection):
+        with connection.cursor() as cursor:
+            for model in SEARCH_FIELDS:
+                fts = self.fts_table(model)
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    def ranked_ids(self, connection, model, terms, limit):
+        fts = self.fts_table(model)
+        match = ' '.join(f'"{term}"*' for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s ORDER BY rank LIMIT %s",
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """GIN expression indexes over to_tsvector('simple', ...)"""
+
+    def document(self, model):
+        return " || ' ' || ".join(f"coalesce({field}, '')" for field in SEARCH_FIELDS[model])
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            for model in SEARCH_FIELDS:
+                table = model._meta.db_table
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_search_gin ON {table} "
+                    f"USING gin ((to_tsvector('simple', {self.document(model)})))"
+                )
+
+    def rebuild(self, connection):
+        with connection.cursor() as cursor:
+            for model in SEARCH_FIELDS:
+                cursor.execute(f"REINDEX INDEX {model._meta.db_table}_search_gin")
+
+    def ranked_ids(self, connection, model, terms, limit):
+        table = model._meta.db_table
+        vector = f"to_tsvector('simple', {self.document(model)})"
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM {table}, to_tsquery('simple', %s) query "
+                f"WHERE {vector} @@ query ORDER BY ts_rank({vector}, query) DESC, id LIMIT %s",
+                [tsquery, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+_backends = {}
+
+
+def get_backend(connection):
+    """Pick the search backend for a connection, probing SQLite for FTS5 once"""
+    if connection.alias not in _backends:
+        if connection.vendor == 'postgresql':
+            _backends[connection.alias] = PostgresSearchBackend()
+        elif connection.vendor == 'sqlite' and _has_fts5(connection):
+            _backends[connection.alias] = SQLiteSearchBackend()
+        else:
+            _backends[connection.alias] = FallbackSearchBackend()
+    return _backends[connection.alias]
+
+
+def _has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def install_search_index(using='default', **kwargs):
+    """post_migrate hook: create the search tables/indexes and triggers if missing"""
+    connection = connections[using]
+    _backends.pop(using, None)
+    if Employee._meta.db_table not in connection.introspection.table_names():
+        return
+    get_backend(connection).install(connection)
+
+
+def rebuild_search_index(using='default'):
+    """Repopulate the search index from the source tables"""
+    connection = connections[using]
+    get_backend(connection).rebuild(connection)
+
+
+class SearchTimeout(Exception):
+    """A sub-search was interrupted at its deadline"""
+
+
+@contextlib.contextmanager
+def query_deadline(connection, deadline):
+    """Interrupt the connection's queries once time.monotonic() passes deadline"""
+    if deadline is None:
+        yield
+        return
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise SearchTimeout
+    connection.ensure_connection()
+    if connection.vendor == 'sqlite':
+        # Checked every 1000 virtual machine instructions
+        connection.connection.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+        try:
+            yield
+        finally:
+            connection.connection.set_progress_handler(None, 0)
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET statement_timeout = %s', [max(int(remaining * 1000), 1)])
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('RESET statement_timeout')
+    else:
+        yield
+
+
+def search(query, types=None, limit=DEFAULT_SEARCH_LIMIT):
+    """Ranked, prefix-matching search returning flat dicts per result type
+
+    Several types are searched concurrently on the search pool. A type that
+    misses its API_SEARCH_TIMEOUTS deadline is returned empty and listed
+    under 'timed_out'.
+    """
+    terms = search_terms(query)
+    models = _selected_models(types)
+    if not terms:
+        return {name: [] for name in models}
+    if not _fan_out(models):
+        return {name: search_model(model, terms, limit) for name, model in models.items()}
+
+    pool = search_pool.executor()
+    started = time.monotonic()
+    deadlines = {name: started + settings.API_SEARCH_TIMEOUTS[name] for name in models}
+    pending = {
+        name: pool.submit(contextvars.copy_context().run, _search_in_thread, model, terms, limit, deadlines[name])
+        for name, model in models.items()
+    }
+    results, timed_out = {}, []
+    for name, future in pending.items():
+        try:
+            results[name] = future.result(timeout=max(deadlines[name] - time.monotonic(), 0))
+        except (futures.TimeoutError, SearchTimeout):
+            # A running query is interrupted at the same deadline
+            future.cancel()
+            results[name] = []
+            timed_out.append(name)
+    if timed_out:
+        results['timed_out'] = timed_out
+    return results
+
+
+def search_model(model, terms, limit, deadline=None):
+    """Best `limit` matches for one model as flat dicts, in rank order
+
+    Raises SearchTimeout when the queries run past deadline, a
+    time.monotonic() value.
+    """
+    connection = connections[router.db_for_read(model)]
+    with query_deadline(connection, deadline):
+        try:
+            ids = get_backend(connection).ranked_ids(connection, model, terms, limit)
+            if not ids:
+                return []
+            fields, expressions = SEARCH_PAYLOADS[model]
+            rows = model.objects.using(connection.alias).filter(pk__in=ids).values(*fields, **expressions)
+            by_id = {row['id']: row for row in rows}
+        except DatabaseError:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise SearchTimeout
+            raise
+    return [by_id[pk] for pk in ids if pk in by_id]
+
+
+async def asearch(query, types=None, limit=DEFAULT_SEARCH_LIMIT):
+    """search() for async views; the types are searched by concurrent tasks"""
+    terms = search_terms(query)
+    models = _selected_models(types)
+    if not terms:
+        return {name: [] for name in models}
+    if not await sync_to_async(_fan_out)(models):
+        return {name: await asearch_model(model, terms, limit) for name, model in models.items()}
+
+    # The async ORM runs every query on the one thread-sensitive thread, so
+    # the tasks run search_model() on the search pool, where each thread
+    # has its own connection
+    loop = asyncio.get_running_loop()
+    pool = search_pool.executor()
+    started = time.monotonic()
+    tasks = {}
+    for name, model in models.items():
+        timeout = settings.API_SEARCH_TIMEOUTS[name]
+        task = loop.run_in_executor(
+            pool, contextvars.copy_context().run, _search_in_thread, model, terms, limit, started + timeout,
+        )
+        tasks[name] = asyncio.wait_for(task, timeout)
+    outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    results, timed_out = {}, []
+    for name, outcome in zip(tasks, outcomes):
+        if isinstance(outcome, (asyncio.TimeoutError, SearchTimeout)):
+            results[name] = []
+            timed_out.append(name)
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            results[name] = outcome
+    if timed_out:
+        results['timed_out'] = timed_out
+    return results
+
+
+async def asearch_model(model, terms, limit):
+    """search_model() for async views; the ranking query runs in a thread, the rows are read async"""
+    # ranked_ids() uses raw cursors, which have no async API
+    alias, ids = await sync_to_async(_ranked_ids)(model, terms, limit)
+    if not ids:
+        return []
+    fields, expressions = SEARCH_PAYLOADS[model]
+    rows = model.objects.using(alias).filter(pk__in=ids).values(*fields, **expressions)
+    by_id = {row['id']: row async for row in rows.aiterator()}
+    return [by_id[pk] for pk in ids if pk in by_id]
+
+
+def _ranked_ids(model, terms, limit):
+    """(alias, ranked ids); routed here, in the thread whose connections run the queries"""
+    connection = connections[router.db_for_read(model)]
+    return connection.alias, get_backend(connection).ranked_ids(connection, model, terms, limit)
+
+
+def _selected_models(types):
+    return {name: model for name, model in SEARCH_TYPES.items() if types is None or name in types}
+
+
+def _fan_out(models):
+    """Whether to search the models concurrently on the search pool
+
+    Not when the calling thread is inside a transaction: the pool's own
+    connections would not see its uncommitted rows.
+    """
+    if len(models) < 2 or not settings.API_SEARCH_WORKERS:
+        return False
+    return not any(connections[router.db_for_read(model)].in_atomic_block for model in models.values())
+
+
+def _search_in_thread(model, terms, limit, deadline):
+    # Pool threads keep their connections between tasks, closed like a
+    # request's once they are older than CONN_MAX_AGE or broken
+    close_old_connections()
+    try:
+        return search_model(model, terms, limit, deadline)
+    finally:
+        close_old_connections()
+
+
+class SearchPool:
+    """Threads that run the sub-searches of concurrent searches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = futures.ThreadPoolExecutor(settings.API_SEARCH_WORKERS, thread_name_prefix='search')
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+search_pool = SearchPool()
@@ -1,15 +1,101 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 from .models import Organization, Company, Employee
-
-
-class EmployeeSerializer(serializers.ModelSerializer):
+from .fieldsets import FieldSelection
+
+
+class DynamicFieldsMixin:
+    """Allow callers to restrict the serialized fields and embedded relations
+
+    Pass either `fields`, a list of field names, or `selection`, a
+    myapp.fieldsets.FieldSelection that also trims the nested serializers.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        selection = kwargs.pop('selection', None)
+        if selection is None and fields:
+            selection = FieldSelection(set(fields))
+        super().__init__(*args, **kwargs)
+        if selection is None:
+            return
+        for name, field in list(self.fields.items()):
+            if not selection.includes(name):
+                self.fields.pop(name)
+            elif isinstance(field, serializers.ListSerializer) and isinstance(field.child, DynamicFieldsMixin):
+                child = selection.child(name)
+                if child is None:
+                    self.fields.pop(name)
+                else:
+                    self.fields[name] = type(field.child)(many=True, read_only=True, selection=child)
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Look related rows up in the ones prefetched by BulkListSerializer, if any"""
+
+    def coerce_pk(self, data):
+        """The primary key value data stands for, or None if it can't be one"""
+        if isinstance(data, bool):
+            return None
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            return None
+
+    def to_internal_value(self, data):
+        related = getattr(self.root, 'related_rows', {}).get(self.field_name)
+        if related is None:
+            return super().to_internal_value(data)
+        pk = self.coerce_pk(data)
+        if pk is None:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in related:
+            self.fail('does_not_exist', pk_value=data)
+        return related[pk]
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """List serializer used by the bulk endpoints
+
+    validate_rows() validates every row on its own, so one bad row doesn't
+    reject the others, and resolves each related field with a single query.
+    """
+
+    def validate_rows(self):
+        """Return ([(index, validated_data)], [{'index': ..., 'errors': ...}])"""
+        rows = self.initial_data
+        self.related_rows = {}
+        for name, field in self.child.fields.items():
+            if isinstance(field, PrefetchedPrimaryKeyRelatedField) and not field.read_only:
+                pks = {
+                    field.coerce_pk(row[name]) for row in rows
+                    if isinstance(row, dict) and row.get(name) is not None
+                }
+                pks.discard(None)
+                self.related_rows[name] = field.get_queryset().in_bulk(pks)
+
+        valid, errors = [], []
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                errors.append({'index': index, 'errors': {'non_field_errors': ['Expected an object']}})
+                continue
+            try:
+                valid.append((index, self.child.run_validation(row)))
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+        return valid, errors
+
+
+class EmployeeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     company_name = serializers.CharField(source='company.name', read_only=True)
-    organization_name = serializers.CharField(source='company.organization.name', read_only=True)
-    company_id = serializers.IntegerField(source='company.id', read_only=True)
-    organization_id = serializers.IntegerField(source='company.organization.id', read_only=True)
+    organization_name = serializers.CharField(source='organization.name', read_only=True)
+    company_id = serializers.IntegerField(read_only=True)
+    organization_id = serializers.IntegerField(read_only=True)
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
 
     class Meta:
         model = Employee
+        list_serializer_class = BulkListSerializer
         fields = ['id', 'name', 'position', 'company', 'company_name', 'organization_name', 'company_id', 'organization_id']
         extra_kwargs = {
             'name': {'required': True, 'max_length': 100},
@@ -30,23 +116,20 @@ class EmployeeSerializer(serializers.ModelSerializer):
         return value.strip() if value else value
 
 
-class CompanySerializer(serializers.ModelSerializer):
+class CompanySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     employees = EmployeeSerializer(many=True, read_only=True)
     organization_name = serializers.CharField(source='organization.name', read_only=True)
-    employee_count = serializers.SerializerMethodField()
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
 
     class Meta:
         model = Company
+        list_serializer_class = BulkListSerializer
         fields = ['id', 'name', 'organization', 'organization_name', 'employees', 'employee_count']
         extra_kwargs = {
             'name': {'required': True, 'max_length': 100},
             'organization': {'required': True}
         }
 
-    def get_employee_count(self, obj):
-        """Get the count of employees for this company"""
-        return obj.employees.count()
-
     def validate_name(self, value):
         """Validate company name"""
         if len(value.strip()) < 2:
@@ -54,26 +137,18 @@ class CompanySerializer(serializers.ModelSerializer):
         return value.strip()
 
 
-class OrganizationSerializer(serializers.ModelSerializer):
+class OrganizationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     companies = CompanySerializer(many=True, read_only=True)
-    company_count = serializers.SerializerMethodField()
-    total_employee_count = serializers.SerializerMethodField()
+    total_employee_count = serializers.IntegerField(source='employee_count', read_only=True)
 
     class Meta:
         model = Organization
+        list_serializer_class = BulkListSerializer
         fields = ['id', 'name', 'companies', 'company_count', 'total_employee_count']
         extra_kwargs = {
             'name': {'required': True, 'max_length': 100}
         }
 
-    def get_company_count(self, obj):
-        """Get the count of companies for this organization"""
-        return obj.companies.count()
-
-    def get_total_employee_count(self, obj):
-        """Get the total count of employees across all companies in this organization"""
-        return sum(company.employees.count() for company in obj.companies.all())
-
     def validate_name(self, value):
         """Validate organization name"""
         if len(value.strip()) < 2:
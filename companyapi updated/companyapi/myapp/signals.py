@@ -0,0 +1,231 @@
+import functools
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import forget_user
+from .cache import company_scopes, employee_scopes, invalidate, organization_scopes
+from .counters import adjust_company_count, adjust_employee_count
+from .models import Company, Employee, Organization, current_deletion, deletion_finished
+from .versions import bump_table, touch_parents, version_bump
+
+# Counter and Employee.organization maintenance, version stamps and
+# response cache invalidation (which need the parents an instance moved
+# away from)
+#
+# A delete() cascades row by row, so the post_delete handlers don't write
+# anything themselves: they record their counter deltas, tables and scopes
+# in a Deletion, applied once per delete() (see myapp.models.deletion).
+#
+# Bulk paths that repair all of this once for the whole batch (see
+# myapp.bulk) run Django's cascading QuerySet.delete() inside muted(), which
+# skips the per-row handlers below.
+
+_muted = ContextVar('signals_muted', default=False)
+
+
+@contextmanager
+def muted():
+    """Skip the maintenance handlers for the writes made inside the block"""
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+def maintenance(handler):
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not _muted.get():
+            handler(*args, **kwargs)
+    return wrapper
+
+@receiver(pre_save, sender=Employee)
+@maintenance
+def employee_pre_save(sender, instance, raw, update_fields, **kwargs):
+    """Copy the company's organization onto the employee when the company changes"""
+    if raw:
+        return
+    if not instance._state.adding and not hasattr(instance, '_loaded_company_id'):
+        # The instance didn't load its parents; look up the stored ones
+        if update_fields is not None and not {'company', 'company_id'} & update_fields:
+            instance._loaded_company_id = instance.company_id
+            instance._loaded_organization_id = instance.organization_id
+        else:
+            instance._loaded_company_id, instance._loaded_organization_id = (
+                Employee.objects.filter(pk=instance.pk)
+                .values_list('company_id', 'organization_id')
+                .first() or (None, None)
+            )
+    if instance._state.adding or instance._loaded_company_id != instance.company_id:
+        instance.organization_id = instance.company.organization_id
+
+
+@receiver(post_save, sender=Employee)
+@maintenance
+def employee_post_save(sender, instance, created, raw, **kwargs):
+    """Count a new employee or move it between companies"""
+    if raw:
+        return
+    if created:
+        adjust_employee_count(instance.company_id, instance.organization_id, 1)
+        invalidate(employee_scopes(instance))
+    elif instance._loaded_company_id != instance.company_id:
+        adjust_employee_count(instance._loaded_company_id, instance._loaded_organization_id, -1)
+        adjust_employee_count(instance.company_id, instance.organization_id, 1)
+        invalidate(employee_scopes(instance, instance._loaded_company_id, instance._loaded_organization_id))
+    else:
+        touch_parents(instance.company_id, instance.organization_id)
+        invalidate(employee_scopes(instance))
+    bump_table('employee')
+    instance._loaded_company_id = instance.company_id
+    instance._loaded_organization_id = instance.organization_id
+
+
+class Deletion:
+    """Maintenance owed for the rows one delete() removed, cascades included"""
+
+    def __init__(self):
+        self.company_employees = Counter()
+        self.organization_employees = Counter()
+        self.organization_companies = Counter()
+        # Parents removed by the same delete(); their counters don't matter
+        self.companies = set()
+        self.organizations = set()
+        self.tables = set()
+        self.scopes = set()
+
+    def apply(self):
+        for company_id, delta in self.company_employees.items():
+            if company_id not in self.companies:
+                Company.objects.filter(pk=company_id).update(
+                    employee_count=F('employee_count') + delta, **version_bump()
+                )
+        organization_ids = self.organization_companies.keys() | self.organization_employees.keys()
+        for organization_id in organization_ids - self.organizations:
+            adjust_company_count(
+                organization_id, self.organization_companies[organization_id],
+                self.organization_employees[organization_id],
+            )
+        if self.tables:
+            bump_table(*self.tables)
+        invalidate(self.scopes)
+
+
+def _pending_deletion():
+    """The Deletion of the delete() in progress, or None"""
+    batch = current_deletion.get()
+    if batch is None:
+        return None
+    return batch.setdefault('maintenance', Deletion())
+
+
+@receiver(deletion_finished)
+@maintenance
+def deletion_applied(sender, batch, **kwargs):
+    if 'maintenance' in batch:
+        batch['maintenance'].apply()
+
+
+@receiver(post_delete, sender=Employee)
+@maintenance
+def employee_post_delete(sender, instance, **kwargs):
+    pending = _pending_deletion()
+    if pending is None:
+        adjust_employee_count(instance.company_id, instance.organization_id, -1)
+        bump_table('employee')
+        invalidate(employee_scopes(instance))
+        return
+    pending.company_employees[instance.company_id] -= 1
+    pending.organization_employees[instance.organization_id] -= 1
+    pending.tables.add('employee')
+    pending.scopes.update(employee_scopes(instance))
+
+
+@receiver(pre_save, sender=Company)
+@maintenance
+def company_pre_save(sender, instance, raw, update_fields, **kwargs):
+    """Look up the stored organization when the instance didn't load it"""
+    if raw or instance._state.adding or hasattr(instance, '_loaded_organization_id'):
+        return
+    if update_fields is not None and not {'organization', 'organization_id'} & update_fields:
+        instance._loaded_organization_id = instance.organization_id
+        return
+    instance._loaded_organization_id = (
+        Company.objects.filter(pk=instance.pk).values_list('organization_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Company)
+@maintenance
+def company_post_save(sender, instance, created, raw, **kwargs):
+    """Count a new company or move it, with its employees, between organizations"""
+    if raw:
+        return
+    if created:
+        adjust_company_count(instance.organization_id, 1)
+        invalidate(company_scopes(instance))
+    elif instance._loaded_organization_id != instance.organization_id:
+        employees = Company.objects.filter(pk=instance.pk).values_list('employee_count', flat=True).get()
+        adjust_company_count(instance._loaded_organization_id, -1, -employees)
+        adjust_company_count(instance.organization_id, 1, employees)
+        Employee.objects.filter(company=instance).update(
+            organization_id=instance.organization_id, **version_bump()
+        )
+        invalidate(company_scopes(instance, instance._loaded_organization_id))
+        bump_table('company', 'employee')
+    else:
+        touch_parents(organization_id=instance.organization_id)
+        invalidate(company_scopes(instance))
+        bump_table('company')
+    instance._loaded_organization_id = instance.organization_id
+
+
+@receiver(post_delete, sender=Company)
+@maintenance
+def company_post_delete(sender, instance, **kwargs):
+    # The cascade already removed this company's employees
+    pending = _pending_deletion()
+    if pending is None:
+        adjust_company_count(instance.organization_id, -1)
+        bump_table('company')
+        invalidate(company_scopes(instance))
+        return
+    pending.companies.add(instance.pk)
+    pending.organization_companies[instance.organization_id] -= 1
+    pending.tables.add('company')
+    pending.scopes.update(company_scopes(instance))
+
+
+@receiver(post_save, sender=Organization)
+@maintenance
+def organization_saved(sender, instance, raw, **kwargs):
+    if not raw:
+        bump_table('organization')
+        invalidate(organization_scopes(instance))
+
+
+@receiver(post_delete, sender=Organization)
+@maintenance
+def organization_post_delete(sender, instance, **kwargs):
+    pending = _pending_deletion()
+    if pending is None:
+        bump_table('organization')
+        invalidate(organization_scopes(instance))
+        return
+    pending.organizations.add(instance.pk)
+    pending.tables.add('organization')
+    pending.scopes.update(organization_scopes(instance))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    # Drop the copy StatelessJWTAuthentication serves tokens from
+    forget_user(instance)
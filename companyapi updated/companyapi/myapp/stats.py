@@ -0,0 +1,69 @@
+from django.db.models import Count, F, Sum, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+from .models import Company, Organization
+
+# Statistics are computed from the denormalized counter columns, so no
+# query ever joins or counts the employee table:
+#   1. one aggregate over organizations for the global totals
+#   2. one ordered (optionally limited) scan of organizations for the details
+#   3. with a breakdown, one scan of the companies of the selected organizations,
+#      optionally only the largest ones of each
+
+# Accepted ?order= values; counts sort largest first, ties broken by id
+STATS_ORDERINGS = {
+    'id': ('id',),
+    'name': ('name', 'id'),
+    'company_count': ('-company_count', 'id'),
+    'employee_count': ('-employee_count', 'id'),
+}
+
+# Aggregates of the global totals
+TOTALS = {
+    'total_organizations': Count('id'),
+    'total_companies': Coalesce(Sum('company_count'), 0),
+    'total_employees': Coalesce(Sum('employee_count'), 0),
+}
+
+
+def _details(top, order):
+    details = Organization.objects.order_by(*STATS_ORDERINGS[order]).values(
+        'id', 'name', 'company_count', 'employee_count'
+    )
+    return details[:top] if top is not None else details
+
+
+def _companies(details, top, companies_per_organization):
+    """Companies of the detailed organizations; gives each detail an empty companies list"""
+    for org in details:
+        org['companies'] = []
+    companies = Company.objects.order_by('-employee_count', 'id')
+    if top is not None:
+        companies = companies.filter(organization_id__in=[org['id'] for org in details])
+    if companies_per_organization is not None:
+        companies = companies.annotate(rank=Window(
+            RowNumber(), partition_by=[F('organization_id')], order_by=[F('employee_count').desc(), F('id').asc()],
+        )).filter(rank__lte=companies_per_organization)
+    return companies.values('id', 'name', 'organization_id', 'employee_count')
+
+
+def organization_statistics(top=None, order='id', breakdown=False, companies_per_organization=None):
+    """Global totals plus per-organization (and optionally per-company) counts"""
+    totals = Organization.objects.aggregate(**TOTALS)
+    details = list(_details(top, order))
+    if breakdown:
+        by_organization = {org['id']: org for org in details}
+        for company in _companies(details, top, companies_per_organization):
+            by_organization[company.pop('organization_id')]['companies'].append(company)
+    return {**totals, 'organization_details': details}
+
+
+async def aorganization_statistics(top=None, order='id', breakdown=False, companies_per_organization=None):
+    """organization_statistics() with the async ORM"""
+    totals = await Organization.objects.aaggregate(**TOTALS)
+    details = [org async for org in _details(top, order).aiterator()]
+    if breakdown:
+        by_organization = {org['id']: org for org in details}
+        async for company in _companies(details, top, companies_per_organization).aiterator():
+            by_organization[company.pop('organization_id')]['companies'].append(company)
+    return {**totals, 'organization_details': details}
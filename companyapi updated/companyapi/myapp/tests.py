@@ -1,3 +1,1416 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import json
+import sqlite3
+import threading
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock, skipUnless
+from urllib.parse import quote
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils.translation import gettext_lazy
+from jwt import get_unverified_header
+from jwt.algorithms import has_crypto
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .authentication import issue_tokens, user_records
+from .counters import find_drift
+from .fastpath import row_plan
+from .fieldsets import FieldSelection
+from .hashers import HashingBusy, HashingPool, hashing_pool
+from .importer import EmployeeImporter
+from .models import Company, Employee, Organization, RevokedToken
+from .parsers import ORJSONParser
+from .querysets import employee_queryset
+from .renderers import ORJSONRenderer
+from .revocation import BloomFilter, revoked_tokens
+from .routers import (
+    PIN_COOKIE,
+    PIN_HEADER,
+    ReplicaRouter,
+    RequestRouting,
+    replica_routing,
+    replicas,
+    request_routing,
+)
+from .search import SQLiteSearchBackend, asearch, search, search_model, search_pool
+from .serializers import CompanySerializer, EmployeeSerializer
+from .throttling import TokenBuckets
+from .tokens import RefreshToken, generate_key_pair
+
+# Tests log in many times from one address
+generous_login_rates = override_settings(API_LOGIN_RATES={'username': '1000/min', 'ip': '1000/min'})
+
+
+def create_tree(orgs=2, companies=2, employees=2, prefix=''):
+    """Create a small organization -> company -> employee tree"""
+    for o in range(orgs):
+        org = Organization.objects.create(name=f'{prefix}Org {o}')
+        for c in range(companies):
+            company = Company.objects.create(name=f'{prefix}Company {o}-{c}', organization=org)
+            for e in range(employees):
+                Employee.objects.create(name=f'{prefix}Employee {o}-{c}-{e}', position='Engineer', company=company)
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        caches['api'].clear()
+        self.user = User.objects.create_user(username='tester', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+
+class QueryCountTests(APITestCase):
+    def assertConstantQueries(self, url, num):
+        create_tree(orgs=1)
+        with self.assertNumQueries(num):
+            small = self.client.get(url)
+        create_tree(orgs=4, companies=3, employees=3, prefix='More ')
+        with self.assertNumQueries(num):
+            large = self.client.get(url)
+        self.assertEqual(small.status_code, 200)
+        self.assertGreater(len(large.data['results']), len(small.data['results']))
+
+    def test_organization_list(self):
+        self.assertConstantQueries('/api/organizations/', 4)
+
+    def test_legacy_organization_list(self):
+        self.assertConstantQueries('/api/organizations/legacy/', 4)
+
+    def test_company_list(self):
+        self.assertConstantQueries('/api/companies/', 3)
+
+    def test_employee_list(self):
+        self.assertConstantQueries('/api/employees/', 2)
+
+    def test_depth_and_expand_skip_unrequested_relations(self):
+        self.assertConstantQueries('/api/organizations/?depth=0', 2)
+        self.assertConstantQueries('/api/organizations/?depth=1', 3)
+        self.assertConstantQueries('/api/organizations/?expand=companies.employees', 4)
+        self.assertConstantQueries('/api/organizations/?fields=id,name', 2)
+
+    def employee_reads(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            getattr(self.client, method)(url, data)
+        return sum(q['sql'].startswith('SELECT "myapp_employee"') for q in queries)
+
+    def test_detail_writes_load_the_bare_row(self):
+        create_tree(orgs=1, companies=2, employees=2)
+        org = Organization.objects.get()
+        # Only the response body's prefetch reads the employees
+        self.assertEqual(self.employee_reads('put', f'/api/organizations/{org.pk}/', {'name': 'Renamed'}), 1)
+        # Only the cascade collects them
+        self.assertEqual(self.employee_reads('delete', f'/api/companies/{Company.objects.first().pk}/'), 1)
+
+    def test_employee_fields_skip_joins(self):
+        self.assertConstantQueries('/api/employees/?fields=id,name', 2)
+        self.assertNotIn('JOIN', str(employee_queryset(FieldSelection({'id', 'name'})).query))
+
+    def test_sparse_nested_fields(self):
+        create_tree(orgs=1, companies=1, employees=1)
+        org = self.client.get('/api/organizations/?fields=name,companies.name,companies.employees.name').data
+        self.assertEqual(org['results'][0], {
+            'name': 'Org 0', 'companies': [{'name': 'Company 0-0', 'employees': [{'name': 'Employee 0-0-0'}]}],
+        })
+        org = self.client.get('/api/organizations/?expand=companies&fields=name,companies').data
+        self.assertEqual(set(org['results'][0]['companies'][0]), {
+            'id', 'name', 'organization', 'organization_name', 'employee_count',
+        })
+
+    def test_invalid_depth_and_expand(self):
+        self.assertEqual(self.client.get('/api/organizations/?depth=-1').status_code, 400)
+        response = self.client.get('/api/companies/?expand=organization')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('employees', response.data['error'])
+
+    def test_fields_of_relations_left_out(self):
+        for url in (
+            '/api/organizations/?fields=companies.employees.name&depth=0',
+            '/api/organizations/?fields=name,companies.employees.name&depth=1',
+            '/api/organizations/?fields=companies&expand=',
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn('not embedded', response.data['error'])
+        url = '/api/organizations/?fields=companies.employees.name&expand=companies.employees'
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_unknown_fields(self):
+        for url in ('/api/employees/?fields=id,nope', '/api/organizations/?fields=companies.nope'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn('choose from: id, name', response.data['error'])
+        self.assertIn('nope', response.data['error'])
+        self.assertIn('companies.employees.name', response.data['error'])
+
+    def test_organization_counts(self):
+        create_tree(orgs=1, companies=2, employees=3)
+        org = self.client.get('/api/organizations/').data['results'][0]
+        self.assertEqual(org['company_count'], 2)
+        self.assertEqual(org['total_employee_count'], 6)
+        self.assertEqual([c['employee_count'] for c in org['companies']], [3, 3])
+        self.assertEqual(org['companies'][0]['employees'][0]['organization_name'], 'Org 0')
+
+
+class PaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        create_tree(orgs=1, companies=1, employees=5)
+
+    def test_walks_pages_forward_and_back(self):
+        first = self.client.get('/api/employees/?page_size=2').data
+        self.assertEqual(len(first['results']), 2)
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).data
+        third = self.client.get(second['next']).data
+        self.assertEqual(len(third['results']), 1)
+        self.assertIsNone(third['next'])
+        ids = [row['id'] for page in (first, second, third) for row in page['results']]
+        self.assertEqual(ids, sorted(Employee.objects.values_list('id', flat=True)))
+        back = self.client.get(third['previous']).data
+        self.assertEqual(back['results'], second['results'])
+
+    def test_page_size_is_capped(self):
+        with self.settings(API_MAX_PAGE_SIZE=3):
+            response = self.client.get('/api/employees/filter/?page_size=50')
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/companies/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+        # Well-formed cursors whose position is not a primary key
+        for position in ('abc', '1' * 30):
+            cursor = base64.b64encode(f'p={position}'.encode()).decode()
+            response = self.client.get(f'/api/companies/?cursor={quote(cursor)}')
+            self.assertEqual(response.status_code, 404, position)
+
+    def test_fields_projection(self):
+        response = self.client.get('/api/employees/legacy/?fields=id,name')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+
+
+class CounterTests(APITestCase):
+    def assertCounts(self, obj, **expected):
+        obj.refresh_from_db()
+        self.assertEqual({name: getattr(obj, name) for name in expected}, expected)
+
+    def test_create_move_and_delete(self):
+        org_a = Organization.objects.create(name='Org A')
+        org_b = Organization.objects.create(name='Org B')
+        first = Company.objects.create(name='First', organization=org_a)
+        second = Company.objects.create(name='Second', organization=org_b)
+        employee = Employee.objects.create(name='Ann', company=first)
+        Employee.objects.create(name='Bob', company=first)
+        self.assertCounts(first, employee_count=2)
+        self.assertCounts(org_a, company_count=1, employee_count=2)
+
+        response = self.client.put(f'/api/employees/{employee.pk}/', {'name': 'Ann', 'company': second.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertCounts(first, employee_count=1)
+        self.assertCounts(second, employee_count=1)
+        self.assertCounts(org_b, company_count=1, employee_count=1)
+
+        first.organization = org_b
+        first.save()
+        self.assertEqual(set(Employee.objects.values_list('organization_id', flat=True)), {org_b.pk})
+        self.assertCounts(org_a, company_count=0, employee_count=0)
+        self.assertCounts(org_b, company_count=2, employee_count=2)
+
+        first.delete()
+        self.assertCounts(org_b, company_count=1, employee_count=1)
+        Employee.objects.filter(company=second).delete()
+        self.assertCounts(org_b, company_count=1, employee_count=0)
+
+    def test_cascading_delete_applies_counters_once(self):
+        def delete_company(employees):
+            org = Organization.objects.create(name=f'Org {employees}')
+            Company.objects.create(name='Kept', organization=org)
+            company = Company.objects.create(name='Deleted', organization=org)
+            for e in range(employees):
+                Employee.objects.create(name=f'Employee {e}', company=company)
+            with CaptureQueriesContext(connection) as queries:
+                company.delete()
+            self.assertCounts(org, company_count=1, employee_count=0)
+            return len(queries)
+
+        self.assertEqual(delete_company(2), delete_company(30))
+        create_tree(orgs=2, companies=2, employees=3)
+        Employee.objects.filter(name__endswith='-0').delete()
+        Organization.objects.first().delete()
+        self.assertEqual([qs.count() for qs in find_drift()], [0, 0, 0])
+
+    def test_stale_instance_does_not_clobber_counters(self):
+        org = Organization.objects.create(name='Org')
+        company = Company.objects.create(name='Company', organization=org)
+        stale = Company.objects.get(pk=company.pk)
+        Employee.objects.create(name='Ann', company=company)
+        stale.name = 'Renamed'
+        stale.save()
+        self.assertCounts(company, name='Renamed', employee_count=1)
+
+    def test_recount_repairs_drift(self):
+        create_tree(orgs=2)
+        Company.objects.update(employee_count=0)
+        Organization.objects.update(company_count=9)
+        Employee.objects.filter(pk=Employee.objects.first().pk).update(organization_id=Organization.objects.last().pk)
+        self.assertEqual([qs.count() for qs in find_drift()], [4, 2, 1])
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual([qs.count() for qs in find_drift()], [0, 0, 0])
+
+
+class StatsTests(APITestCase):
+    def test_totals_and_details(self):
+        create_tree(orgs=2, companies=2, employees=3)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/stats/')
+        self.assertEqual(response.data['total_organizations'], 2)
+        self.assertEqual(response.data['total_companies'], 4)
+        self.assertEqual(response.data['total_employees'], 12)
+        self.assertEqual(response.data['organization_details'][0]['employee_count'], 6)
+
+    def test_top_order_and_breakdown(self):
+        create_tree(orgs=2, companies=1, employees=1)
+        create_tree(orgs=1, companies=2, employees=2, prefix='Big ')
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/stats/?top=1&order=employee_count&breakdown=companies')
+        self.assertEqual(response.data['total_organizations'], 3)
+        [org] = response.data['organization_details']
+        self.assertEqual((org['name'], org['employee_count']), ('Big Org 0', 4))
+        self.assertEqual([c['employee_count'] for c in org['companies']], [2, 2])
+
+    @override_settings(API_STATS_DEFAULT_TOP=2, API_STATS_MAX_TOP=3, API_STATS_MAX_COMPANIES=1)
+    def test_top_and_breakdown_are_bounded(self):
+        create_tree(orgs=4, companies=2, employees=1)
+        self.assertEqual(len(self.client.get('/api/stats/').data['organization_details']), 2)
+        response = self.client.get('/api/stats/?top=50&breakdown=companies')
+        self.assertEqual(response.data['total_organizations'], 4)
+        details = response.data['organization_details']
+        self.assertEqual(len(details), 3)
+        self.assertEqual([len(org['companies']) for org in details], [1, 1, 1])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/stats/?order=bogus').status_code, 400)
+        self.assertEqual(self.client.get('/api/stats/?top=0').status_code, 400)
+        self.assertEqual(self.client.get('/api/stats/?top=²').status_code, 400)
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        org = Organization.objects.create(name='Acme Holdings')
+        self.company = Company.objects.create(name='Acme Rockets', organization=org)
+        Employee.objects.create(name='Wile Coyote', position='Engineer', company=self.company)
+        Employee.objects.create(name='Road Runner', position='Acme tester', company=self.company)
+
+    def test_prefix_match_flat_payload(self):
+        response = self.client.get('/api/search/?q=acm')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['organizations'], [{'id': self.company.organization_id, 'name': 'Acme Holdings'}])
+        self.assertEqual(response.data['companies'][0]['organization_name'], 'Acme Holdings')
+        self.assertEqual([e['name'] for e in response.data['employees']], ['Road Runner'])
+
+    def test_index_follows_updates_and_deletes(self):
+        Employee.objects.filter(name='Wile Coyote').update(name='Wile E. Coyote')
+        Company.objects.create(name='Coyote Supplies', organization=self.company.organization)
+        response = self.client.get('/api/search/?q=coyote&types=employees,companies')
+        self.assertEqual(set(response.data), {'employees', 'companies'})
+        self.assertEqual([e['name'] for e in response.data['employees']], ['Wile E. Coyote'])
+        Employee.objects.all().delete()
+        self.assertEqual(self.client.get('/api/search/?q=coyote').data['employees'], [])
+
+    def test_per_type_limit(self):
+        for i in range(5):
+            Employee.objects.create(name=f'Tester {i}', company=self.company)
+        response = self.client.get('/api/search/?q=tester&limit=3')
+        self.assertEqual(len(response.data['employees']), 3)
+
+    def test_empty_type_names_are_ignored(self):
+        for types in ('employees,', 'employees,,companies', ' , employees'):
+            response = self.client.get(f'/api/search/?q=coyote&types={types}')
+            self.assertEqual(response.status_code, 200, types)
+            self.assertLessEqual(set(response.data), {'employees', 'companies'}, types)
+            self.assertIn('employees', response.data, types)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/?q=a&types=users').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/?q=a&limit=0').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/?q=a&limit=²').status_code, 400)
+
+
+# Committed rows, so that the search pool's connections see them
+class ConcurrentSearchTests(TransactionTestCase):
+    def setUp(self):
+        org = Organization.objects.create(name='Acme Holdings')
+        company = Company.objects.create(name='Acme Rockets', organization=org)
+        Employee.objects.create(name='Road Runner', position='Acme tester', company=company)
+
+    def test_matches_sequential_search(self):
+        with override_settings(API_SEARCH_WORKERS=0):
+            expected = search('acme')
+        self.assertEqual(search('acme'), expected)
+        self.assertEqual(search('acme', types={'employees', 'companies'}), {
+            'employees': expected['employees'], 'companies': expected['companies'],
+        })
+
+    def slow_employees(self, model, terms, limit, deadline=None):
+        if model is Employee:
+            time.sleep(0.5)
+        return search_model(model, terms, limit, deadline)
+
+    @override_settings(API_SEARCH_TIMEOUTS={'organizations': 5, 'companies': 5, 'employees': 0.05})
+    def test_slow_type_returns_partial_results(self):
+        with mock.patch('myapp.search.search_model', self.slow_employees):
+            results = search('acme')
+        self.assertEqual(results['employees'], [])
+        self.assertEqual(results['timed_out'], ['employees'])
+        self.assertEqual([org['name'] for org in results['organizations']], ['Acme Holdings'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'interrupts a SQLite query')
+    @override_settings(
+        API_SEARCH_WORKERS=1, API_SEARCH_TIMEOUTS={'organizations': 5, 'companies': 5, 'employees': 0.2},
+    )
+    def test_timed_out_type_frees_its_worker(self):
+        def slow_ranked_ids(backend, connection, model, terms, limit):
+            if model is not Employee:
+                return ranked_ids(backend, connection, model, terms, limit)
+            with connection.cursor() as cursor:
+                # Counts for far longer than any test should take
+                cursor.execute(
+                    'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 10000000000) '
+                    'SELECT count(*) FROM n'
+                )
+            return []
+
+        search_pool.shutdown()
+        self.addCleanup(search_pool.shutdown)
+        ranked_ids = SQLiteSearchBackend.ranked_ids
+        with mock.patch.object(SQLiteSearchBackend, 'ranked_ids', slow_ranked_ids):
+            results = search('acme', types={'organizations', 'employees'})
+        self.assertEqual(results['timed_out'], ['employees'])
+        # The one worker is free again instead of counting on
+        self.assertEqual(search_pool.executor().submit(lambda: 'free').result(timeout=5), 'free')
+
+    @override_settings(API_SEARCH_TIMEOUTS={'organizations': 5, 'companies': 5, 'employees': 0.05})
+    async def test_async_slow_type_returns_partial_results(self):
+        with mock.patch('myapp.search.search_model', self.slow_employees):
+            results = await asearch('acme')
+        self.assertEqual(results['timed_out'], ['employees'])
+        self.assertEqual([company['name'] for company in results['companies']], ['Acme Rockets'])
+
+
+# The replicas are empty SQLite files of their own; these tests only read the
+# primary, which is outside any transaction here
+class ReplicaRoutingTests(SimpleTestCase):
+    replicas = ('test_replica_a', 'test_replica_b')
+    databases = {'default'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = TemporaryDirectory()
+        for alias in (*cls.replicas, 'test_replica_down'):
+            path = Path(cls.directory.name) / f'{alias}.sqlite3'
+            if alias != 'test_replica_down':
+                sqlite3.connect(path).close()
+            # Opened like the replicas of companyapi/settings.py
+            connections.settings[alias] = {**connections.settings['default'], 'NAME': f'{path.as_uri()}?mode=ro'}
+        # Allowed only now: the test runner prepares the databases of every
+        # test class before any of them is set up
+        cls.databases = {'default', *cls.replicas, 'test_replica_down'}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in cls.databases - {'default'}:
+            connections[alias].close()
+            connections.settings.pop(alias)
+        cls.directory.cleanup()
+
+    def setUp(self):
+        replicas.reset()
+        self.router = ReplicaRouter()
+        token = request_routing.set(RequestRouting(use_replicas=True))
+        self.addCleanup(request_routing.reset, token)
+
+    def reads(self, count):
+        return [self.router.db_for_read(Employee) for _ in range(count)]
+
+    @override_settings(API_READ_DATABASES=replicas)
+    def test_round_robin(self):
+        first, second, third, fourth = self.reads(4)
+        self.assertEqual({first, second}, set(self.replicas))
+        self.assertEqual((third, fourth), (first, second))
+
+    @override_settings(API_READ_DATABASES=['test_replica_down', 'test_replica_a'])
+    def test_failover(self):
+        self.assertEqual(self.reads(3), ['test_replica_a'] * 3)
+        with mock.patch.object(connections['test_replica_down'], 'ensure_connection') as ensure_connection:
+            self.reads(3)
+        # Left out until API_REPLICA_RETRY_SECONDS have passed
+        ensure_connection.assert_not_called()
+
+    @override_settings(API_READ_DATABASES=replicas, API_LAGGING_DATABASES=['test_replica_b'])
+    def test_reads_from_lagging_replicas_are_flagged(self):
+        seen = []
+        for _ in range(2):
+            routing = request_routing.get()
+            routing.read_lagging = False
+            seen.append((self.router.db_for_read(Employee), routing.read_lagging))
+        self.assertEqual(sorted(seen), [('test_replica_a', False), ('test_replica_b', True)])
+
+    @override_settings(API_READ_DATABASES=['test_replica_down'])
+    def test_primary_when_no_replica_connects(self):
+        self.assertEqual(self.reads(2), ['default', 'default'])
+        # Not created empty, which would answer "no such table"
+        self.assertFalse((Path(self.directory.name) / 'test_replica_down.sqlite3').exists())
+
+    @override_settings(API_READ_DATABASES=['test_replica_a'])
+    def test_failed_replica_query_runs_again_on_the_primary(self):
+        seen = []
+
+        def view(request):
+            alias = self.router.db_for_read(Employee)
+            seen.append(alias)
+            # test_replica_a has no tables
+            return HttpResponse(list(Employee.objects.using(alias).values_list('name', flat=True)))
+
+        Employee.objects.create(name='On the primary', company=Company.objects.create(
+            name='Company', organization=Organization.objects.create(name='Org'),
+        ))
+        self.addCleanup(Organization.objects.using('default').all().delete)
+        response = replica_routing(view)(RequestFactory().get('/'))
+        # The view ran once, and read the primary's rows
+        self.assertEqual(seen, ['test_replica_a'])
+        self.assertEqual(response.content, b'On the primary')
+        self.assertEqual(self.reads(1), ['default'])
+
+    @override_settings(API_READ_DATABASES=replicas)
+    def test_primary_for_writes_transactions_and_other_requests(self):
+        self.assertEqual(self.router.db_for_write(Employee), 'default')
+        # A transaction's own rows are only on the primary
+        with mock.patch.object(connection, 'in_atomic_block', True):
+            self.assertEqual(self.reads(1), ['default'])
+        request_routing.set(RequestRouting(use_replicas=False))
+        self.assertEqual(self.reads(1), ['default'])
+        request_routing.set(None)
+        self.assertEqual(self.reads(1), ['default'])
+        self.assertFalse(self.router.allow_migrate('test_replica_a', 'myapp'))
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        seen = []
+
+        def view(request):
+            seen.append(request_routing.get().use_replicas)
+            if request.method == 'POST':
+                self.router.db_for_write(Employee)
+            return HttpResponse()
+
+        middleware = replica_routing(view)
+        factory = RequestFactory()
+        middleware(factory.get('/'))
+        response = middleware(factory.post('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        factory.cookies[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertNotIn(PIN_COOKIE, middleware(factory.get('/')).cookies)
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 60):
+            middleware(factory.get('/'))
+        self.assertEqual(seen, [True, False, False, True])
+
+    def test_clients_without_cookies_pin_with_the_header(self):
+        seen = []
+
+        def view(request):
+            seen.append(request_routing.get().use_replicas)
+            if request.method == 'POST':
+                self.router.db_for_write(Employee)
+            return HttpResponse()
+
+        middleware = replica_routing(view)
+        factory = RequestFactory()
+        pin = middleware(factory.post('/'))[PIN_HEADER]
+        middleware(factory.get('/', headers={PIN_HEADER: pin}))
+        middleware(factory.get('/', headers={PIN_HEADER: 'forged'}))
+        self.assertEqual(seen, [False, False, True])
+
+
+class ReadYourWritesTests(APITestCase):
+    def test_api_writes_set_the_pin(self):
+        response = self.client.post('/api/organizations/', {'name': 'Pinned Org'})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertNotIn(PIN_COOKIE, self.client.get('/api/organizations/').cookies)
+
+
+class NameFilterTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        org = Organization.objects.create(name='Org')
+        company = Company.objects.create(name='Company', organization=org)
+        for name in ['Grace Hopper', 'Grace Kelly', 'Ada Grace', 'Alan Turing']:
+            Employee.objects.create(name=name, company=company)
+
+    def names(self, query):
+        response = self.client.get(f'/api/employees/?{query}')
+        return sorted(row['name'] for row in response.data['results'])
+
+    def test_modes(self):
+        self.assertEqual(self.names('name_prefix=GRACE'), ['Grace Hopper', 'Grace Kelly'])
+        self.assertEqual(self.names('name_exact=grace kelly'), ['Grace Kelly'])
+        self.assertEqual(self.names('name_contains=grace'), ['Ada Grace', 'Grace Hopper', 'Grace Kelly'])
+        self.assertEqual(self.names('name=TURING'), ['Alan Turing'])
+        self.assertEqual(self.names('name_prefix=grace&name_contains=kel'), ['Grace Kelly'])
+
+    def test_organization_filter(self):
+        other = Company.objects.create(name='Other', organization=Organization.objects.create(name='Other Org'))
+        Employee.objects.create(name='Grace Murray', company=other)
+        org = other.organization_id
+        self.assertEqual(self.names(f'organization={org}'), ['Grace Murray'])
+        self.assertEqual(self.names(f'organization={org}&name_prefix=grace'), ['Grace Murray'])
+
+    def test_non_numeric_ids(self):
+        for url in ('/api/employees/', '/api/employees/filter/', '/api/employees/legacy/'):
+            for query in ('company=abc', 'organization=²', 'company=-1'):
+                response = self.client.get(f'{url}?{query}')
+                self.assertEqual(response.status_code, 400, f'{url}?{query}')
+        self.assertEqual(response.data, {'error': 'company must be an id'})
+
+    def test_non_ascii_names(self):
+        Employee.objects.create(name='Émile Zola', company=Company.objects.get(name='Company'))
+        self.assertEqual(self.names('name_exact=Émile Zola'), ['Émile Zola'])
+        self.assertEqual(self.names('name_exact=ÉMILE ZOLA'), ['Émile Zola'])
+        self.assertEqual(self.names('name_prefix=Émile'), ['Émile Zola'])
+        self.assertEqual(self.names('name_contains=ÉMILE'), ['Émile Zola'])
+
+    def test_search_key_follows_renames(self):
+        Employee.objects.filter(name='Alan Turing').update(name='Alan M. Turing')
+        self.assertEqual(self.names('name_exact=alan m. turing'), ['Alan M. Turing'])
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        create_tree(orgs=1, companies=1, employees=1)
+        self.company = Company.objects.get()
+        self.employee = Employee.objects.get()
+
+    def test_hit_then_invalidated_by_write(self):
+        first = self.client.get('/api/companies/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(1):  # the ETag's version stamps
+            second = self.client.get('/api/companies/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+        Employee.objects.create(name='New Hire', company=self.company)
+        third = self.client.get('/api/companies/')
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertEqual(third.data['results'][0]['employee_count'], 2)
+
+    def test_responses_from_lagging_replicas_are_not_stored(self):
+        with mock.patch('myapp.cache.read_lagging_replica', return_value=True):
+            self.assertEqual(self.client.get('/api/companies/')['X-Cache'], 'MISS')
+            self.assertEqual(self.client.get('/api/companies/')['X-Cache'], 'MISS')
+        self.client.get('/api/companies/')
+        self.assertEqual(self.client.get('/api/companies/')['X-Cache'], 'HIT')
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get('/api/employees/?name=employee')
+        self.assertEqual(self.client.get('/api/employees/?name=other')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/employees/?name=employee')['X-Cache'], 'HIT')
+
+    def test_detail_invalidation_is_scoped(self):
+        other = Company.objects.create(name='Other', organization=self.company.organization)
+        url = f'/api/employees/{self.employee.pk}/'
+        self.client.get(url)
+        Employee.objects.create(name='Elsewhere', company=other)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')  # shares the organization
+        self.client.get(f'/api/companies/{other.pk}/')
+        self.company.name = 'Renamed'
+        self.company.save()
+        self.assertEqual(self.client.get(f'/api/companies/{other.pk}/')['X-Cache'], 'MISS')
+        response = self.client.get(url)
+        self.assertEqual((response['X-Cache'], response.data['company_name']), ('MISS', 'Renamed'))
+
+    def test_write_while_building_is_not_stored(self):
+        organization = self.company.organization
+        to_representation = CompanySerializer.to_representation
+
+        def rename_first(serializer, instance):
+            organization.name = 'Renamed'
+            organization.save()
+            return to_representation(serializer, instance)
+
+        url = f'/api/companies/{self.company.pk}/'
+        with mock.patch.object(CompanySerializer, 'to_representation', rename_first):
+            self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+    def test_writes_are_not_cached(self):
+        response = self.client.post('/api/organizations/', {'name': 'Fresh Org'})
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('X-Cache', response)
+
+    def test_statistics(self):
+        self.client.get('/api/stats/')
+        self.client.get('/api/stats/')
+        stats = self.client.get('/api/cache/stats/').data
+        self.assertEqual(stats['endpoints']['stats'], {'hits': 1, 'misses': 1})
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+
+class ConditionalRequestTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        create_tree(orgs=1, companies=1, employees=1)
+        self.company = Company.objects.get()
+        self.employee = Employee.objects.get()
+
+    def test_not_modified_skips_the_view(self):
+        url = f'/api/companies/{self.company.pk}/'
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+
+    def test_child_write_changes_parent_etags(self):
+        company_url = f'/api/companies/{self.company.pk}/'
+        org_url = f'/api/organizations/{self.company.organization_id}/'
+        etags = [self.client.get(url)['ETag'] for url in (company_url, org_url, '/api/companies/')]
+        self.employee.position = 'Manager'
+        self.employee.save()
+        for url, etag in zip((company_url, org_url, '/api/companies/'), etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200, url)
+
+    def test_query_string_changes_list_etag(self):
+        first = self.client.get('/api/employees/?page_size=1')['ETag']
+        self.assertNotEqual(self.client.get('/api/employees/?page_size=2')['ETag'], first)
+        self.assertEqual(self.client.get('/api/employees/?page_size=1', HTTP_IF_NONE_MATCH=first).status_code, 304)
+
+    def test_unrelated_detail_keeps_its_etag(self):
+        url = f'/api/employees/{self.employee.pk}/'
+        etag = self.client.get(url)['ETag']
+        Company.objects.create(name='Other', organization=Organization.objects.create(name='Other Org'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_if_modified_since(self):
+        response = self.client.get('/api/organizations/')
+        again = self.client.get('/api/organizations/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_missing_object_is_404(self):
+        self.assertEqual(self.client.get('/api/employees/999999/').status_code, 404)
+
+
+class BulkTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        create_tree(orgs=2, companies=1, employees=1)
+        self.first, self.second = Company.objects.order_by('id')
+
+    def assertNoDrift(self):
+        self.assertEqual([qs.count() for qs in find_drift()], [0, 0, 0])
+
+    def bulk_create_employees(self, count):
+        rows = [{'name': f'Hire {i}', 'position': 'Engineer', 'company': self.first.pk} for i in range(count)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/employees/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.assertEqual(self.bulk_create_employees(3), self.bulk_create_employees(100))
+        self.assertEqual(Company.objects.get(pk=self.first.pk).employee_count, 104)
+        self.assertNoDrift()
+
+    def test_invalid_rows_are_reported_without_aborting(self):
+        rows = [
+            {'name': 'Valid Hire', 'company': self.second.pk},
+            {'name': 'X', 'company': self.second.pk},
+            {'name': 'Nowhere', 'company': 999999},
+            'not an object',
+        ]
+        response = self.client.post('/api/employees/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3])
+        self.assertIn('company', response.data['errors'][1]['errors'])
+        employee = Employee.objects.get(pk=response.data['ids'][0])
+        self.assertEqual(employee.organization_id, self.second.organization_id)
+        self.assertNoDrift()
+
+    def test_update_moves_employees_and_companies(self):
+        employee = Employee.objects.get(company=self.first)
+        response = self.client.patch('/api/employees/bulk/', [
+            {'id': employee.pk, 'company': self.second.pk, 'position': 'Manager'},
+            {'id': 999999, 'name': 'Ghost'},
+            {'id': employee.pk, 'name': 'Twice'},
+        ], format='json')
+        self.assertEqual((response.status_code, response.data['updated']), (207, 1))
+        employee.refresh_from_db()
+        self.assertEqual((employee.position, employee.organization_id, employee.version), ('Manager', self.second.organization_id, 2))
+
+        response = self.client.patch('/api/companies/bulk/', [
+            {'id': self.second.pk, 'organization': self.first.organization_id},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Organization.objects.get(pk=self.first.organization_id).employee_count, 2)
+        self.assertNoDrift()
+
+    def test_delete_cascades(self):
+        response = self.client.delete('/api/companies/bulk/', [self.first.pk, 999999, '²', -1], format='json')
+        self.assertEqual((response.status_code, response.data['deleted']), (207, 1))
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3])
+        self.assertFalse(Employee.objects.filter(company_id=self.first.pk).exists())
+        self.assertEqual(Organization.objects.get(pk=self.first.organization_id).company_count, 0)
+        response = self.client.delete('/api/organizations/bulk/', [self.second.organization_id], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Employee.objects.count(), 0)
+        self.assertNoDrift()
+
+    def test_bulk_write_invalidates_cached_lists(self):
+        self.client.get('/api/organizations/')
+        self.client.post('/api/organizations/bulk/', [{'name': 'Acquired Org'}], format='json')
+        response = self.client.get('/api/organizations/')
+        self.assertEqual((response['X-Cache'], len(response.data['results'])), ('MISS', 3))
+
+    def test_rejects_non_list_body(self):
+        response = self.client.post('/api/employees/bulk/', {'name': 'Solo'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        create_tree(orgs=2, companies=1, employees=3)
+
+    def export(self, query):
+        response = self.client.get(f'/api/employees/export/?{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        with self.settings(API_EXPORT_CHUNK_SIZE=2):
+            response, body = self.export('format=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['organization_name'], 'Org 0')
+        self.assertEqual(rows[0]['company_name'], 'Company 0-0')
+
+    def test_csv_honours_filters(self):
+        org = Organization.objects.get(name='Org 1')
+        _, body = self.export(f'format=csv&organization={org.pk}&name_prefix=employee 1-0-')
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual([row['name'] for row in rows], ['Employee 1-0-0', 'Employee 1-0-1', 'Employee 1-0-2'])
+        self.assertEqual({row['organization_id'] for row in rows}, {str(org.pk)})
+
+    def test_rejects_bad_filters_before_streaming(self):
+        response = self.client.get('/api/employees/export/?format=ndjson&company=x')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
+        self.assertEqual(json.loads(response.content), {'error': 'company must be an id'})
+        response = self.client.get('/api/employees/export/?format=csv&organization=²')
+        self.assertEqual((response.status_code, response.streaming), (400, False))
+        self.assertEqual(response.content.decode().splitlines(), ['error', 'organization must be an id'])
+
+    def test_rejects_unsupported_formats(self):
+        response = self.client.get('/api/employees/export/?format=json')
+        self.assertEqual((response.status_code, response.streaming), (400, False))
+        self.assertEqual(json.loads(response.content), {'error': 'format must be one of: ndjson, csv'})
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/api/employees/export/?format=csv').status_code, 401)
+
+
+class ImportTests(APITestCase):
+    CSV = (
+        'organization_name,company_name,name,position\n'
+        'Acme,Acme Labs,Ada Lovelace,Engineer\n'
+        'Acme,Acme Labs,Alan Turing,Analyst\n'
+        'Acme,Acme Works,Grace Hopper,\n'
+        ',Orphan Co,Nobody,\n'
+        'Initech,,,\n'
+    )
+
+    def test_upload_creates_parents_and_counts(self):
+        upload = SimpleUploadedFile('people.csv', self.CSV.encode(), content_type='text/csv')
+        response = self.client.post('/api/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], {'organizations': 2, 'companies': 2, 'employees': 3})
+        self.assertEqual(response.data['errors'], [{'line': 5, 'error': 'organization_name is required'}])
+        acme = Organization.objects.get(name='Acme')
+        self.assertEqual((acme.company_count, acme.employee_count), (2, 3))
+        self.assertEqual([qs.count() for qs in find_drift()], [0, 0, 0])
+
+    def test_existing_parents_are_reused(self):
+        create_tree(orgs=1, companies=1, employees=0)
+        rows = [
+            {'organization_name': 'Org 0', 'company_name': 'Company 0-0', 'name': f'Hire {i}'} for i in range(5)
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows) + '\nnot json\n'
+        with TemporaryDirectory() as directory:
+            path = Path(directory) / 'hires.ndjson'
+            path.write_text(body)
+            call_command('import_employees', str(path), batch_size=2, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Organization.objects.count(), 1)
+        self.assertEqual(Company.objects.get().employee_count, 5)
+
+    def test_unknown_format(self):
+        upload = SimpleUploadedFile('people.txt', b'x', content_type='text/plain')
+        self.assertEqual(self.client.post('/api/import/', {'file': upload}, format='multipart').status_code, 400)
+
+    def upload(self, name, content):
+        return self.client.post('/api/import/', {'file': SimpleUploadedFile(name, content)}, format='multipart')
+
+    def test_unreadable_input(self):
+        response = self.upload('people.csv', self.CSV.encode() + b'Acme,Acme Labs,Ren\xe9,Engineer\n')
+        self.assertEqual((response.status_code, response.data['line']), (400, None))
+        self.assertIn('UTF-8', response.data['error'])
+
+        # Python < 3.11 also rejects NUL bytes
+        response = self.upload('people.csv', b'organization_name\nAcme\n' + b'x' * (csv.field_size_limit() + 1))
+        self.assertEqual((response.status_code, response.data['line']), (400, 3))
+        # The rows before the error are imported
+        self.assertEqual(response.data['rows'], 1)
+
+        response = self.upload('people.ndjson', b'{"organization_name": "Acme"}\n{"organization_name": "\xff"}\n')
+        self.assertEqual((response.status_code, response.data['line']), (400, 2))
+
+    def test_serializer_limits(self):
+        response = self.upload('people.csv', b'organization_name,company_name,name,position\nAcme,Acme Labs,Ada,X\n')
+        self.assertEqual(response.data['errors'], [{'line': 2, 'error': 'position must be at least 2 characters long'}])
+
+    def test_failed_batch_forgets_its_parents(self):
+        importer = EmployeeImporter()
+        rows = [(2, {'organization_name': 'Acme', 'company_name': 'Acme Labs', 'name': 'Ada Lovelace'})]
+        with (
+            mock.patch.object(Employee.objects, 'bulk_create', side_effect=DatabaseError),
+            self.assertRaises(DatabaseError),
+        ):
+            importer.run(rows)
+        self.assertEqual((importer.organizations, importer.companies), ({}, {}))
+        importer.run(rows)
+        self.assertEqual(Company.objects.get().employee_count, 1)
+
+
+class FastPathTests(APITestCase):
+    URLS = (
+        '/api/organizations/',
+        '/api/organizations/?depth=1&fields=id,name,companies.name,companies.employee_count',
+        '/api/companies/?page_size=3',
+        '/api/employees/?name_prefix=employee 1',
+        '/api/employees/?fields=name,organization_name',
+        '/api/employees/legacy/',
+    )
+
+    def setUp(self):
+        super().setUp()
+        create_tree(orgs=3, companies=2, employees=3)
+        Employee.objects.create(name='Ünïcode "quoted"', position='', company=Company.objects.last())
+
+    def test_identical_json(self):
+        for url in self.URLS:
+            fast = self.client.get(url)
+            caches['api'].clear()
+            with self.settings(API_FAST_LIST_SERIALIZATION=False):
+                slow = self.client.get(url)
+            self.assertEqual(fast.status_code, 200)
+            self.assertEqual(fast.content, slow.content, url)
+
+    def test_cursor_links_follow(self):
+        page = self.client.get('/api/employees/?page_size=5').data
+        second = self.client.get(page['next']).data
+        self.assertEqual(len(page['results']) + len(second['results']), 10)
+        self.assertGreater(second['results'][0]['id'], page['results'][-1]['id'])
+
+    def test_plans_are_reused(self):
+        self.assertIs(row_plan(EmployeeSerializer), row_plan(EmployeeSerializer))
+
+
+class ORJSONTests(APITestCase):
+    DATA = {
+        'text': 'Ünïcode \u2028 line separator',
+        'lazy': gettext_lazy('Lazy'),
+        'error': [ErrorDetail('Bad', code='invalid')],
+        'when': datetime.datetime(2026, 10, 16, 12, 30, 5, 123456, tzinfo=datetime.UTC),
+        'day': datetime.date(2026, 10, 16),
+        'amount': Decimal('1.50'),
+        'nested': [{'id': 1, 'values': (1, 2.5, None, True)}],
+        7: 'int key',
+    }
+
+    def test_matches_json_renderer(self):
+        self.assertEqual(ORJSONRenderer().render(self.DATA), JSONRenderer().render(self.DATA))
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch('myapp.renderers.orjson', None), mock.patch('myapp.parsers.orjson', None):
+            self.assertEqual(ORJSONRenderer().render(self.DATA), JSONRenderer().render(self.DATA))
+            self.assertEqual(ORJSONParser().parse(BytesIO(b'{"a": [1]}')), {'a': [1]})
+
+    def test_parser(self):
+        self.assertEqual(ORJSONParser().parse(BytesIO('{"name": "Zoë"}'.encode())), {'name': 'Zoë'})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"a": NaN}'))
+
+    def test_api_uses_it(self):
+        create_tree(orgs=1, companies=1, employees=1)
+        response = self.client.get('/api/employees/')
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        created = self.client.post('/api/organizations/', '{"name": "Parsed Org"}', content_type='application/json')
+        self.assertEqual(created.status_code, 201)
+
+
+@generous_login_rates
+class StatelessAuthTests(TestCase):
+    def setUp(self):
+        user_records.clear()
+        self.user = User.objects.create_user(username='tester', password='testpass123')
+        self.client = APIClient()
+        response = self.client.post('/api/auth/login/', {'username': 'tester', 'password': 'testpass123'})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['tokens']['access']}")
+
+    def test_warm_requests_skip_the_user_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/auth/profile/').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.data['username'], 'tester')
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get('/api/auth/profile/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+
+    def test_changed_privileges_revoke_tokens(self):
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'token_outdated')
+
+    def test_deleted_user_is_rejected(self):
+        self.client.get('/api/auth/profile/')
+        self.user.delete()
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+
+
+OLD_KEY = {'kid': 'old', 'algorithm': 'HS256', 'secret': 'old-secret-' * 6}
+NEW_KEY = {'kid': 'new', 'algorithm': 'HS512', 'secret': 'new-secret-' * 6}
+
+
+@generous_login_rates
+class KeyRotationTests(TestCase):
+    def setUp(self):
+        user_records.clear()
+        User.objects.create_user(username='tester', password='testpass123')
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post('/api/auth/login/', {'username': 'tester', 'password': 'testpass123'})
+        return response.data['tokens']
+
+    def profile_status(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        status_code = self.client.get('/api/auth/profile/').status_code
+        self.client.credentials()
+        return status_code
+
+    def test_rotation(self):
+        with override_settings(API_JWT_KEYS=[OLD_KEY]):
+            old = self.login()
+        self.assertEqual(get_unverified_header(old['access'])['kid'], 'old')
+
+        with override_settings(API_JWT_KEYS=[NEW_KEY, OLD_KEY]):
+            new = self.login()
+            self.assertEqual(get_unverified_header(new['access']), {'alg': 'HS512', 'kid': 'new', 'typ': 'JWT'})
+            self.assertEqual(self.profile_status(old['access']), 200)
+            self.assertEqual(self.profile_status(new['access']), 200)
+            # Refreshing an old token signs the new access token with the new key
+            refreshed = self.client.post('/api/auth/refresh/', {'refresh': old['refresh']}).data['access']
+            self.assertEqual(get_unverified_header(refreshed)['kid'], 'new')
+
+        with override_settings(API_JWT_KEYS=[NEW_KEY]):
+            self.assertEqual(self.profile_status(old['access']), 401)
+            self.assertEqual(self.profile_status(new['access']), 200)
+
+    def test_forged_kid_is_rejected(self):
+        with override_settings(API_JWT_KEYS=[{**OLD_KEY, 'kid': 'new'}]):
+            forged = self.login()
+        with override_settings(API_JWT_KEYS=[NEW_KEY, OLD_KEY]):
+            self.assertEqual(self.profile_status(forged['access']), 401)
+
+    def test_jwks_hides_symmetric_keys(self):
+        response = self.client.get('/api/auth/jwks/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'keys': []})
+
+    @skipUnless(has_crypto, 'needs the cryptography package')
+    def test_asymmetric_keys(self):
+        with TemporaryDirectory() as directory:
+            for algorithm in ('RS256', 'EdDSA'):
+                private, public = generate_key_pair(algorithm)
+                (Path(directory) / f'{algorithm}.pem').write_bytes(private)
+                (Path(directory) / f'{algorithm}.pub.pem').write_bytes(public)
+            keys = [
+                {'kid': 'ed', 'algorithm': 'EdDSA', 'private_key': 'EdDSA.pem'},
+                {'kid': 'rsa', 'algorithm': 'RS256', 'public_key': 'RS256.pub.pem'},
+                OLD_KEY,
+            ]
+            with override_settings(API_JWT_KEY_DIR=directory, API_JWT_KEYS=keys):
+                tokens = self.login()
+                self.assertEqual(get_unverified_header(tokens['access'])['alg'], 'EdDSA')
+                self.assertEqual(self.profile_status(tokens['access']), 200)
+                jwks = self.client.get('/api/auth/jwks/').data['keys']
+        self.assertEqual([(key['kid'], key['alg'], key['kty']) for key in jwks], [('ed', 'EdDSA', 'OKP'), ('rsa', 'RS256', 'RSA')])
+
+
+@generous_login_rates
+class RevocationTests(TestCase):
+    def setUp(self):
+        revoked_tokens.reset()
+        User.objects.create_user(username='tester', password='testpass123')
+        self.client = APIClient()
+        response = self.client.post('/api/auth/login/', {'username': 'tester', 'password': 'testpass123'})
+        self.refresh = response.data['tokens']['refresh']
+
+    def test_refresh_rotates(self):
+        response = self.client.post('/api/auth/refresh/', {'refresh': self.refresh})
+        self.assertEqual(response.status_code, 200)
+        rotated = response.data['refresh']
+        self.assertNotEqual(rotated, self.refresh)
+        # Replaying the old token fails; the new one works once
+        self.assertEqual(self.client.post('/api/auth/refresh/', {'refresh': self.refresh}).status_code, 401)
+        self.assertEqual(self.client.post('/api/auth/refresh/', {'refresh': rotated}).status_code, 200)
+        self.assertEqual(self.client.post('/api/auth/refresh/', {'refresh': rotated}).status_code, 401)
+
+    def test_logout(self):
+        self.assertEqual(self.client.post('/api/auth/logout/', {'refresh': self.refresh}).status_code, 200)
+        self.assertEqual(self.client.post('/api/auth/refresh/', {'refresh': self.refresh}).status_code, 401)
+        self.assertEqual(self.client.post('/api/auth/logout/', {'refresh': self.refresh}).status_code, 401)
+
+    def test_check_skips_the_table(self):
+        RefreshToken(self.refresh).revoke()
+        revoked_tokens.bloom()
+        with self.assertNumQueries(0):
+            self.assertFalse(revoked_tokens.is_revoked('never-revoked'))
+        with self.assertNumQueries(1):
+            self.assertTrue(revoked_tokens.is_revoked(RefreshToken(self.refresh, verify=False)['jti']))
+
+    def test_sync_picks_up_other_processes(self):
+        revoked_tokens.bloom()
+        # Inserted by another process; this one learns about it on its next sync
+        RevokedToken.objects.create(jti='elsewhere', expires_at=datetime.datetime(2100, 1, 1, tzinfo=datetime.UTC))
+        self.assertFalse(revoked_tokens.is_revoked('elsewhere'))
+        with override_settings(API_REVOCATION_SYNC_INTERVAL=0):
+            revoked_tokens.bloom()
+            self.assertTrue(revoked_tokens.is_revoked('elsewhere'))
+
+    def test_sync_overlap_does_not_fill_the_filter(self):
+        RevokedToken.objects.create(jti='elsewhere', expires_at=datetime.datetime(2100, 1, 1, tzinfo=datetime.UTC))
+        count = revoked_tokens.bloom().count
+        with override_settings(API_REVOCATION_SYNC_INTERVAL=0):
+            for _ in range(3):
+                # Each sync reads the rows of the overlap window again
+                self.assertEqual(revoked_tokens.bloom().count, count)
+
+    def test_purge(self):
+        past = datetime.datetime(2000, 1, 1, tzinfo=datetime.UTC)
+        RevokedToken.objects.create(jti='expired', expires_at=past)
+        RefreshToken(self.refresh).revoke()
+        out = StringIO()
+        call_command('purge_revoked_tokens', stdout=out)
+        self.assertIn('Purged 1 ', out.getvalue())
+        self.assertEqual(RevokedToken.objects.count(), 1)
+        self.assertNotIn('expired', revoked_tokens.bloom())
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'member-{i}')
+        self.assertTrue(all(f'member-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+        # Distinct items, less the few that were false positives when added
+        count = bloom.count
+        self.assertGreater(count, 990)
+        bloom.add('member-0')
+        self.assertEqual(bloom.count, count)
+
+
+# Cheap parameters so the tests don't spend their time hashing
+FAST_HASHERS = override_settings(
+    API_PASSWORD_HASHER='scrypt',
+    API_PASSWORD_HASHER_PARAMS={'scrypt': {'work_factor': 2 ** 10, 'block_size': 8, 'parallelism': 1}},
+    PASSWORD_HASHERS=['myapp.hashers.ScryptPasswordHasher', 'myapp.hashers.PBKDF2PasswordHasher'],
+)
+
+
+@FAST_HASHERS
+class LoginTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def login(self, username, password='testpass123'):
+        return self.client.post('/api/auth/login/', {'username': username, 'password': password})
+
+    def test_rehash_on_login(self):
+        user = User.objects.create_user(username='legacy')
+        user.password = make_password('testpass123', hasher='pbkdf2_sha256')
+        user.save()
+        self.assertEqual(self.login('legacy', 'wrong').status_code, 401)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+        self.assertEqual(self.login('legacy').status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$1024$'))
+
+        # Retuned parameters upgrade the hash the same way
+        with override_settings(
+            API_PASSWORD_HASHER_PARAMS={'scrypt': {'work_factor': 2 ** 11, 'block_size': 8, 'parallelism': 1}},
+            PASSWORD_HASHERS=settings.PASSWORD_HASHERS,
+        ):
+            self.assertEqual(self.login('legacy').status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$2048$'))
+
+    @override_settings(API_LOGIN_RATES={'username': '2/min', 'ip': '1000/min'})
+    def test_rate_limit_per_username(self):
+        User.objects.create_user(username='limited', password='testpass123')
+        self.assertEqual(self.login('limited', 'wrong').status_code, 401)
+        self.assertEqual(self.login('limited', 'wrong').status_code, 401)
+        response = self.login('limited')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.login('someone-else').status_code, 401)
+
+    @override_settings(API_LOGIN_RATES={'username': '1000/min', 'ip': '3/min'})
+    def test_rate_limit_per_address(self):
+        for username in ('a', 'b', 'c'):
+            self.assertEqual(self.login(username).status_code, 401)
+        self.assertEqual(self.login('d').status_code, 429)
+        other = APIClient(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other.post('/api/auth/login/', {'username': 'd', 'password': 'x'}).status_code, 401)
+
+    @override_settings(API_LOGIN_RATES={'username': '1000/min', 'ip': '2/min'})
+    def test_forwarded_for_does_not_reset_the_address_limit(self):
+        client = APIClient(REMOTE_ADDR='10.0.0.3')
+        for n, username in enumerate(('a', 'b', 'c')):
+            response = client.post(
+                '/api/auth/login/', {'username': username, 'password': 'x'}, HTTP_X_FORWARDED_FOR=f'192.0.2.{n}',
+            )
+        self.assertEqual(response.status_code, 429)
+        response = client.post('/auth/login-form/', {'username': 'd', 'password': 'x'}, HTTP_X_FORWARDED_FOR='192.0.2.9')
+        self.assertEqual(response.status_code, 429)
+
+    @generous_login_rates
+    def test_busy_pool(self):
+        User.objects.create_user(username='busy', password='testpass123')
+        with mock.patch.object(hashing_pool, 'submit', side_effect=HashingBusy):
+            response = self.login('busy')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    @override_settings(API_PASSWORD_HASHING_WORKERS=1, API_PASSWORD_HASHING_QUEUE=1)
+    def test_pool_bounds_the_queue(self):
+        pool = HashingPool()
+        release = threading.Event()
+        running = pool.submit(release.wait)
+        queued = pool.submit(lambda: 'queued')
+        with self.assertRaises(HashingBusy):
+            pool.submit(lambda: 'rejected')
+        release.set()
+        self.assertEqual(queued.result(), 'queued')
+        self.assertTrue(running.result())
+        self.assertEqual(pool.run(lambda: 'free again'), 'free again')
+        pool.shutdown()
+
+    def test_token_buckets(self):
+        with mock.patch('myapp.throttling.time.monotonic', return_value=100.0) as monotonic:
+            bucket = TokenBuckets(2, 60, maxsize=10)
+            self.assertEqual(bucket.take('key'), 0)
+            self.assertEqual(bucket.take('key'), 0)
+            self.assertAlmostEqual(bucket.take('key'), 30)
+            monotonic.return_value = 130.0
+            self.assertEqual(bucket.take('key'), 0)
+
+
+@FAST_HASHERS
+@generous_login_rates
+class RegistrationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_register_is_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/auth/register/', {'username': 'new', 'password': 'testpass123'})
+        self.assertEqual(response.status_code, 201)
+        statements = [query['sql'].split()[0] for query in queries]
+        self.assertEqual(statements.count('INSERT'), 1)
+        self.assertNotIn('SELECT', statements)
+        self.assertTrue(User.objects.get(username='new').check_password('testpass123'))
+
+        response = self.client.post('/api/auth/register/', {'username': 'new', 'password': 'other-pass'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Username already exists'})
+
+    def test_register_form_errors(self):
+        User.objects.create_user(username='taken')
+        response = self.client.post('/auth/register-form/', {'username': 'taken', 'password': 'testpass123'})
+        self.assertContains(response, 'That username is already taken.')
+        with mock.patch.object(hashing_pool, 'submit', side_effect=HashingBusy):
+            response = self.client.post('/auth/register-form/', {'username': 'fresh', 'password': 'testpass123'})
+        self.assertContains(response, 'Too many signups in progress', status_code=503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_bulk_register(self):
+        User.objects.create_user(username='existing')
+        rows = [
+            {'username': 'bulk-1', 'email': 'One@Example.COM', 'password': 'first-pass'},
+            {'username': 'bulk-2', 'password': 'second-pass'},
+            {'username': 'bulk-1', 'password': 'again'},
+            {'username': 'existing', 'password': 'taken'},
+            {'username': 'no-password'},
+        ]
+        self.client.force_authenticate(User.objects.create_user(username='admin', is_staff=True))
+        response = self.client.post('/api/auth/register/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [2, 3, 4])
+        first = User.objects.get(username='bulk-1')
+        self.assertEqual(first.email, 'One@example.com')
+        self.assertTrue(first.check_password('first-pass'))
+        self.assertTrue(User.objects.get(username='bulk-2').check_password('second-pass'))
+
+    def test_bulk_register_race(self):
+        # The name is taken after the lookup; the insert falls back to one row at a time
+        User.objects.create_user(username='raced')
+        self.client.force_authenticate(User.objects.create_user(username='admin', is_staff=True))
+        rows = [{'username': 'raced', 'password': 'pass-one'}, {'username': 'fresh', 'password': 'pass-two'}]
+        with mock.patch.object(User.objects, 'filter', return_value=User.objects.none()):
+            response = self.client.post('/api/auth/register/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['errors'], [{'index': 0, 'errors': {'username': ['Username already exists']}}])
+        self.assertTrue(User.objects.filter(username='fresh').exists())
+
+    def test_bulk_register_needs_admin(self):
+        self.client.force_authenticate(User.objects.create_user(username='plain'))
+        response = self.client.post('/api/auth/register/bulk/', [{'username': 'x', 'password': 'y'}], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(ROOT_URLCONF='companyapi.urls_async')
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        caches['api'].clear()
+        user_records.clear()
+        create_tree(orgs=2, companies=2, employees=3)
+        self.user = User.objects.create_user(username='tester', password='testpass123')
+        token = str(issue_tokens(self.user).access_token)
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    async def get(self, url):
+        return await self.async_client.get(url, headers=self.headers)
+
+    def sync_json(self, url):
+        with override_settings(ROOT_URLCONF='companyapi.urls'):
+            response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    async def test_responses_match_the_sync_views(self):
+        employee = await Employee.objects.afirst()
+        for url in (
+            '/api/organizations/', '/api/companies/?fields=id,name', '/api/employees/?name_prefix=employee 1',
+            f'/api/organizations/{employee.organization_id}/', f'/api/companies/{employee.company_id}/',
+            f'/api/employees/{employee.pk}/', '/api/stats/?breakdown=companies', '/api/search/?q=company',
+            '/api/search/?q=company&types=employees,,companies',
+        ):
+            response = await self.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.json(), await sync_to_async(self.sync_json)(url), url)
+
+    async def test_response_cache_and_conditional_get(self):
+        employee = await Employee.objects.afirst()
+        for url in ('/api/employees/', f'/api/employees/{employee.pk}/'):
+            first = await self.get(url)
+            self.assertEqual(first['X-Cache'], 'MISS', url)
+            second = await self.get(url)
+            self.assertEqual(second['X-Cache'], 'HIT', url)
+            self.assertEqual(second.json(), first.json(), url)
+            unchanged = await self.async_client.get(url, headers={**self.headers, 'If-None-Match': first['ETag']})
+            self.assertEqual(unchanged.status_code, 304, url)
+
+        employee.name = 'Renamed'
+        await sync_to_async(employee.save)()
+        url = f'/api/employees/{employee.pk}/'
+        response = await self.get(url)
+        self.assertEqual((response['X-Cache'], response.json()['name']), ('MISS', 'Renamed'))
+        self.assertEqual((await self.get(url))['X-Cache'], 'HIT')
+
+    async def test_cursor_pages(self):
+        first = (await self.get('/api/employees/?page_size=5')).json()
+        self.assertIsNone(first['previous'])
+        second = (await self.get(first['next'])).json()
+        self.assertEqual([e['id'] for e in second['results']], [e['id'] for e in (await sync_to_async(
+            self.sync_json)(first['next']))['results']])
+        back = (await self.get(second['previous'])).json()
+        self.assertEqual(back['results'], first['results'])
+
+    async def test_errors(self):
+        response = await self.async_client.get('/api/organizations/')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        response = await self.async_client.get('/api/organizations/', headers={'Authorization': 'Bearer nonsense'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+        self.assertEqual((await self.get('/api/employees/0/')).status_code, 404)
+        self.assertEqual((await self.get('/api/organizations/?depth=x')).status_code, 400)
+        self.assertEqual((await self.get('/api/search/')).status_code, 400)
+        response = await self.get('/api/stats/?top=²')
+        self.assertEqual((response.status_code, response.json()), (400, {'error': 'top must be a positive integer'}))
+        self.assertEqual((await self.get('/api/search/?q=a&limit=²')).status_code, 400)
+        self.assertEqual((await self.get('/api/employees/?company=abc')).status_code, 400)
+        cursor = quote(base64.b64encode(b'p=abc').decode())
+        response = await self.get(f'/api/companies/?cursor={cursor}')
+        self.assertEqual((response.status_code, response.json()), (404, {'detail': 'Invalid cursor'}))
+
+    async def test_writes_use_the_sync_views(self):
+        response = await self.async_client.post(
+            '/api/organizations/', {'name': 'Async Org'}, content_type='application/json', headers=self.headers
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await Organization.objects.filter(name='Async Org').aexists())
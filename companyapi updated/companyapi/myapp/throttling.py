@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+# Login rate limiting with in-memory token buckets.
+#
+# Each login attempt takes a token from the bucket of its username and from
+# the bucket of its client address (API_LOGIN_RATES, e.g. '10/min': bursts
+# of 10, refilled at 10 per minute). Buckets live in the process, so checks
+# cost no cache round trip; with several processes each enforces its own
+# share. The least recently used buckets are dropped beyond
+# API_LOGIN_BUCKETS, which only ever makes a limiter more lenient.
+#
+# The client address is REMOTE_ADDR: X-Forwarded-For is chosen by the client,
+# and keying on it would hand out a fresh bucket per forged value. Behind
+# proxies, set REST_FRAMEWORK['NUM_PROXIES'] to the length of the real chain
+# and the address those proxies appended is used instead.
+
+
+class TokenBuckets:
+    """Token buckets by key, holding up to capacity tokens refilled over period seconds"""
+
+    def __init__(self, capacity, period, maxsize):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Take a token; return 0 if one was available, else the seconds until one is"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def buckets(scope):
+    """The TokenBuckets of an API_LOGIN_RATES scope"""
+    rate = settings.API_LOGIN_RATES[scope]
+    with _buckets_lock:
+        if (scope, rate) not in _buckets:
+            capacity, period = SimpleRateThrottle.parse_rate(None, rate)
+            _buckets[scope, rate] = TokenBuckets(capacity, period, settings.API_LOGIN_BUCKETS)
+        return _buckets[scope, rate]
+
+
+class LoginRateThrottle(BaseThrottle):
+    """Limit login attempts per username and per client address"""
+
+    def allow_request(self, request, view):
+        # DRF requests carry the parsed body in data, plain form posts in POST
+        data = getattr(request, 'data', request.POST)
+        username = data.get('username') if hasattr(data, 'get') else None
+        waits = [buckets('ip').take(self.client_address(request))]
+        if username:
+            waits.append(buckets('username').take(str(username)))
+        self.wait_seconds = max(waits)
+        return not self.wait_seconds
+
+    def client_address(self, request):
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get('REMOTE_ADDR')
+        return self.get_ident(request)
+
+    def wait(self):
+        return self.wait_seconds
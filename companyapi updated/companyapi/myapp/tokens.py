@@ -0,0 +1,221 @@
+import functools
+from pathlib import Path
+
+import jwt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from jwt.algorithms import get_default_algorithms, has_crypto
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import (
+    TokenBackendError,
+    TokenBackendExpiredToken,
+    TokenError,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .revocation import revoked_tokens
+
+# JWT signing with a kid-indexed key set and key rotation.
+#
+# API_JWT_KEYS lists the keys; the first signs new tokens and names itself
+# in the token's "kid" header, and every listed key verifies the tokens
+# carrying its kid. Rotating keys is: prepend a new key, deploy, and drop the
+# old one once the last token it signed has expired (REFRESH_TOKEN_LIFETIME).
+# Verifiers that don't share the configuration fetch the public keys from
+# GET /api/auth/jwks/; symmetric (HS*) keys are never published there.
+#
+# PEM files are read and parsed into key objects once per process, when the
+# key set is first used, so signing and verifying a token is a dict lookup
+# plus the signature operation. RS256, ES256 and EdDSA need the cryptography
+# package.
+
+ASYMMETRIC_ALGORITHMS = {'RS256', 'RS384', 'RS512', 'ES256', 'ES384', 'ES512', 'EdDSA'}
+# Bound on the encoded headers remembered per key set; tokens can add junk header fields
+MAX_CACHED_HEADERS = 64
+
+
+class SigningKey:
+    """One API_JWT_KEYS entry with its parsed signing and verifying keys"""
+
+    def __init__(self, kid, algorithm, secret=None, private_key=None, public_key=None):
+        algorithms = get_default_algorithms()
+        if algorithm not in algorithms:
+            if algorithm in ASYMMETRIC_ALGORITHMS and not has_crypto:
+                raise ImproperlyConfigured(f'JWT key {kid!r}: {algorithm} needs the cryptography package')
+            raise ImproperlyConfigured(f'JWT key {kid!r}: unknown algorithm {algorithm!r}')
+        self.kid = kid
+        self.algorithm = algorithm
+        self.implementation = algorithms[algorithm]
+
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            if not secret:
+                raise ImproperlyConfigured(f'JWT key {kid!r}: {algorithm} needs a secret')
+            self.signing_key = self.verifying_key = self.implementation.prepare_key(secret)
+            return
+        if not (private_key or public_key):
+            raise ImproperlyConfigured(f'JWT key {kid!r}: {algorithm} needs a private_key or public_key file')
+        self.signing_key = self.implementation.prepare_key(_read(private_key)) if private_key else None
+        if public_key:
+            self.verifying_key = self.implementation.prepare_key(_read(public_key))
+        else:
+            self.verifying_key = self.signing_key.public_key()
+
+    @property
+    def public(self):
+        return self.algorithm in ASYMMETRIC_ALGORITHMS
+
+    def jwk(self):
+        """The public key as a JSON Web Key"""
+        jwk = self.implementation.to_jwk(self.verifying_key, as_dict=True)
+        jwk.update(kid=self.kid, alg=self.algorithm, use='sig')
+        return jwk
+
+
+def _read(path):
+    return (Path(settings.API_JWT_KEY_DIR) / path).read_bytes()
+
+
+def generate_key_pair(algorithm):
+    """(private, public) PEM bytes of a new key pair for an asymmetric algorithm"""
+    if algorithm not in ASYMMETRIC_ALGORITHMS:
+        raise ValueError(f'{algorithm} is not an asymmetric algorithm')
+    if not has_crypto:
+        raise ImproperlyConfigured(f'{algorithm} needs the cryptography package')
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+    if algorithm == 'EdDSA':
+        private = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm.startswith('ES'):
+        curve = {'ES256': ec.SECP256R1, 'ES384': ec.SECP384R1, 'ES512': ec.SECP521R1}[algorithm]
+        private = ec.generate_private_key(curve())
+    else:
+        private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return (
+        private.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+        ),
+        private.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo,
+        ),
+    )
+
+
+class KeySetBackend(TokenBackend):
+    """TokenBackend that signs with the first key and verifies by the kid header"""
+
+    def __init__(self, keys, audience=None, issuer=None, leeway=None, json_encoder=None):
+        if not keys:
+            raise ImproperlyConfigured('API_JWT_KEYS is empty')
+        if keys[0].signing_key is None:
+            raise ImproperlyConfigured(f'JWT key {keys[0].kid!r} signs new tokens but has no private_key')
+        self.keys = {key.kid: key for key in keys}
+        if len(self.keys) != len(keys):
+            raise ImproperlyConfigured('API_JWT_KEYS has duplicate kids')
+        self.active = keys[0]
+        self._headers = {}
+        super().__init__(
+            self.active.algorithm, audience=audience, issuer=issuer, leeway=leeway, json_encoder=json_encoder,
+        )
+
+    def encode(self, payload):
+        payload = payload.copy()
+        if self.audience is not None:
+            payload['aud'] = self.audience
+        if self.issuer is not None:
+            payload['iss'] = self.issuer
+        return jwt.encode(
+            payload, self.active.signing_key, algorithm=self.active.algorithm,
+            headers={'kid': self.active.kid}, json_encoder=self.json_encoder,
+        )
+
+    def verification_key(self, token):
+        """The SigningKey named by the token's kid header"""
+        # Every token a key signs has the same encoded header; skip parsing it again
+        header = token.partition(b'.' if isinstance(token, bytes) else '.')[0]
+        key = self._headers.get(header)
+        if key is not None:
+            return key
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except jwt.InvalidTokenError as e:
+            raise TokenBackendError(_('Token is invalid')) from e
+        key = self.keys.get(kid) if isinstance(kid, str) else None
+        if key is None:
+            raise TokenBackendError(_('Token was signed with an unknown key'))
+        if len(self._headers) < MAX_CACHED_HEADERS:
+            self._headers[header] = key
+        return key
+
+    def decode(self, token, verify=True):
+        key = self.verification_key(token) if verify else None
+        try:
+            return jwt.decode(
+                token,
+                key.verifying_key if key else None,
+                # Only the key's own algorithm, so a public key can't be used as an HMAC secret
+                algorithms=[key.algorithm] if key else None,
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={'verify_aud': self.audience is not None, 'verify_signature': verify},
+            )
+        except jwt.ExpiredSignatureError as e:
+            raise TokenBackendExpiredToken(_('Token is expired')) from e
+        except jwt.InvalidTokenError as e:
+            raise TokenBackendError(_('Token is invalid')) from e
+
+
+@functools.cache
+def key_set():
+    """The process-wide KeySetBackend built from API_JWT_KEYS"""
+    return KeySetBackend(
+        [SigningKey(**entry) for entry in settings.API_JWT_KEYS],
+        audience=api_settings.AUDIENCE,
+        issuer=api_settings.ISSUER,
+        leeway=api_settings.LEEWAY,
+        json_encoder=api_settings.JSON_ENCODER,
+    )
+
+
+@receiver(setting_changed)
+def reset_key_set(setting, **kwargs):
+    if setting in ('API_JWT_KEYS', 'API_JWT_KEY_DIR', 'SIMPLE_JWT'):
+        key_set.cache_clear()
+
+
+class KeySetTokenMixin:
+    @property
+    def token_backend(self):
+        return key_set()
+
+
+class AccessToken(KeySetTokenMixin, tokens.AccessToken):
+    pass
+
+
+class RefreshToken(KeySetTokenMixin, tokens.RefreshToken):
+    access_token_class = AccessToken
+
+    def verify(self):
+        super().verify()
+        if revoked_tokens.is_revoked(self[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def revoke(self):
+        """Revoke this token; False if it already was"""
+        return revoked_tokens.revoke(self[api_settings.JTI_CLAIM], datetime_from_epoch(self['exp']))
+
+    def rotate(self):
+        """Turn this token into a new refresh token with the same claims, revoking the old one"""
+        if api_settings.BLACKLIST_AFTER_ROTATION and not self.revoke():
+            # Another request rotated it first
+            raise TokenError(_('Token is blacklisted'))
+        self.set_jti()
+        self.set_exp()
+        self.set_iat()
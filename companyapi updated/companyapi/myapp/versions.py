@@ -0,0 +1,139 @@
+import functools
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .models import Company, Employee, Organization, TableVersion
+
+# Version stamps behind the ETag / Last-Modified headers.
+#
+# Every Organization, Company and Employee row carries a version counter and
+# an updated_at timestamp describing its API representation:
+#   * TrackedModel.save() increments the row's own version,
+#   * a child write bumps its parents (myapp.counters / myapp.signals), since
+#     companies embed employees and organizations embed both,
+#   * every write also bumps the written table's TableVersion row.
+#
+# ETags are derived from those counters, never from the rendered body, so
+# answering If-None-Match costs one primary key lookup (details) or one read
+# of three TableVersion rows (lists) and never runs the serializers or the
+# main query.
+
+TABLES = ('organization', 'company', 'employee')
+
+
+def version_bump():
+    """update() keyword arguments that mark rows as changed"""
+    return {'version': F('version') + 1, 'updated_at': timezone.now()}
+
+
+def touch_parents(company_id=None, organization_id=None):
+    """Bump the versions of the parents embedding a changed child"""
+    if company_id is not None:
+        Company.objects.filter(pk=company_id).update(**version_bump())
+    if organization_id is not None:
+        Organization.objects.filter(pk=organization_id).update(**version_bump())
+
+
+def bump_table(*tables):
+    TableVersion.objects.filter(table__in=tables).update(**version_bump())
+
+
+def _make_etag(request, versions):
+    query = sorted((name, value) for name, values in request.GET.lists() for value in values)
+    raw = f'{request.path}|{query}|{versions}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _memoized_state(request, loader):
+    # condition() asks for the ETag and Last-Modified separately; load once
+    if not hasattr(request, '_version_state'):
+        request._version_state = loader()
+    return request._version_state
+
+
+def _table_state():
+    rows = TableVersion.objects.filter(table__in=TABLES).order_by('table').values_list(
+        'table', 'version', 'updated_at'
+    )
+    rows = list(rows)
+    if not rows:
+        return None
+    return [row[:2] for row in rows], max(row[2] for row in rows)
+
+
+def _list_etag(request, *args, **kwargs):
+    state = _memoized_state(request, _table_state)
+    return state and _make_etag(request, state[0])
+
+
+def _list_last_modified(request, *args, **kwargs):
+    state = _memoized_state(request, _table_state)
+    return state and state[1]
+
+
+# A representation depends on its own row and on the parents it names
+DETAIL_DEPENDENCIES = {
+    Organization: ('',),
+    Company: ('', 'organization__'),
+    Employee: ('', 'company__', 'organization__'),
+}
+
+
+def _detail_state(model, pk):
+    prefixes = DETAIL_DEPENDENCIES[model]
+    fields = [f'{prefix}{name}' for prefix in prefixes for name in ('version', 'updated_at')]
+    row = model.objects.filter(pk=pk).values_list(*fields).first()
+    if row is None:
+        return None
+    return row[0::2], max(row[1::2])
+
+
+def _detail_functions(model):
+    def etag(request, pk, *args, **kwargs):
+        state = _memoized_state(request, lambda: _detail_state(model, pk))
+        return state and _make_etag(request, state[0])
+
+    def last_modified(request, pk, *args, **kwargs):
+        state = _memoized_state(request, lambda: _detail_state(model, pk))
+        return state and state[1]
+
+    return etag, last_modified
+
+
+# Decorators for the function views. Apply them below @api_view and
+# @permission_classes so clients are authenticated before a 304 is sent.
+list_condition = condition(etag_func=_list_etag, last_modified_func=_list_last_modified)
+
+
+def detail_condition(model):
+    etag, last_modified = _detail_functions(model)
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+# The same for the async views of myapp.async_views. condition() calls the
+# ETag functions on the event loop, so the state is loaded in a thread first
+# and they only read the memoized copy.
+def alist_condition(view):
+    conditional = list_condition(view)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        await sync_to_async(_memoized_state)(request, _table_state)
+        return await conditional(request, *args, **kwargs)
+    return wrapper
+
+
+def adetail_condition(model):
+    def decorator(view):
+        conditional = detail_condition(model)(view)
+
+        @functools.wraps(view)
+        async def wrapper(request, pk, *args, **kwargs):
+            await sync_to_async(_memoized_state)(request, lambda: _detail_state(model, pk))
+            return await conditional(request, *args, pk=pk, **kwargs)
+        return wrapper
+    return decorator
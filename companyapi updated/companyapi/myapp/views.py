@@ -1,15 +1,33 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, throttle_classes
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework import status
+from django.conf import settings
 from django.http import HttpResponse
 from django.contrib.auth import authenticate
-from django.contrib.auth.models import User
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import get_object_or_404
 from .models import Organization, Company, Employee
 from .serializers import OrganizationSerializer, CompanySerializer, EmployeeSerializer
+from .querysets import organization_queryset, company_queryset, employee_queryset, apply_employee_filters
+from .pagination import paginate
+from .fieldsets import selection_from_request
+from .params import positive_int
+from .stats import organization_statistics, STATS_ORDERINGS
+from .search import search, SEARCH_TYPES, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
+from .cache import cache_response, cache_statistics, all_tables, CACHED_ENDPOINTS
+from .versions import list_condition, detail_condition
+from .bulk import bulk_write, OrganizationBulk, CompanyBulk, EmployeeBulk
+from .export import stream_export
+from .renderers import NDJSONRenderer, CSVRenderer, FormatNegotiation, content_negotiation_class
+from .importer import EmployeeImporter, ImportFormatError, IMPORT_FORMATS, guess_format
+from .authentication import issue_tokens
+from .tokens import RefreshToken, key_set
+from .hashers import HashingBusy
+from .throttling import LoginRateThrottle
+from .registration import register_user, register_users, UsernameTaken
 
 
 @api_view(['POST'])
@@ -25,18 +43,18 @@ def register(request):
             'error': 'Username and password are required'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    if User.objects.filter(username=username).exists():
+    try:
+        user = register_user(username, email, password)
+    except UsernameTaken:
         return Response({
             'error': 'Username already exists'
         }, status=status.HTTP_400_BAD_REQUEST)
+    except HashingBusy:
+        return Response({
+            'error': 'Too many signups in progress, try again shortly'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
     
-    user = User.objects.create_user(
-        username=username,
-        email=email,
-        password=password
-    )
-    
-    refresh = RefreshToken.for_user(user)
+    refresh = issue_tokens(user)
     
     return Response({
         'message': 'User registered successfully',
@@ -47,8 +65,37 @@ def register(request):
     }, status=status.HTTP_201_CREATED)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def register_bulk(request):
+    """Create users in bulk (admin only); passwords are hashed in a process pool"""
+    rows = request.data
+    if not isinstance(rows, list) or not rows:
+        return Response({'error': 'Expected a non-empty JSON array'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(rows) > settings.API_REGISTER_BULK_MAX_ROWS:
+        return Response(
+            {'error': f'At most {settings.API_REGISTER_BULK_MAX_ROWS} users are accepted per request'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    
+    users, errors = register_users(rows)
+    
+    if errors and not users:
+        code = status.HTTP_400_BAD_REQUEST
+    elif errors:
+        code = status.HTTP_207_MULTI_STATUS
+    else:
+        code = status.HTTP_201_CREATED
+    return Response({
+        'created': len(users),
+        'ids': [user.pk for user in users],
+        'errors': errors,
+    }, status=code)
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginRateThrottle])
 def login(request):
     """User login endpoint"""
     username = request.data.get('username')
@@ -59,14 +106,19 @@ def login(request):
             'error': 'Username and password are required'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    user = authenticate(username=username, password=password)
+    try:
+        user = authenticate(username=username, password=password)
+    except HashingBusy:
+        return Response({
+            'error': 'Too many logins in progress, try again shortly'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
     
     if user is None:
         return Response({
             'error': 'Invalid credentials'
         }, status=status.HTTP_401_UNAUTHORIZED)
     
-    refresh = RefreshToken.for_user(user)
+    refresh = issue_tokens(user)
     
     return Response({
         'message': 'Login successful',
@@ -90,15 +142,38 @@ def token_refresh(request):
     
     try:
         refresh = RefreshToken(refresh_token)
-        access_token = str(refresh.access_token)
-        
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            refresh.rotate()
+    except TokenError:
         return Response({
-            'access': access_token
-        })
-    except Exception as e:
+            'error': 'Invalid refresh token'
+        }, status=status.HTTP_401_UNAUTHORIZED)
+    
+    data = {'access': str(refresh.access_token)}
+    if jwt_settings.ROTATE_REFRESH_TOKENS:
+        data['refresh'] = str(refresh)
+    return Response(data)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def logout(request):
+    """Revoke a refresh token"""
+    refresh_token = request.data.get('refresh')
+    
+    if not refresh_token:
+        return Response({
+            'error': 'Refresh token is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        RefreshToken(refresh_token).revoke()
+    except TokenError:
         return Response({
             'error': 'Invalid refresh token'
         }, status=status.HTTP_401_UNAUTHORIZED)
+    
+    return Response({'message': 'Logged out'})
 
 
 @api_view(['GET'])
@@ -112,15 +187,28 @@ def profile(request):
     })
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def jwks(request):
+    """Public keys that verify our access and refresh tokens (JWKS)"""
+    keys = [key.jwk() for key in key_set().keys.values() if key.public]
+    response = Response({'keys': keys})
+    # Verifiers may cache the set; a rotation adds its key well before signing with it
+    response['Cache-Control'] = 'public, max-age=300'
+    return response
+
+
 # Organization CRUD operations
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@list_condition
+@cache_response('organization_list', all_tables)
 def organization_list_create(request):
     """List all organizations or create a new one"""
     if request.method == 'GET':
-        organizations = Organization.objects.all()
-        serializer = OrganizationSerializer(organizations, many=True)
-        return Response(serializer.data)
+        selection = selection_from_request(request, OrganizationSerializer)
+        organizations = organization_queryset(selection)
+        return paginate(request, organizations, OrganizationSerializer, selection)
     
     elif request.method == 'POST':
         serializer = OrganizationSerializer(data=request.data)
@@ -132,10 +220,14 @@ def organization_list_create(request):
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@detail_condition(Organization)
+@cache_response('organization_detail', lambda pk: [f'organization:{pk}'])
 def organization_detail(request, pk):
     """Retrieve, update or delete an organization"""
+    # Writes load the bare row; only response bodies need the related rows
+    queryset = organization_queryset() if request.method == 'GET' else Organization.objects.all()
     try:
-        organization = get_object_or_404(Organization, pk=pk)
+        organization = get_object_or_404(queryset, pk=pk)
     except Organization.DoesNotExist:
         return Response({'error': 'Organization not found'}, status=status.HTTP_404_NOT_FOUND)
     
@@ -147,7 +239,7 @@ def organization_detail(request, pk):
         serializer = OrganizationSerializer(organization, data=request.data)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            return Response(OrganizationSerializer(organization_queryset().get(pk=pk)).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
@@ -158,12 +250,14 @@ def organization_detail(request, pk):
 # Company CRUD operations
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@list_condition
+@cache_response('company_list', all_tables)
 def company_list_create(request):
     """List all companies or create a new one"""
     if request.method == 'GET':
-        companies = Company.objects.all()
-        serializer = CompanySerializer(companies, many=True)
-        return Response(serializer.data)
+        selection = selection_from_request(request, CompanySerializer)
+        companies = company_queryset(selection)
+        return paginate(request, companies, CompanySerializer, selection)
     
     elif request.method == 'POST':
         serializer = CompanySerializer(data=request.data)
@@ -175,10 +269,16 @@ def company_list_create(request):
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@detail_condition(Company)
+@cache_response(
+    'company_detail', lambda pk: [f'company:{pk}'],
+    lambda data: [f'organization:{data["organization"]}'],
+)
 def company_detail(request, pk):
     """Retrieve, update or delete a company"""
+    queryset = company_queryset() if request.method == 'GET' else Company.objects.all()
     try:
-        company = get_object_or_404(Company, pk=pk)
+        company = get_object_or_404(queryset, pk=pk)
     except Company.DoesNotExist:
         return Response({'error': 'Company not found'}, status=status.HTTP_404_NOT_FOUND)
     
@@ -190,7 +290,7 @@ def company_detail(request, pk):
         serializer = CompanySerializer(company, data=request.data)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            return Response(CompanySerializer(company_queryset().get(pk=pk)).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
@@ -201,28 +301,14 @@ def company_detail(request, pk):
 # Employee CRUD operations
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@list_condition
+@cache_response('employee_list', all_tables)
 def employee_list_create(request):
     """List all employees or create a new one"""
     if request.method == 'GET':
-        name = request.GET.get('name')
-        company = request.GET.get('company')
-        organization = request.GET.get('organization')
-
-        filters = {}
-        if name:
-            filters['name__icontains'] = name
-        if company:
-            filters['company_id'] = company
-        if organization:
-            filters['company__organization_id'] = organization
-
-        if filters:
-            employees = Employee.objects.filter(**filters)
-        else:
-            employees = Employee.objects.all()
-        
-        serializer = EmployeeSerializer(employees, many=True)
-        return Response(serializer.data)
+        selection = selection_from_request(request, EmployeeSerializer)
+        employees = apply_employee_filters(employee_queryset(selection), request.GET)
+        return paginate(request, employees, EmployeeSerializer, selection)
     
     elif request.method == 'POST':
         serializer = EmployeeSerializer(data=request.data)
@@ -234,10 +320,16 @@ def employee_list_create(request):
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@detail_condition(Employee)
+@cache_response(
+    'employee_detail', lambda pk: [f'employee:{pk}'],
+    lambda data: [f'company:{data["company"]}', f'organization:{data["organization_id"]}'],
+)
 def employee_detail(request, pk):
     """Retrieve, update or delete an employee"""
+    queryset = employee_queryset() if request.method == 'GET' else Employee.objects.all()
     try:
-        employee = get_object_or_404(Employee, pk=pk)
+        employee = get_object_or_404(queryset, pk=pk)
     except Employee.DoesNotExist:
         return Response({'error': 'Employee not found'}, status=status.HTTP_404_NOT_FOUND)
     
@@ -249,7 +341,7 @@ def employee_detail(request, pk):
         serializer = EmployeeSerializer(employee, data=request.data)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            return Response(EmployeeSerializer(employee_queryset().get(pk=pk)).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
@@ -257,97 +349,125 @@ def employee_detail(request, pk):
         return Response({'message': 'Employee deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
 
 
+# Streaming export
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([NDJSONRenderer, CSVRenderer])
+@content_negotiation_class(FormatNegotiation)
+def export_employees(request):
+    """Stream all matching employees as NDJSON or CSV"""
+    # Bad filter values raise here, and get a 400, before anything streams
+    employees = apply_employee_filters(Employee.objects.all(), request.GET)
+    return stream_export(employees, request.accepted_renderer.format)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_data(request):
+    """Stream-import organizations, companies and employees from an uploaded CSV or NDJSON file"""
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Upload the data as a multipart "file" field'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    import_format = request.data.get('format') or guess_format(upload.name)
+    if import_format not in IMPORT_FORMATS:
+        return Response({
+            'error': f'format must be one of: {", ".join(sorted(IMPORT_FORMATS))}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    importer = EmployeeImporter()
+    try:
+        summary = importer.run(IMPORT_FORMATS[import_format](upload.file))
+    except ImportFormatError as exc:
+        # The batches before the error stay imported
+        return Response(
+            {'error': str(exc), 'line': exc.line, **importer.summary()}, status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(summary)
+
+
+# Bulk operations
+@api_view(['POST', 'PATCH', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def organization_bulk(request):
+    """Create, update or delete organizations in bulk"""
+    return bulk_write(request, OrganizationBulk())
+
+
+@api_view(['POST', 'PATCH', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def company_bulk(request):
+    """Create, update or delete companies in bulk"""
+    return bulk_write(request, CompanyBulk())
+
+
+@api_view(['POST', 'PATCH', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def employee_bulk(request):
+    """Create, update or delete employees in bulk"""
+    return bulk_write(request, EmployeeBulk())
+
+
 # Legacy endpoints for backward compatibility
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@list_condition
+@cache_response('organization_list_legacy', all_tables)
 def get_organizations(request):
-    organizations = Organization.objects.all()
-    serializer = OrganizationSerializer(organizations, many=True)
-    return Response(serializer.data)
+    selection = selection_from_request(request, OrganizationSerializer)
+    organizations = organization_queryset(selection)
+    return paginate(request, organizations, OrganizationSerializer, selection)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@list_condition
+@cache_response('company_list_legacy', all_tables)
 def get_companies(request):
-    companies = Company.objects.all()
-    serializer = CompanySerializer(companies, many=True)
-    return Response(serializer.data)
+    selection = selection_from_request(request, CompanySerializer)
+    companies = company_queryset(selection)
+    return paginate(request, companies, CompanySerializer, selection)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@list_condition
+@cache_response('employee_list_legacy', all_tables)
 def get_employees(request):
-    name = request.GET.get('name')
-    company = request.GET.get('company')
-    organization = request.GET.get('organization')
-
-    filters = {}
-    if name:
-        filters['name__icontains'] = name
-    if company:
-        filters['company_id'] = company
-    if organization:
-        filters['company__organization_id'] = organization
-
-    if filters:
-        employees = Employee.objects.filter(**filters)
-    else:
-        employees = Employee.objects.all()
-    
-    serializer = EmployeeSerializer(employees, many=True)
-    return Response(serializer.data)
+    selection = selection_from_request(request, EmployeeSerializer)
+    employees = apply_employee_filters(employee_queryset(selection), request.GET)
+    return paginate(request, employees, EmployeeSerializer, selection)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@list_condition
+@cache_response('employee_filter', all_tables)
 def filter_employees(request):
-    name = request.GET.get('name')
-    company = request.GET.get('company')
-    organization = request.GET.get('organization')
-
-    filters = {}
-    if name:
-        filters['name__icontains'] = name
-    if company:
-        filters['company_id'] = company
-    if organization:
-        filters['company__organization_id'] = organization
-
-    employees = Employee.objects.all()  # Start with all employees
-    if filters:
-        employees = employees.filter(**filters)  # Apply filters only if they exist
-
-    serializer = EmployeeSerializer(employees, many=True)
-    return Response(serializer.data)
+    selection = selection_from_request(request, EmployeeSerializer)
+    employees = apply_employee_filters(employee_queryset(selection), request.GET)
+    return paginate(request, employees, EmployeeSerializer, selection)
 
 
 # New utility endpoints
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@list_condition
+@cache_response('stats', all_tables)
 def organization_stats(request):
     """Get statistics about organizations"""
-    total_organizations = Organization.objects.count()
-    total_companies = Company.objects.count()
-    total_employees = Employee.objects.count()
+    order = request.GET.get('order', 'id')
+    if order not in STATS_ORDERINGS:
+        return Response({
+            'error': f'order must be one of: {", ".join(STATS_ORDERINGS)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Get organizations with company and employee counts
-    org_stats = []
-    for org in Organization.objects.all():
-        company_count = org.companies.count()
-        employee_count = sum(company.employees.count() for company in org.companies.all())
-        org_stats.append({
-            'id': org.id,
-            'name': org.name,
-            'company_count': company_count,
-            'employee_count': employee_count
-        })
+    top = min(positive_int(request.GET, 'top', settings.API_STATS_DEFAULT_TOP), settings.API_STATS_MAX_TOP)
     
-    return Response({
-        'total_organizations': total_organizations,
-        'total_companies': total_companies,
-        'total_employees': total_employees,
-        'organization_details': org_stats
-    })
+    breakdown = request.GET.get('breakdown') == 'companies'
+    return Response(organization_statistics(
+        top=top, order=order, breakdown=breakdown, companies_per_organization=settings.API_STATS_MAX_COMPANIES,
+    ))
 
 
 @api_view(['GET'])
@@ -358,25 +478,30 @@ def search_all(request):
     if not query:
         return Response({'error': 'Query parameter "q" is required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    results = {
-        'organizations': [],
-        'companies': [],
-        'employees': []
-    }
-    
-    # Search organizations
-    orgs = Organization.objects.filter(name__icontains=query)
-    results['organizations'] = OrganizationSerializer(orgs, many=True).data
+    types = request.GET.get('types')
+    if types:
+        types = {name.strip() for name in types.split(',') if name.strip()}
+        unknown = types - set(SEARCH_TYPES)
+        if unknown:
+            return Response({
+                'error': f'Unknown search types: {", ".join(sorted(unknown))}'
+            }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Search companies
-    companies = Company.objects.filter(name__icontains=query)
-    results['companies'] = CompanySerializer(companies, many=True).data
+    limit = min(positive_int(request.GET, 'limit', DEFAULT_SEARCH_LIMIT), MAX_SEARCH_LIMIT)
     
-    # Search employees
-    employees = Employee.objects.filter(name__icontains=query)
-    results['employees'] = EmployeeSerializer(employees, many=True).data
-    
-    return Response(results)
+    return Response(search(query, types=types or None, limit=limit))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cache_stats(request):
+    """Hit/miss counters of the response cache per endpoint"""
+    endpoints = cache_statistics(CACHED_ENDPOINTS)
+    return Response({
+        'hits': sum(counts['hits'] for counts in endpoints.values()),
+        'misses': sum(counts['misses'] for counts in endpoints.values()),
+        'endpoints': endpoints
+    })
 
 
 def home(request):
@@ -389,8 +514,11 @@ def home(request):
         <h3>Authentication (No token required):</h3>
         <ul>
             <li><strong>POST /api/auth/register/</strong> - User registration</li>
+            <li><strong>POST /api/auth/register/bulk/</strong> - Create users in bulk (admin only; JSON array of username/email/password)</li>
             <li><strong>POST /api/auth/login/</strong> - User login</li>
-            <li><strong>POST /api/auth/refresh/</strong> - Refresh access token</li>
+            <li><strong>POST /api/auth/refresh/</strong> - Refresh access token (returns a new refresh token; the old one is revoked)</li>
+            <li><strong>POST /api/auth/logout/</strong> - Revoke a refresh token</li>
+            <li><strong>GET /api/auth/jwks/</strong> - Public token verification keys (JWKS)</li>
         </ul>
         
         <h3>Protected API Endpoints (Token required):</h3>
@@ -402,6 +530,7 @@ def home(request):
             <li><strong>GET /api/organizations/{id}/</strong> - Get organization details</li>
             <li><strong>PUT /api/organizations/{id}/</strong> - Update organization</li>
             <li><strong>DELETE /api/organizations/{id}/</strong> - Delete organization</li>
+            <li><strong>POST/PATCH/DELETE /api/organizations/bulk/</strong> - Bulk create, update or delete organizations (JSON array; per-row errors)</li>
         </ul>
         
         <h4>Companies:</h4>
@@ -411,21 +540,26 @@ def home(request):
             <li><strong>GET /api/companies/{id}/</strong> - Get company details</li>
             <li><strong>PUT /api/companies/{id}/</strong> - Update company</li>
             <li><strong>DELETE /api/companies/{id}/</strong> - Delete company</li>
+            <li><strong>POST/PATCH/DELETE /api/companies/bulk/</strong> - Bulk create, update or delete companies (JSON array; per-row errors)</li>
         </ul>
         
         <h4>Employees:</h4>
         <ul>
-            <li><strong>GET /api/employees/</strong> - List all employees</li>
+            <li><strong>GET /api/employees/</strong> - List all employees (filters: <code>name_prefix</code>, <code>name_exact</code>, <code>name_contains</code>/<code>name</code>, <code>company</code>, <code>organization</code>)</li>
             <li><strong>POST /api/employees/</strong> - Create new employee</li>
             <li><strong>GET /api/employees/{id}/</strong> - Get employee details</li>
             <li><strong>PUT /api/employees/{id}/</strong> - Update employee</li>
             <li><strong>DELETE /api/employees/{id}/</strong> - Delete employee</li>
+            <li><strong>POST/PATCH/DELETE /api/employees/bulk/</strong> - Bulk create, update or delete employees (JSON array; per-row errors)</li>
+            <li><strong>GET /api/employees/export/?format=ndjson|csv</strong> - Stream every employee (same filters as the list)</li>
+            <li><strong>POST /api/import/</strong> - Stream-import a CSV/NDJSON <code>file</code> upload in the export's columns (large loads: <code>manage.py import_employees</code>)</li>
         </ul>
         
         <h4>Utility Endpoints:</h4>
         <ul>
-            <li><strong>GET /api/stats/</strong> - Get organization statistics</li>
-            <li><strong>GET /api/search/?q={query}</strong> - Search across all entities</li>
+            <li><strong>GET /api/stats/</strong> - Get organization statistics (<code>?top=N</code>, <code>?order=employee_count</code>, <code>?breakdown=companies</code>)</li>
+            <li><strong>GET /api/cache/stats/</strong> - Response cache hit/miss counters</li>
+            <li><strong>GET /api/search/?q={query}</strong> - Ranked prefix search across all entities (<code>?types=employees</code>, <code>?limit=N</code> per type)</li>
         </ul>
         
         <h3>How to Use:</h3>
@@ -436,6 +570,8 @@ def home(request):
         </ol>
         
         <p><em>Note: All API endpoints except authentication require a valid JWT token.</em></p>
+        <p><em>List endpoints are cursor paginated: follow the <code>next</code>/<code>previous</code> links, set <code>?page_size=</code>, pick fields with <code>?fields=id,name,companies.name</code> and limit nesting with <code>?depth=0|1|2</code> or <code>?expand=companies,companies.employees</code>.</em></p>
+        <p><em>GET responses carry <code>ETag</code> and <code>Last-Modified</code> headers; send them back as <code>If-None-Match</code>/<code>If-Modified-Since</code> to get <code>304 Not Modified</code> when nothing changed.</em></p>
         
         <h2>Quick Access:</h2>
         <p><a href="/auth/register-form/">📝 Register New User</a></p>
@@ -456,12 +592,8 @@ def register_form(request):
         
         if username and password:
             try:
-                user = User.objects.create_user(
-                    username=username,
-                    email=email,
-                    password=password
-                )
-                refresh = RefreshToken.for_user(user)
+                user = register_user(username, email, password)
+                refresh = issue_tokens(user)
                 
                 return HttpResponse(f"""
                     <h1>✅ Registration Successful!</h1>
@@ -481,12 +613,18 @@ def register_form(request):
                     <p><a href="/api/">← Back to API Documentation</a></p>
                     <p><a href="/auth/login-form/">🔐 Login</a></p>
                 """)
-            except Exception as e:
-                return HttpResponse(f"""
+            except UsernameTaken:
+                return HttpResponse("""
                     <h1>❌ Registration Failed</h1>
-                    <p>Error: {str(e)}</p>
+                    <p>That username is already taken.</p>
                     <p><a href="/auth/register-form/">← Try Again</a></p>
                 """)
+            except HashingBusy:
+                return HttpResponse("""
+                    <h1>❌ Server Busy</h1>
+                    <p>Too many signups in progress, please try again shortly.</p>
+                    <p><a href="/auth/register-form/">← Try Again</a></p>
+                """, status=503, headers={'Retry-After': '1'})
     
     return HttpResponse(f"""
         <h1>📝 User Registration</h1>
@@ -508,11 +646,25 @@ def login_form(request):
         username = request.POST.get('username')
         password = request.POST.get('password')
         
+        if not LoginRateThrottle().allow_request(request, None):
+            return HttpResponse("""
+                <h1>❌ Too Many Attempts</h1>
+                <p>Please wait a minute before trying again.</p>
+                <p><a href="/auth/login-form/">← Try Again</a></p>
+            """, status=429)
+        
         if username and password:
-            user = authenticate(username=username, password=password)
+            try:
+                user = authenticate(username=username, password=password)
+            except HashingBusy:
+                return HttpResponse("""
+                    <h1>❌ Server Busy</h1>
+                    <p>Too many logins in progress, please try again shortly.</p>
+                    <p><a href="/auth/login-form/">← Try Again</a></p>
+                """, status=503, headers={'Retry-After': '1'})
             
             if user is not None:
-                refresh = RefreshToken.for_user(user)
+                refresh = issue_tokens(user)
                 
                 return HttpResponse(f"""
                     <h1>✅ Login Successful!</h1>
@@ -886,6 +1038,7 @@ def dashboard(request):
                             throw new Error('HTTP ' + response.status + ': ' + response.statusText);
                     }})
                     .then(data => {{
+                        if (data && Array.isArray(data.results)) data = data.results;
                         if (Array.isArray(data)) {{
                             if (data.length === 0) {{
                                 element.innerHTML = '<div class="success">✅ No ' + title + ' found</div>';